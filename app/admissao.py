@@ -0,0 +1,234 @@
+# app/admissao.py
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import request, jsonify
+
+# Controle de admissão por grupo de rotas (blueprint ou endpoint).
+#
+# Cada grupo pode ter:
+# - limite de concorrência: no máximo N requisições do grupo em andamento no
+#   processo; as seguintes esperam numa fila limitada por até ``espera``
+#   segundos. Com a fila cheia, ou esgotada a espera, a resposta é 503 na hora,
+#   e as rotas baratas não ficam presas atrás de uma rajada de rotas caras;
+# - token bucket por cliente (IP): ``taxa`` requisições por segundo com
+#   rajadas de até ``rajada``; acima disso, 429.
+# As duas respostas trazem Retry-After.
+#
+# A concorrência é por processo (é ela que protege os workers do processo).
+# Os buckets ficam num backend trocável: em memória ou no Redis, que os
+# compartilha entre processos e servidores.
+
+# Grupo -> limites; as chaves são nomes de blueprint ('auth') ou endpoints ('Livros.get_livros')
+LIMITES_PADRAO = {
+    'auth': {'concorrencia': 8, 'fila': 32, 'espera': 2, 'taxa': 10, 'rajada': 20},
+    'admin': {'concorrencia': 2, 'fila': 4, 'espera': 5},
+}
+RETRY_AFTER_PADRAO = 1  # Segundos sugeridos ao cliente após um 503
+CHAVE_AMBIENTE = 'bookbridge.admissao'
+
+
+class Limitador:
+    """Semáforo com fila de espera limitada e tempo máximo de espera."""
+
+    def __init__(self, concorrencia, fila=0, espera=0):
+        self.concorrencia = concorrencia
+        self.fila = fila
+        self.espera = espera
+        self.ativos = 0
+        self.aguardando = 0
+        self._condicao = threading.Condition()
+
+    def entrar(self):
+        """Ocupa uma vaga; retorna (admitida, esperou)."""
+        with self._condicao:
+            if self.ativos < self.concorrencia:
+                self.ativos += 1
+                return True, False
+            if self.aguardando >= self.fila:
+                return False, False
+            self.aguardando += 1
+            try:
+                admitida = self._condicao.wait_for(lambda: self.ativos < self.concorrencia, timeout=self.espera)
+            finally:
+                self.aguardando -= 1
+            if admitida:
+                self.ativos += 1
+            return admitida, True
+
+    def sair(self):
+        with self._condicao:
+            self.ativos -= 1
+            self._condicao.notify()
+
+
+class BaldesMemoria:
+    """Token buckets no processo, limitados em quantidade (os menos usados saem primeiro)."""
+
+    def __init__(self, capacidade=10000):
+        self.capacidade = capacidade
+        self._baldes = OrderedDict()  # chave -> (tokens, atualizado_em)
+        self._lock = threading.Lock()
+
+    def consumir(self, chave, taxa, rajada):
+        """Retira um token; retorna 0 se havia, ou os segundos até o próximo token."""
+        agora = time.monotonic()
+        with self._lock:
+            tokens, atualizado_em = self._baldes.get(chave, (rajada, agora))
+            tokens = min(rajada, tokens + (agora - atualizado_em) * taxa)
+            espera = 0 if tokens >= 1 else (1 - tokens) / taxa
+            if not espera:
+                tokens -= 1
+            self._baldes[chave] = (tokens, agora)
+            self._baldes.move_to_end(chave)
+            while len(self._baldes) > self.capacidade:
+                self._baldes.popitem(last=False)
+        return espera
+
+
+class BaldesRedis:
+    """Token buckets compartilhados entre processos, para qualquer cliente compatível com redis-py.
+
+    A leitura, a reposição e o consumo acontecem num único script Lua
+    (atômico no servidor). O relógio é o do processo que chama.
+    """
+
+    SCRIPT = """
+        local taxa, rajada, agora = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local balde = redis.call('HMGET', KEYS[1], 'tokens', 'atualizado_em')
+        local tokens = tonumber(balde[1]) or rajada
+        local atualizado_em = tonumber(balde[2]) or agora
+        tokens = math.min(rajada, tokens + math.max(0, agora - atualizado_em) * taxa)
+        local consumido = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            consumido = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'atualizado_em', tostring(agora))
+        redis.call('EXPIRE', KEYS[1], math.ceil(rajada / taxa) + 1)
+        return {consumido, tostring(tokens)}
+    """
+
+    def __init__(self, cliente, prefixo='bookbridge:admissao:'):
+        self.cliente = cliente
+        self.prefixo = prefixo
+
+    def consumir(self, chave, taxa, rajada):
+        consumido, tokens = self.cliente.eval(self.SCRIPT, 1, self.prefixo + chave, taxa, rajada, time.time())
+        return 0 if int(consumido) else (1 - float(tokens)) / taxa
+
+
+class Grupo:
+    """Limites e contadores de um grupo de rotas."""
+
+    def __init__(self, nome, concorrencia=0, fila=0, espera=0, taxa=0, rajada=None,
+                 retry_after=RETRY_AFTER_PADRAO):
+        self.nome = nome
+        self.limitador = Limitador(concorrencia, fila, espera) if concorrencia else None
+        self.taxa = taxa
+        self.rajada = rajada or max(1, taxa)
+        self.retry_after = retry_after
+        self.admitidas = 0
+        self.esperas = 0
+        self.rejeitadas_taxa = 0
+        self.rejeitadas_ocupado = 0
+
+
+class Admissao:
+    """Aplica os limites configurados a cada requisição."""
+
+    def __init__(self, limites, baldes):
+        self.grupos = {nome: Grupo(nome, **opcoes) for nome, opcoes in limites.items()}
+        self.baldes = baldes
+        self._lock = threading.Lock()  # Protege os contadores
+
+    def grupo(self, endpoint, blueprint):
+        # O endpoint tem precedência sobre o blueprint
+        return self.grupos.get(endpoint) or self.grupos.get(blueprint)
+
+    def admitir(self, grupo, cliente):
+        """Retorna None se a requisição pode seguir, ou a resposta de rejeição."""
+        if grupo.taxa:
+            espera = self.baldes.consumir(f'{grupo.nome}:{cliente}', grupo.taxa, grupo.rajada)
+            if espera:
+                with self._lock:
+                    grupo.rejeitadas_taxa += 1
+                return _rejeitar(429, 'Limite de requisições excedido, tente novamente mais tarde', espera)
+
+        if grupo.limitador is not None:
+            admitida, esperou = grupo.limitador.entrar()
+            with self._lock:
+                grupo.esperas += esperou
+                if not admitida:
+                    grupo.rejeitadas_ocupado += 1
+            if not admitida:
+                return _rejeitar(503, 'Servidor ocupado, tente novamente em instantes', grupo.retry_after)
+
+        with self._lock:
+            grupo.admitidas += 1
+        return None
+
+    def estatisticas(self):
+        with self._lock:
+            return {nome: {
+                'admitidas': grupo.admitidas,
+                'esperas': grupo.esperas,
+                'rejeitadas_taxa': grupo.rejeitadas_taxa,
+                'rejeitadas_ocupado': grupo.rejeitadas_ocupado,
+                'em_andamento': grupo.limitador.ativos if grupo.limitador else 0,
+                'na_fila': grupo.limitador.aguardando if grupo.limitador else 0,
+            } for nome, grupo in self.grupos.items()}
+
+
+def _rejeitar(status, mensagem, retry_after):
+    resposta = jsonify({'message': mensagem})
+    resposta.status_code = status
+    resposta.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return resposta
+
+
+def ler_limites(texto):
+    """Combina LIMITES_PADRAO com o JSON de ADMISSAO_LIMITES; um grupo com null é removido."""
+    limites = {nome: dict(opcoes) for nome, opcoes in LIMITES_PADRAO.items()}
+    for nome, opcoes in json.loads(texto or '{}').items():
+        if opcoes is None:
+            limites.pop(nome, None)
+        else:
+            limites[nome] = {**limites.get(nome, {}), **opcoes}
+    return limites
+
+
+def criar_baldes(config):
+    """Backend dos token buckets conforme ADMISSAO_BACKEND: 'memoria' (padrão) ou 'redis'."""
+    if config.get('ADMISSAO_BACKEND', 'memoria') == 'redis':
+        import redis  # Dependência opcional, necessária apenas para este backend
+        return BaldesRedis(redis.Redis.from_url(config['ADMISSAO_REDIS_URL']))
+    return BaldesMemoria()
+
+
+def iniciar_admissao(app):
+    """Registra a admissão antes de cada requisição e a liberação da vaga ao final dela."""
+    admissao = Admissao(app.config['ADMISSAO_LIMITES'], criar_baldes(app.config))
+    app.extensions['admissao'] = admissao
+
+    @app.before_request
+    def admitir_requisicao():
+        grupo = admissao.grupo(request.endpoint, request.blueprint)
+        if grupo is None:
+            return None
+        rejeicao = admissao.admitir(grupo, request.remote_addr)
+        if rejeicao is None and grupo.limitador is not None:
+            # No environ e não em g: as sub-requisições de /lote também são admitidas (app/lote.py),
+            # cada uma com o próprio environ, e compartilham g com a requisição do lote
+            request.environ[CHAVE_AMBIENTE] = grupo
+        return rejeicao
+
+    @app.teardown_request
+    def liberar_vaga(exc):
+        grupo = request.environ.pop(CHAVE_AMBIENTE, None)
+        if grupo is not None:
+            grupo.limitador.sair()
+
+    return admissao
@@ -0,0 +1,295 @@
+# app/agregados.py
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import func, case, select
+from app.database import db
+from app.models import Estatistica, Livro, Clube, Avaliacao, ResumoLivro, ResumoClube, Mudanca
+from app.ranking import pontuacao_bayesiana, atualizar_pontuacao
+
+ID_ESTATISTICAS = 1  # A tabela de agregados possui uma única linha
+CAMPOS_ESTATISTICAS = ('total_livros', 'total_clubes', 'soma_notas', 'total_avaliacoes')
+CAMPOS_RESUMO = ('total', 'soma', 'nota_1', 'nota_2', 'nota_3', 'nota_4', 'nota_5')
+CAMPOS_RESUMO_CLUBE = ('total_livros', 'total_avaliacoes', 'soma_notas')
+TAMANHO_LOTE_RECALCULO = 1000  # Livros (ou clubes) processados por vez ao recalcular os resumos
+
+
+def _contar():
+    # Calcula os agregados percorrendo as tabelas (usado apenas na inicialização e no recálculo).
+    # Mesma regra das escritas: um clube sai de total_clubes quando a exclusão é agendada
+    # (agendar_exclusao); livros e avaliações contam até a tarefa removê-los de fato
+    return {
+        'total_livros': db.session.query(func.count(Livro.id)).scalar() or 0,
+        'total_clubes': db.session.query(func.count(Clube.id)).filter(Clube.excluido_em.is_(None)).scalar() or 0,
+        'soma_notas': int(db.session.query(func.sum(Avaliacao.nota)).scalar() or 0),
+        'total_avaliacoes': db.session.query(func.count(Avaliacao.id)).scalar() or 0,
+    }
+
+
+def _inicializar():
+    # Cria a linha de agregados a partir dos dados existentes
+    estatistica = Estatistica(id=ID_ESTATISTICAS, **_contar())
+    db.session.add(estatistica)
+    return estatistica
+
+
+def obter_estatisticas():
+    """Retorna a linha de agregados, criando-a na primeira leitura."""
+    estatistica = db.session.get(Estatistica, ID_ESTATISTICAS)
+    if estatistica is None:
+        estatistica = _inicializar()
+        db.session.commit()
+    return estatistica
+
+
+def ajustar_estatisticas(**deltas):
+    """Soma os deltas aos contadores na transação corrente.
+
+    Deve ser chamada antes do commit da rota, para que o contador e a linha
+    alterada sejam gravados juntos. O incremento é feito no próprio UPDATE,
+    evitando perder atualizações concorrentes. Incrementar ``versao_clubes``
+    também renova ``clubes_atualizado_em``.
+    """
+    valores = {getattr(Estatistica, campo): getattr(Estatistica, campo) + delta
+               for campo, delta in deltas.items() if delta}
+    if not valores:
+        return
+    if deltas.get('versao_clubes'):
+        valores[Estatistica.clubes_atualizado_em] = datetime.utcnow().replace(microsecond=0)
+
+    resultado = db.session.query(Estatistica).filter_by(id=ID_ESTATISTICAS).update(
+        valores, synchronize_session=False)
+    if resultado == 0:
+        # Linha ainda não existe: a contagem completa já inclui a alteração pendente (autoflush)
+        _inicializar()
+
+
+def reservar_cursores_mudancas(quantidade):
+    """Reserva ``quantidade`` cursores do log de mudanças na transação corrente e retorna o último.
+
+    O incremento trava a linha de agregados até o commit, então transações
+    concorrentes recebem cursores na ordem em que são confirmadas: quem lê o
+    log nunca vê aparecer um cursor menor que o último já lido. Chame depois
+    dos demais ajustes da rota (ver ajustar_estatisticas).
+    """
+    resultado = db.session.query(Estatistica).filter_by(id=ID_ESTATISTICAS).update(
+        {Estatistica.ultima_mudanca: Estatistica.ultima_mudanca + quantidade}, synchronize_session=False)
+    if resultado == 0:
+        estatistica = _inicializar()
+        estatistica.ultima_mudanca = (db.session.query(func.max(Mudanca.id)).scalar() or 0) + quantidade
+        return estatistica.ultima_mudanca
+    return db.session.query(Estatistica.ultima_mudanca).filter_by(id=ID_ESTATISTICAS).scalar()
+
+
+def recalcular_estatisticas():
+    """Recalcula os contadores do zero e retorna a diferença encontrada por campo.
+
+    Também reconstrói os resumos por livro e por clube; as chaves
+    ``resumos_livros`` e ``resumos_clubes`` indicam quantos estavam
+    divergentes ou ausentes.
+    """
+    contagem = _contar()
+    estatistica = db.session.get(Estatistica, ID_ESTATISTICAS)
+    divergencias = {}
+    if estatistica is None:
+        db.session.add(Estatistica(id=ID_ESTATISTICAS, **contagem))
+        divergencias = {campo: valor for campo, valor in contagem.items() if valor}
+    else:
+        for campo in CAMPOS_ESTATISTICAS:
+            atual = getattr(estatistica, campo)
+            if atual != contagem[campo]:
+                divergencias[campo] = contagem[campo] - atual
+                setattr(estatistica, campo, contagem[campo])
+    db.session.commit()
+
+    corrigidos = recalcular_resumos_livros()
+    if corrigidos:
+        divergencias['resumos_livros'] = corrigidos
+    corrigidos = recalcular_resumos_clubes()
+    if corrigidos:
+        divergencias['resumos_clubes'] = corrigidos
+    return divergencias
+
+
+def _contar_resumos(filtro):
+    # Agrega as avaliações por livro (total, soma e histograma) para os livros do filtro
+    colunas = [func.count(Avaliacao.id), func.coalesce(func.sum(Avaliacao.nota), 0)]
+    colunas += [func.sum(case((Avaliacao.nota == n, 1), else_=0)) for n in range(1, 6)]
+    linhas = db.session.query(Avaliacao.id_livro, *colunas).filter(filtro).group_by(Avaliacao.id_livro)
+    return {linha[0]: dict(zip(CAMPOS_RESUMO, (int(v or 0) for v in linha[1:]))) for linha in linhas}
+
+
+def _resumo_vazio():
+    return dict.fromkeys(CAMPOS_RESUMO, 0)
+
+
+def inicializar_resumo_livro(id_livro):
+    """Cria o resumo de um livro a partir das avaliações já existentes."""
+    valores = _contar_resumos(Avaliacao.id_livro == id_livro).get(id_livro, _resumo_vazio())
+    id_clube = db.session.query(Livro.id_clube).filter_by(id=id_livro).scalar()
+    resumo = ResumoLivro(id_livro=id_livro, id_clube=id_clube,
+                         pontuacao=pontuacao_bayesiana(valores['total'], valores['soma']), **valores)
+    db.session.add(resumo)
+    return resumo
+
+
+def obter_resumo_livro(id_livro):
+    """Retorna o resumo de um livro, criando-o caso ainda não exista."""
+    resumo = db.session.get(ResumoLivro, id_livro)
+    if resumo is None:
+        resumo = inicializar_resumo_livro(id_livro)
+        db.session.commit()
+    return resumo
+
+
+def ajustar_resumo_livro(id_livro, nota, delta):
+    """Adiciona (delta=1) ou remove (delta=-1) uma nota do resumo do livro na transação corrente."""
+    coluna_nota = getattr(ResumoLivro, f'nota_{nota}')
+    resultado = db.session.query(ResumoLivro).filter_by(id_livro=id_livro).update({
+        ResumoLivro.total: ResumoLivro.total + delta,
+        ResumoLivro.soma: ResumoLivro.soma + nota * delta,
+        coluna_nota: coluna_nota + delta,
+    }, synchronize_session=False)
+    if resultado == 0:
+        # Livro antigo sem resumo: a contagem já enxerga a alteração pendente (autoflush)
+        inicializar_resumo_livro(id_livro)
+    else:
+        # UPDATE separado: o MySQL avalia o SET da esquerda para a direita, e no mesmo comando a
+        # pontuação usaria total/soma antigos ou novos conforme a ordem das colunas
+        atualizar_pontuacao(id_livro)
+    _ajustar_resumo_clube_do_livro(id_livro, delta, nota * delta)
+
+
+def ajustar_resumos_livros(notas, delta):
+    """Como ajustar_resumo_livro para várias notas [(id_livro, nota)], com um UPDATE por livro.
+
+    Retorna os ids dos livros ajustados, na ordem em que foram atualizados.
+    """
+    por_livro = {}
+    for id_livro, nota in notas:
+        por_livro.setdefault(id_livro, Counter())[nota] += 1
+    # Em ordem de id: transações concorrentes travam as linhas de resumos_livros na mesma ordem
+    livros = sorted(por_livro)
+    for id_livro in livros:
+        contagem = por_livro[id_livro]
+        valores = {ResumoLivro.total: ResumoLivro.total + delta * sum(contagem.values()),
+                   ResumoLivro.soma: ResumoLivro.soma + delta * sum(nota * n for nota, n in contagem.items())}
+        for nota, quantidade in contagem.items():
+            coluna_nota = getattr(ResumoLivro, f'nota_{nota}')
+            valores[coluna_nota] = coluna_nota + delta * quantidade
+        resultado = db.session.query(ResumoLivro).filter_by(id_livro=id_livro).update(valores,
+                                                                                       synchronize_session=False)
+        if resultado == 0:
+            inicializar_resumo_livro(id_livro)
+        else:
+            atualizar_pontuacao(id_livro)
+
+    por_clube = {}
+    for id_livro, id_clube in db.session.query(Livro.id, Livro.id_clube).filter(Livro.id.in_(livros)):
+        avaliacoes, soma = por_clube.get(id_clube, (0, 0))
+        contagem = por_livro[id_livro]
+        por_clube[id_clube] = (avaliacoes + sum(contagem.values()),
+                               soma + sum(nota * n for nota, n in contagem.items()))
+    for id_clube in sorted(por_clube):
+        avaliacoes, soma = por_clube[id_clube]
+        ajustar_resumo_clube(id_clube, avaliacoes=delta * avaliacoes, soma=delta * soma)
+    return livros
+
+
+def _contar_resumos_clubes(ids):
+    # Livros e avaliações (pelo JOIN com livros) dos clubes ``ids``
+    resumos = {id_clube: dict.fromkeys(CAMPOS_RESUMO_CLUBE, 0) for id_clube in ids}
+    for id_clube, total in (db.session.query(Livro.id_clube, func.count(Livro.id))
+                            .filter(Livro.id_clube.in_(ids)).group_by(Livro.id_clube)):
+        resumos[id_clube]['total_livros'] = total
+    for id_clube, total, soma in (db.session.query(Livro.id_clube, func.count(Avaliacao.id), func.sum(Avaliacao.nota))
+                                  .join(Avaliacao, Avaliacao.id_livro == Livro.id)
+                                  .filter(Livro.id_clube.in_(ids)).group_by(Livro.id_clube)):
+        resumos[id_clube].update(total_avaliacoes=total, soma_notas=int(soma or 0))
+    return resumos
+
+
+def inicializar_resumo_clube(id_clube):
+    """Cria o resumo de um clube a partir dos livros e avaliações já existentes."""
+    resumo = ResumoClube(id_clube=id_clube, **_contar_resumos_clubes([id_clube])[id_clube])
+    db.session.add(resumo)
+    return resumo
+
+
+def ajustar_resumo_clube(id_clube, livros=0, avaliacoes=0, soma=0):
+    """Soma os deltas ao resumo do clube na transação corrente (como ajustar_estatisticas)."""
+    resultado = _atualizar_resumo_clube(ResumoClube.id_clube == id_clube, livros, avaliacoes, soma)
+    if resultado == 0:
+        # Clube antigo sem resumo: a contagem já enxerga a alteração pendente (autoflush)
+        inicializar_resumo_clube(id_clube)
+
+
+def _ajustar_resumo_clube_do_livro(id_livro, avaliacoes, soma):
+    # O clube do livro vem de uma subconsulta no próprio UPDATE, sem uma ida a mais ao banco
+    id_clube = select(Livro.id_clube).where(Livro.id == id_livro).scalar_subquery()
+    if _atualizar_resumo_clube(ResumoClube.id_clube == id_clube, 0, avaliacoes, soma) == 0:
+        id_clube = db.session.query(Livro.id_clube).filter_by(id=id_livro).scalar()
+        if id_clube is not None:
+            inicializar_resumo_clube(id_clube)
+
+
+def _atualizar_resumo_clube(filtro, livros, avaliacoes, soma):
+    valores = {coluna: coluna + delta for coluna, delta in ((ResumoClube.total_livros, livros),
+                                                            (ResumoClube.total_avaliacoes, avaliacoes),
+                                                            (ResumoClube.soma_notas, soma)) if delta}
+    if not valores:
+        return None  # Nada a somar
+    return db.session.query(ResumoClube).filter(filtro).update(valores, synchronize_session=False)
+
+
+def recalcular_resumos_clubes():
+    """Reconstrói os resumos de todos os clubes em lotes e retorna quantos foram corrigidos."""
+    corrigidos = 0
+    ultimo_id = 0
+    while True:
+        ids = [id_clube for id_clube, in db.session.query(Clube.id).filter(Clube.id > ultimo_id)
+               .order_by(Clube.id).limit(TAMANHO_LOTE_RECALCULO)]
+        if not ids:
+            return corrigidos
+
+        contagens = _contar_resumos_clubes(ids)
+        existentes = {r.id_clube: r for r in ResumoClube.query.filter(ResumoClube.id_clube.in_(ids))}
+        for id_clube in ids:
+            resumo = existentes.get(id_clube)
+            if resumo is None:
+                db.session.add(ResumoClube(id_clube=id_clube, **contagens[id_clube]))
+                corrigidos += 1
+            elif any(getattr(resumo, campo) != valor for campo, valor in contagens[id_clube].items()):
+                for campo, valor in contagens[id_clube].items():
+                    setattr(resumo, campo, valor)
+                corrigidos += 1
+        db.session.commit()
+        ultimo_id = ids[-1]
+
+
+def recalcular_resumos_livros():
+    """Reconstrói os resumos de todos os livros em lotes e retorna quantos foram corrigidos."""
+    corrigidos = 0
+    ultimo_id = 0
+    while True:
+        clubes = dict(db.session.query(Livro.id, Livro.id_clube).filter(Livro.id > ultimo_id)
+                      .order_by(Livro.id).limit(TAMANHO_LOTE_RECALCULO))
+        if not clubes:
+            return corrigidos
+        ids = sorted(clubes)
+
+        contagens = _contar_resumos(Avaliacao.id_livro.in_(ids))
+        existentes = {r.id_livro: r for r in ResumoLivro.query.filter(ResumoLivro.id_livro.in_(ids))}
+        for id_livro in ids:
+            valores = dict(contagens.get(id_livro, _resumo_vazio()), id_clube=clubes[id_livro])
+            pontuacao = pontuacao_bayesiana(valores['total'], valores['soma'])
+            resumo = existentes.get(id_livro)
+            if resumo is None:
+                db.session.add(ResumoLivro(id_livro=id_livro, pontuacao=pontuacao, **valores))
+                corrigidos += 1
+            elif any(getattr(resumo, campo) != valor for campo, valor in valores.items()):
+                for campo, valor in valores.items():
+                    setattr(resumo, campo, valor)
+                resumo.pontuacao = pontuacao
+                corrigidos += 1
+        db.session.commit()
+        ultimo_id = ids[-1]
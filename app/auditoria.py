@@ -0,0 +1,106 @@
+# app/auditoria.py
+import re
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.database import db
+
+# Auditoria de planos de execução: captura as consultas emitidas por cada rota
+# e roda EXPLAIN em cada uma, apontando varreduras completas de tabela em
+# consultas filtradas (com WHERE). Listagens sem filtro são varreduras por
+# definição e ficam de fora. Uma requisição que não responde 2xx também
+# reprova a auditoria: um 401/403/404 para antes das consultas que deveriam
+# ser auditadas. Rotas que não puderam ser montadas (parâmetro sem valor)
+# são informadas à parte, nunca descartadas em silêncio.
+
+_COM_FILTRO = re.compile(r'\bWHERE\b', re.IGNORECASE)
+_VARREDURA_SQLITE = re.compile(r'^SCAN (?:TABLE )?(\w+)\b(?! USING| VIRTUAL TABLE)')
+
+# Parâmetros de query string necessários para algumas rotas responderem 200
+PARAMETROS_ROTAS = {'Livros.buscar_livros': {'q': 'a'}, 'mudancas.get_mudancas': {'desde': 0}}
+
+# Tabela cujo id preenche cada parâmetro das rotas, por nome de parâmetro
+TABELAS_PARAMETROS = {'clube_id': 'clubes', 'livro_id': 'livros', 'avaliacao_id': 'avaliacoes',
+                      'tarefa_id': 'tarefas_exclusao'}
+
+
+@contextmanager
+def capturar_consultas():
+    """Registra (sql, parâmetros) de tudo que passar pelo engine dentro do bloco."""
+    consultas = []
+
+    def antes_de_executar(conn, cursor, sql, parametros, contexto, executemany):
+        if not executemany:
+            consultas.append((sql, parametros))
+
+    event.listen(db.engine, 'before_cursor_execute', antes_de_executar)
+    try:
+        yield consultas
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', antes_de_executar)
+
+
+def varreduras_completas(sql, parametros):
+    """Retorna as tabelas lidas por varredura completa no plano da consulta."""
+    if not _COM_FILTRO.search(sql) or not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+        return []
+
+    with db.engine.connect() as conexao:
+        if conexao.dialect.name == 'sqlite':
+            plano = conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, parametros).fetchall()
+            tabelas = [m.group(1) for linha in plano if (m := _VARREDURA_SQLITE.match(linha[-1]))]
+            return [tabela for tabela in tabelas if tabela in db.metadata.tables]
+        if conexao.dialect.name == 'mysql':
+            plano = conexao.exec_driver_sql('EXPLAIN ' + sql, parametros).mappings().fetchall()
+            return [linha['table'] for linha in plano if linha.get('type') == 'ALL']
+    return []
+
+
+def auditar(cliente, requisicoes):
+    """Executa as requisições [(metodo, url, kwargs)] e retorna os problemas encontrados.
+
+    Cada problema é uma resposta fora de 2xx ({'rota', 'status'}) ou uma
+    consulta com varredura completa ({'rota', 'tabelas', 'sql'}).
+    """
+    problemas = []
+    for metodo, url, kwargs in requisicoes:
+        with capturar_consultas() as consultas:
+            resposta = cliente.open(url, method=metodo, **kwargs)
+            resposta.get_data()  # Respostas em streaming só consultam o banco enquanto o corpo é gerado
+            resposta.close()
+        if not 200 <= resposta.status_code < 300:
+            problemas.append({'rota': f'{metodo} {url}', 'status': resposta.status_code})
+        for sql, parametros in consultas:
+            tabelas = varreduras_completas(sql, parametros)
+            if tabelas:
+                problemas.append({'rota': f'{metodo} {url}', 'tabelas': tabelas, 'sql': ' '.join(sql.split())})
+    return problemas
+
+
+def requisicoes_get(app, ids, kwargs=None, valores=None):
+    """Monta uma requisição GET para cada rota registrada e retorna ``(requisicoes, ignoradas)``.
+
+    ``ids`` mapeia nome de tabela -> id existente e ``valores`` mapeia os
+    demais parâmetros (ex.: ``{'entidade': 'clubes'}``) -> valor. Rotas com
+    algum parâmetro sem valor não são montadas e voltam em ``ignoradas``
+    (a regra da rota), para que quem audita saiba o que ficou de fora.
+    """
+    requisicoes, ignoradas = [], []
+    valores = valores or {}
+    rotas = app.url_map.bind('localhost')
+    for regra in app.url_map.iter_rules():
+        if 'GET' not in regra.methods or regra.endpoint == 'static':
+            continue
+        preenchidos = {}
+        for nome in regra.arguments:
+            tabela = TABELAS_PARAMETROS.get(nome) or (regra.rule.strip('/').split('/')[0] if nome == 'id' else None)
+            if tabela in ids:
+                preenchidos[nome] = ids[tabela]
+            elif nome in valores:
+                preenchidos[nome] = valores[nome]
+            else:
+                ignoradas.append(regra.rule)
+                break
+        else:
+            url = rotas.build(regra.endpoint, {**preenchidos, **PARAMETROS_ROTAS.get(regra.endpoint, {})})
+            requisicoes.append(('GET', url, dict(kwargs or {})))
+    return requisicoes, ignoradas
@@ -0,0 +1,195 @@
+# app/busca.py
+import re
+import unicodedata
+from sqlalchemy import DDL, bindparam, event, text
+from app.database import db
+
+# Índice invertido de títulos e autores em uma tabela auxiliar (livros_busca).
+# SQLite usa uma tabela virtual FTS5 e MySQL uma tabela com índice FULLTEXT;
+# o texto é normalizado aqui (minúsculas, sem acentos) para que a busca
+# ignore acentuação nos dois bancos.
+
+TABELA = 'livros_busca'
+TAMANHO_LOTE_REINDEXACAO = 2000
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# Bancos migrados recebem a tabela pela revisão 7d3c9e5f0b42. Estes hooks só a criam nos bancos montados
+# por db.create_all() (testes, benchmarks e create_tables.py, que marca o banco na última revisão)
+event.listen(db.metadata, 'after_create', DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA} USING fts5("
+    "titulo, autor, tokenize = 'unicode61 remove_diacritics 2')").execute_if(dialect='sqlite'))
+event.listen(db.metadata, 'after_create', DDL(
+    f"CREATE TABLE IF NOT EXISTS {TABELA} ("
+    "id_livro INTEGER PRIMARY KEY, titulo VARCHAR(100) NOT NULL, autor VARCHAR(100) NOT NULL, "
+    "FULLTEXT INDEX ix_livros_busca_texto (titulo, autor)) ENGINE=InnoDB").execute_if(dialect='mysql'))
+event.listen(db.metadata, 'before_drop', DDL(f"DROP TABLE IF EXISTS {TABELA}"))
+
+
+def ignorar_tabela_busca(objeto, nome, tipo, refletido, comparado):
+    """Filtro do autogenerate: a tabela de busca (e as tabelas internas do FTS5) não são modelos.
+
+    Sem ele, o autogenerate proporia apagar do banco essas tabelas, que as
+    revisões criam por DDL própria.
+    """
+    return not (tipo == 'table' and (nome == TABELA or nome.startswith(f'{TABELA}_')))
+
+
+class ErroBusca(ValueError):
+    """Erro levantado para consultas vazias ou banco sem suporte a busca textual."""
+
+
+def normalizar(texto):
+    """Converte para minúsculas e remove acentos ("Memórias Póstumas" -> "memorias postumas")."""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def tokens(consulta):
+    return _TOKEN.findall(normalizar(consulta))
+
+
+class IndiceBusca:
+    """Interface comum dos índices de busca.
+
+    As escritas usam a sessão corrente, então participam da mesma transação
+    da rota que alterou o livro.
+    """
+
+    def indexar(self, id_livro, titulo, autor):
+        raise NotImplementedError
+
+    def remover(self, id_livro):
+        db.session.execute(text(f'DELETE FROM {TABELA} WHERE {self.coluna_id} = :id'), {'id': id_livro})
+
+    def remover_lote(self, ids):
+        """Remove vários livros do índice em um único comando."""
+        if ids:
+            db.session.execute(text(f'DELETE FROM {TABELA} WHERE {self.coluna_id} IN :ids')
+                               .bindparams(bindparam('ids', expanding=True)), {'ids': list(ids)})
+
+    def buscar(self, consulta, limite, deslocamento=0, id_clube=None, id_usuario=None):
+        """Retorna [(id_livro, pontuacao)] ordenado da mais para a menos relevante.
+
+        ``id_clube`` restringe a um clube e ``id_usuario`` aos clubes visíveis
+        criados por esse usuário.
+        """
+        raise NotImplementedError
+
+    def _filtros(self, coluna_id, id_clube, id_usuario):
+        # (JOINs, condições extras) das restrições por clube e por criador
+        juncoes, condicoes = '', ''
+        if id_clube is not None or id_usuario is not None:
+            juncoes += f'JOIN livros ON livros.id = {coluna_id} '
+        if id_clube is not None:
+            condicoes += 'AND livros.id_clube = :id_clube '
+        if id_usuario is not None:
+            juncoes += 'JOIN clubes ON clubes.id = livros.id_clube '
+            condicoes += 'AND clubes.id_usuario_criador = :id_usuario AND clubes.excluido_em IS NULL '
+        return juncoes, condicoes
+
+    def reindexar(self):
+        """Reconstrói o índice inteiro a partir da tabela livros, em lotes."""
+        from app.models import Livro
+
+        db.session.execute(text(f'DELETE FROM {TABELA}'))
+        ultimo_id = 0
+        total = 0
+        while True:
+            livros = (db.session.query(Livro.id, Livro.titulo, Livro.autor).filter(Livro.id > ultimo_id)
+                      .order_by(Livro.id).limit(TAMANHO_LOTE_REINDEXACAO).all())
+            if not livros:
+                break
+            self._inserir_lote(livros)
+            db.session.commit()
+            total += len(livros)
+            ultimo_id = livros[-1].id
+        db.session.commit()
+        return total
+
+    def indexar_lote(self, livros):
+        """Indexa vários livros [(id, titulo, autor)], substituindo entradas existentes."""
+        if not livros:
+            return
+        db.session.execute(text(f'DELETE FROM {TABELA} WHERE {self.coluna_id} IN :ids')
+                           .bindparams(bindparam('ids', expanding=True)), {'ids': [l[0] for l in livros]})
+        self._inserir_lote(livros)
+
+    def _inserir_lote(self, livros):
+        db.session.execute(text(f'INSERT INTO {TABELA} ({self.coluna_id}, titulo, autor) VALUES (:id, :titulo, :autor)'),
+                           [{'id': id_livro, 'titulo': normalizar(titulo), 'autor': normalizar(autor)}
+                            for id_livro, titulo, autor in livros])
+
+
+class IndiceFTS5(IndiceBusca):
+    coluna_id = 'rowid'
+
+    def indexar(self, id_livro, titulo, autor):
+        self.indexar_lote([(id_livro, titulo, autor)])
+
+    def buscar(self, consulta, limite, deslocamento=0, id_clube=None, id_usuario=None):
+        termos = tokens(consulta)
+        if not termos:
+            raise ErroBusca('Consulta vazia')
+        # Todos os termos precisam aparecer; o último aceita prefixo (busca enquanto digita)
+        expressao = ' '.join(f'"{t}"' for t in termos[:-1]) + f' "{termos[-1]}"*'
+        juncoes, condicoes = self._filtros(f'{TABELA}.rowid', id_clube, id_usuario)
+        # bm25 com peso maior para o título; as funções do FTS5 exigem o nome da tabela sem alias
+        sql = (f'SELECT {TABELA}.rowid, bm25({TABELA}, 2.0, 1.0) AS pontuacao FROM {TABELA} {juncoes}'
+               f'WHERE {TABELA} MATCH :expressao {condicoes}'
+               f'ORDER BY pontuacao, {TABELA}.rowid LIMIT :limite OFFSET :deslocamento')
+        linhas = db.session.execute(text(sql), {'expressao': expressao, 'id_clube': id_clube, 'id_usuario': id_usuario,
+                                                'limite': limite, 'deslocamento': deslocamento})
+        # bm25 é menor para resultados melhores; invertido para ficar "maior é melhor"
+        return [(id_livro, -pontuacao) for id_livro, pontuacao in linhas]
+
+
+class IndiceFulltextMySQL(IndiceBusca):
+    coluna_id = 'id_livro'
+
+    def indexar(self, id_livro, titulo, autor):
+        db.session.execute(text(f'REPLACE INTO {TABELA} (id_livro, titulo, autor) VALUES (:id, :titulo, :autor)'),
+                           {'id': id_livro, 'titulo': normalizar(titulo), 'autor': normalizar(autor)})
+
+    def buscar(self, consulta, limite, deslocamento=0, id_clube=None, id_usuario=None):
+        termos = tokens(consulta)
+        if not termos:
+            raise ErroBusca('Consulta vazia')
+        booleana = ' '.join(f'+{t}' for t in termos[:-1]) + f' +{termos[-1]}*'
+        juncoes, condicoes = self._filtros('b.id_livro', id_clube, id_usuario)
+        sql = (f'SELECT b.id_livro, MATCH(b.titulo, b.autor) AGAINST (:natural) AS pontuacao FROM {TABELA} b {juncoes}'
+               f'WHERE MATCH(b.titulo, b.autor) AGAINST (:booleana IN BOOLEAN MODE) {condicoes}'
+               'ORDER BY pontuacao DESC, b.id_livro LIMIT :limite OFFSET :deslocamento')
+        linhas = db.session.execute(text(sql), {'natural': ' '.join(termos), 'booleana': booleana,
+                                                'id_clube': id_clube, 'id_usuario': id_usuario,
+                                                'limite': limite, 'deslocamento': deslocamento})
+        return [(id_livro, float(pontuacao)) for id_livro, pontuacao in linhas]
+
+
+class IndiceNulo(IndiceBusca):
+    """Usado em bancos sem busca textual: as escritas seguem normalmente e a busca falha."""
+
+    def indexar(self, id_livro, titulo, autor):
+        pass
+
+    def indexar_lote(self, livros):
+        pass
+
+    def remover(self, id_livro):
+        pass
+
+    def remover_lote(self, ids):
+        pass
+
+    def reindexar(self):
+        raise ErroBusca(f'Busca textual não suportada para o banco {db.engine.dialect.name}')
+
+    def buscar(self, consulta, limite, deslocamento=0, id_clube=None, id_usuario=None):
+        raise ErroBusca(f'Busca textual não suportada para o banco {db.engine.dialect.name}')
+
+
+_INDICES = {'sqlite': IndiceFTS5(), 'mysql': IndiceFulltextMySQL()}
+
+
+def indice_busca():
+    """Retorna a implementação do índice para o banco em uso."""
+    return _INDICES.get(db.engine.dialect.name, IndiceNulo())
@@ -0,0 +1,78 @@
+# app/cache_principal.py
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Representação leve do usuário autenticado, entregue às rotas no lugar do objeto Usuario
+Principal = namedtuple('Principal', ['id', 'nome', 'email'])
+
+
+class CachePrincipais:
+    """Cache LRU com TTL de tokens já verificados -> Principal.
+
+    Evita decodificar o JWT e consultar o banco a cada requisição autenticada.
+    Uma entrada nunca vive além da expiração do próprio token. A invalidação é
+    local ao processo; em implantações com vários processos o TTL limita por
+    quanto tempo um dado alterado pode continuar em cache nos demais.
+    """
+
+    def __init__(self, capacidade=4096, ttl=300):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._itens = OrderedDict()  # token -> (principal, expira_em)
+        self._tokens_por_usuario = {}  # user_id -> set de tokens
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+
+    def obter(self, token):
+        agora = time.time()
+        with self._lock:
+            item = self._itens.get(token)
+            if item is None or item[1] <= agora:
+                if item is not None:
+                    self._remover(token)
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(token)
+            self.acertos += 1
+            return item[0]
+
+    def guardar(self, token, principal, expira_token):
+        if self.capacidade <= 0:
+            return
+        expira_em = min(time.time() + self.ttl, expira_token)
+        with self._lock:
+            if token in self._itens:
+                self._remover(token)
+            self._itens[token] = (principal, expira_em)
+            self._tokens_por_usuario.setdefault(principal.id, set()).add(token)
+            while len(self._itens) > self.capacidade:
+                self._remover(next(iter(self._itens)))
+
+    def invalidar_usuario(self, user_id):
+        """Descarta todos os tokens em cache de um usuário (após atualização ou remoção)."""
+        with self._lock:
+            for token in self._tokens_por_usuario.pop(user_id, ()):
+                self._itens.pop(token, None)
+                self.invalidacoes += 1
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._tokens_por_usuario.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            return {'tamanho': len(self._itens), 'acertos': self.acertos, 'falhas': self.falhas,
+                    'invalidacoes': self.invalidacoes}
+
+    def _remover(self, token):
+        # Deve ser chamado com o lock adquirido
+        principal, _ = self._itens.pop(token)
+        tokens = self._tokens_por_usuario.get(principal.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_por_usuario[principal.id]
@@ -0,0 +1,256 @@
+# app/cache_respostas.py
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, current_app, make_response, Response
+from app.eventos import apos_commit
+
+# Cache de respostas das rotas GET públicas.
+#
+# A chave de cada resposta inclui a versão atual de cada tag da rota
+# (ex.: "clubes", "livro:3:avaliacoes"). Invalidar uma tag é só incrementar
+# sua versão: as entradas antigas deixam de ser encontradas e saem por LRU/TTL.
+# O mesmo esquema funciona no backend em memória e no Redis.
+
+
+class BackendLRU:
+    """Backend em memória do processo, limitado por quantidade de entradas e TTL.
+
+    As versões de tags também são locais: com vários processos, cada um só
+    enxerga as próprias invalidações (as demais expiram pelo TTL).
+    """
+
+    def __init__(self, capacidade=1024, ttl=30):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._itens = OrderedDict()  # chave -> (valor, expira_em)
+        self._versoes = {}
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            if item[1] <= time.time():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return item[0]
+
+    def guardar(self, chave, valor, ttl=None):
+        with self._lock:
+            self._itens[chave] = (valor, time.time() + (ttl or self.ttl))
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def versoes(self, tags):
+        with self._lock:
+            return [self._versoes.get(tag, 0) for tag in tags]
+
+    def incrementar(self, tag):
+        with self._lock:
+            self._versoes[tag] = self._versoes.get(tag, 0) + 1
+
+    def travar(self, chave, ttl):
+        # Dentro do processo a exclusão mútua já é feita por CacheRespostas
+        return True
+
+    def destravar(self, chave):
+        pass
+
+    def tamanho(self):
+        return len(self._itens)
+
+
+class BackendRedis:
+    """Backend compartilhado entre processos, para qualquer cliente compatível com redis-py.
+
+    Usa apenas GET, SET (com EX/NX), MGET, INCR e DELETE.
+    """
+
+    def __init__(self, cliente, prefixo='bookbridge:cache:', ttl=30):
+        self.cliente = cliente
+        self.prefixo = prefixo
+        self.ttl = ttl
+
+    def obter(self, chave):
+        valor = self.cliente.get(self.prefixo + chave)
+        if valor is None:
+            return None
+        return json.loads(valor)
+
+    def guardar(self, chave, valor, ttl=None):
+        self.cliente.set(self.prefixo + chave, json.dumps(valor), ex=ttl or self.ttl)
+
+    def versoes(self, tags):
+        valores = self.cliente.mget([self.prefixo + 'tag:' + tag for tag in tags])
+        return [int(v) if v is not None else 0 for v in valores]
+
+    def incrementar(self, tag):
+        self.cliente.incr(self.prefixo + 'tag:' + tag)
+
+    def travar(self, chave, ttl):
+        return bool(self.cliente.set(self.prefixo + 'trava:' + chave, '1', nx=True, ex=ttl))
+
+    def destravar(self, chave):
+        self.cliente.delete(self.prefixo + 'trava:' + chave)
+
+    def tamanho(self):
+        return None
+
+
+class BackendNulo:
+    """Desativa o cache mantendo a mesma interface."""
+
+    def obter(self, chave):
+        return None
+
+    def guardar(self, chave, valor, ttl=None):
+        pass
+
+    def versoes(self, tags):
+        return [0] * len(tags)
+
+    def incrementar(self, tag):
+        pass
+
+    def travar(self, chave, ttl):
+        return True
+
+    def destravar(self, chave):
+        pass
+
+    def tamanho(self):
+        return 0
+
+
+class CacheRespostas:
+    """Cache de respostas com invalidação por tags e recálculo único por chave (single-flight)."""
+
+    ESPERA_TRAVA = 2.0  # Segundos que outro processo espera pelo recálculo antes de calcular também
+    INTERVALO_ESPERA = 0.02
+
+    def __init__(self, backend, ttl=30):
+        self.backend = backend
+        self.ttl = ttl
+        self._travas = {}
+        self._travas_lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+        self.esperas = 0  # Requisições que aguardaram o recálculo de outra
+
+    def chave(self, tags):
+        versoes = self.backend.versoes(tags)
+        marcadores = ','.join(f'{tag}={versao}' for tag, versao in zip(tags, versoes))
+        return f"{request.endpoint}|{request.full_path}|{request.headers.get('Accept', '')}|{marcadores}"
+
+    def invalidar(self, *tags):
+        for tag in tags:
+            self.backend.incrementar(tag)
+        self.invalidacoes += len(tags)
+
+    def obter_ou_calcular(self, chave, calcular, ttl=None):
+        valor = self.backend.obter(chave)
+        if valor is not None:
+            self.acertos += 1
+            return valor
+
+        # Apenas uma thread por processo recalcula cada chave; as outras esperam por ela
+        with self._travas_lock:
+            trava = self._travas.setdefault(chave, threading.Lock())
+        if not trava.acquire(blocking=False):
+            self.esperas += 1
+            trava.acquire()
+        try:
+            valor = self.backend.obter(chave)
+            if valor is not None:
+                self.acertos += 1
+                return valor
+            self.falhas += 1
+            return self._calcular_entre_processos(chave, calcular, ttl or self.ttl)
+        finally:
+            trava.release()
+            with self._travas_lock:
+                if self._travas.get(chave) is trava:
+                    del self._travas[chave]
+
+    def _calcular_entre_processos(self, chave, calcular, ttl):
+        # Com backend compartilhado, outro processo pode já estar recalculando a mesma chave
+        if not self.backend.travar(chave, int(self.ESPERA_TRAVA) + 1):
+            self.esperas += 1
+            limite = time.time() + self.ESPERA_TRAVA
+            while time.time() < limite:
+                time.sleep(self.INTERVALO_ESPERA)
+                valor = self.backend.obter(chave)
+                if valor is not None:
+                    return valor
+        try:
+            valor = calcular()
+            if valor is not None:
+                self.backend.guardar(chave, valor, ttl)
+            return valor
+        finally:
+            self.backend.destravar(chave)
+
+    def estatisticas(self):
+        return {'acertos': self.acertos, 'falhas': self.falhas, 'invalidacoes': self.invalidacoes,
+                'esperas': self.esperas, 'tamanho': self.backend.tamanho()}
+
+
+def criar_cache(config):
+    """Cria o cache conforme CACHE_RESPOSTAS_TIPO: 'lru' (padrão), 'redis' ou 'nenhum'."""
+    tipo = config.get('CACHE_RESPOSTAS_TIPO', 'lru')
+    ttl = config.get('CACHE_RESPOSTAS_TTL', 30)
+    if tipo == 'nenhum':
+        return CacheRespostas(BackendNulo(), ttl)
+    if tipo == 'redis':
+        import redis  # Dependência opcional, necessária apenas para este backend
+        return CacheRespostas(BackendRedis(redis.Redis.from_url(config['CACHE_REDIS_URL']), ttl=ttl), ttl)
+    return CacheRespostas(BackendLRU(config.get('CACHE_RESPOSTAS_TAMANHO', 1024), ttl), ttl)
+
+
+def cache_respostas():
+    return current_app.extensions['cache_respostas']
+
+
+def cache_resposta(tags, ttl=None):
+    """Decorador de rotas GET públicas: guarda respostas 200 sob as tags ``tags(**kwargs)``.
+
+    Respostas em streaming (?stream=) não são guardadas.
+    """
+    def decorador(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.args.get('stream'):
+                return f(*args, **kwargs)
+
+            cache = cache_respostas()
+
+            def calcular():
+                resposta = make_response(f(*args, **kwargs))
+                if resposta.status_code != 200 or resposta.is_streamed:
+                    # Não é guardada, mas é devolvida ao cliente como veio
+                    calcular.resposta = resposta
+                    return None
+                return {'status': resposta.status_code, 'headers': list(resposta.headers.items()),
+                        'corpo': resposta.get_data().decode('latin-1')}
+
+            calcular.resposta = None
+            valor = cache.obter_ou_calcular(cache.chave(tags(**kwargs)), calcular, ttl)
+            if valor is None:
+                return calcular.resposta if calcular.resposta is not None else f(*args, **kwargs)
+
+            resposta = Response(valor['corpo'].encode('latin-1'), status=valor['status'], headers=valor['headers'])
+            return resposta.make_conditional(request)
+        return decorated
+    return decorador
+
+
+def invalidar_apos_commit(*tags):
+    """Invalida as tags quando a transação corrente for confirmada."""
+    apos_commit(cache_respostas().invalidar, *tags)
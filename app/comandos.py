@@ -0,0 +1,174 @@
+# app/comandos.py
+import click
+from flask.cli import AppGroup
+
+# Comandos de linha de comando (flask <grupo> <comando>)
+estatisticas_cli = AppGroup('estatisticas', help='Manutenção dos agregados de /estatisticas.')
+
+
+@estatisticas_cli.command('recalcular')
+def recalcular():
+    """Reconstrói os contadores do zero e informa as divergências encontradas."""
+    from app.agregados import recalcular_estatisticas
+
+    divergencias = recalcular_estatisticas()
+    if not divergencias:
+        click.echo('Contadores consistentes, nenhuma divergência encontrada.')
+        return
+    livros = divergencias.pop('resumos_livros', 0)
+    clubes = divergencias.pop('resumos_clubes', 0)
+    for campo, diferenca in divergencias.items():
+        click.echo(f'{campo}: divergência de {diferenca:+d} corrigida')
+    if livros:
+        click.echo(f'resumos de livros corrigidos: {livros}')
+    if clubes:
+        click.echo(f'resumos de clubes corrigidos: {clubes}')
+
+
+busca_cli = AppGroup('busca', help='Manutenção do índice de busca textual de livros.')
+
+
+@busca_cli.command('reindexar')
+def reindexar():
+    """Reconstrói o índice de busca a partir da tabela de livros."""
+    from app.busca import indice_busca, ErroBusca
+
+    try:
+        total = indice_busca().reindexar()
+    except ErroBusca as e:
+        raise click.ClickException(str(e))
+    click.echo(f'{total} livros indexados.')
+
+
+@click.command('exportar')
+@click.argument('entidade', type=click.Choice(['clubes', 'livros', 'avaliacoes']))
+@click.option('--formato', type=click.Choice(['csv', 'ndjson', 'parquet']), default='csv')
+@click.option('--saida', type=click.Path(dir_okay=False), required=True, help='Arquivo de destino.')
+@click.option('--juntar', is_flag=True, help='Inclui colunas do livro/clube relacionados.')
+@click.option('--lote', type=int, default=5000, show_default=True, help='Linhas lidas por vez do cursor.')
+def exportar(entidade, formato, saida, juntar, lote):
+    """Exporta clubes, livros ou avaliações direto de um cursor do servidor."""
+    from app.exportacao import Exportacao, ErroExportacao
+
+    exportacao = Exportacao(entidade, juntar, lote)
+    try:
+        if formato == 'parquet':
+            exportacao.parquet(saida)
+        else:
+            with open(saida, 'w', encoding='utf-8', newline='') as arquivo:
+                for pedaco in getattr(exportacao, formato)():
+                    arquivo.write(pedaco)
+    except ErroExportacao as e:
+        raise click.ClickException(str(e))
+
+    vazao = exportacao.vazao()
+    click.echo(f"{vazao['linhas']} linhas exportadas em {vazao['segundos']}s "
+               f"({vazao['linhas_por_segundo']} linhas/s)")
+
+
+@click.command('auditar-consultas')
+def auditar_consultas():
+    """Roda EXPLAIN nas consultas de todas as rotas GET e falha se houver varredura completa ou resposta de erro."""
+    from flask import current_app
+    from app.auditoria import auditar, requisicoes_get
+    from app.models import Clube, Livro, Avaliacao, TarefaExclusao
+    from routes.routes import gerador_token
+
+    # Usa dados existentes: o primeiro clube, seu criador, um livro dele e uma avaliação desse livro
+    clube = Clube.query.order_by(Clube.id).first()
+    if clube is None:
+        raise click.ClickException('Banco sem clubes: popule os dados antes de auditar')
+    ids = {'clubes': clube.id, 'usuarios': clube.id_usuario_criador}
+    livro = Livro.query.filter_by(id_clube=clube.id).order_by(Livro.id).first()
+    if livro is not None:
+        ids['livros'] = livro.id
+        avaliacao = Avaliacao.query.filter_by(id_livro=livro.id).order_by(Avaliacao.id).first()
+        if avaliacao is not None:
+            ids['avaliacoes'] = avaliacao.id
+    tarefa = TarefaExclusao.query.order_by(TarefaExclusao.id).first()
+    if tarefa is not None:
+        ids['tarefas_exclusao'] = tarefa.id
+    # A exportação só responde 2xx para administradores
+    valores = {'entidade': 'clubes'} if clube.id_usuario_criador in current_app.config['ADMIN_IDS'] else {}
+
+    headers = {'Authorization': f'Bearer {gerador_token(clube.id_usuario_criador)}'}
+    requisicoes, ignoradas = requisicoes_get(current_app, ids, {'headers': headers}, valores)
+    problemas = auditar(current_app.test_client(), requisicoes)
+
+    click.echo(f'{len(requisicoes)} rotas auditadas.')
+    if ignoradas:
+        click.echo(f"{len(ignoradas)} rotas não auditadas (sem dados para os parâmetros): {', '.join(ignoradas)}")
+    for problema in problemas:
+        if 'status' in problema:
+            click.echo(f"{problema['rota']}: respondeu {problema['status']}, esperado 2xx")
+        else:
+            click.echo(f"{problema['rota']}: varredura completa em {', '.join(problema['tabelas'])}\n    {problema['sql']}")
+    if problemas:
+        raise SystemExit(1)
+
+
+recomendacoes_cli = AppGroup('recomendacoes', help='Livros similares e recomendações.')
+
+
+@recomendacoes_cli.command('calcular')
+@click.option('--k', type=int, default=None, help='Vizinhos guardados por livro (padrão: 20).')
+@click.option('--completo', is_flag=True, help='Recalcula todos os livros em vez de só os alterados.')
+@click.option('--memoria-mb', type=int, default=None, help='Limite de memória dos blocos de similaridade (padrão: 256).')
+def calcular_recomendacoes(k, completo, memoria_mb):
+    """Recalcula a tabela livros_similares a partir das avaliações."""
+    from app.recomendacoes import calcular_similares, TOP_K_PADRAO, MEMORIA_PADRAO_MB
+
+    resumo = calcular_similares(k=k or TOP_K_PADRAO, completo=completo, memoria_mb=memoria_mb or MEMORIA_PADRAO_MB)
+    click.echo(f"{resumo['livros_recalculados']} livros recalculados ({resumo['motor']}), "
+               f"{resumo['vizinhos_gravados']} vizinhos gravados a partir de {resumo['avaliacoes']} "
+               f"avaliações em {resumo['segundos']}s.")
+
+
+ranking_cli = AppGroup('ranking', help='Ranking de livros (GET /livros/ranking).')
+
+
+@ranking_cli.command('reconstruir')
+def reconstruir():
+    """Recalcula a pontuação de todos os livros (necessário após mudar RANKING_*_PRIORI)."""
+    from app.ranking import reconstruir_ranking
+
+    click.echo(f'{reconstruir_ranking()} livros reprocessados.')
+
+
+exclusoes_cli = AppGroup('exclusoes', help='Exclusões de clubes e usuários em segundo plano.')
+
+
+@exclusoes_cli.command('retomar')
+def retomar():
+    """Executa as tarefas de exclusão pendentes, interrompidas ou que falharam."""
+    from app.exclusao import retomar_pendentes
+
+    tarefas = retomar_pendentes()
+    for tarefa in tarefas:
+        click.echo(f'Tarefa {tarefa.id} ({tarefa.entidade} {tarefa.id_alvo}): {tarefa.estado}'
+                   + (f' - {tarefa.erro}' if tarefa.erro else ''))
+    if not tarefas:
+        click.echo('Nenhuma tarefa pendente.')
+
+
+mudancas_cli = AppGroup('mudancas', help='Log de mudanças (GET /mudancas).')
+
+
+@mudancas_cli.command('compactar')
+def compactar():
+    """Compacta o log de mudanças agora, sem esperar a thread de segundo plano."""
+    from app.mudancas import compactar_mudancas
+
+    resultado = compactar_mudancas()
+    click.echo(f"{resultado['compactadas']} entradas substituídas, {resultado['expurgadas']} exclusões descartadas.")
+
+
+def registrar_comandos(app):
+    app.cli.add_command(estatisticas_cli)
+    app.cli.add_command(exportar)
+    app.cli.add_command(busca_cli)
+    app.cli.add_command(auditar_consultas)
+    app.cli.add_command(recomendacoes_cli)
+    app.cli.add_command(ranking_cli)
+    app.cli.add_command(exclusoes_cli)
+    app.cli.add_command(mudancas_cli)
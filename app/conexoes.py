@@ -0,0 +1,126 @@
+# app/conexoes.py
+import random
+import time
+from flask import g, request, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.sql.elements import TextClause
+
+# Configuração dos engines e roteamento de leituras para réplicas.
+#
+# Requisições GET/HEAD leem de uma réplica sorteada no início da requisição;
+# escritas (flush, INSERT/UPDATE/DELETE) e o restante da requisição depois
+# delas vão para o primário. Após uma escrita bem-sucedida o cliente recebe
+# um cookie que, enquanto válido, faz suas leituras também irem ao primário
+# (leitura após escrita, apesar do atraso de replicação).
+
+COOKIE_PRIMARIO = 'bb_primario'
+METODOS_LEITURA = ('GET', 'HEAD')
+
+# Variável de ambiente -> (opção do create_engine, conversão); só entra quem estiver definido
+OPCOES_POOL = {
+    'DB_POOL_SIZE': ('pool_size', int),
+    'DB_MAX_OVERFLOW': ('max_overflow', int),
+    'DB_POOL_TIMEOUT': ('pool_timeout', float),
+    'DB_POOL_RECYCLE': ('pool_recycle', int),
+    'DB_POOL_PRE_PING': ('pool_pre_ping', lambda valor: valor.lower() in ('1', 'true', 'sim')),
+}
+
+PRAGMAS_SQLITE_PADRAO = {
+    'journal_mode': 'WAL',     # Leitores não bloqueiam o escritor
+    'synchronous': 'NORMAL',   # Seguro com WAL e bem mais rápido que FULL
+    'busy_timeout': 5000,      # Espera a trava de escrita em vez de falhar na hora
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,      # ~20 MB por conexão
+}
+
+
+def opcoes_engine(ambiente):
+    """Monta SQLALCHEMY_ENGINE_OPTIONS a partir das variáveis DB_* definidas em ``ambiente``."""
+    opcoes = {}
+    for variavel, (opcao, converter) in OPCOES_POOL.items():
+        if ambiente.get(variavel):
+            opcoes[opcao] = converter(ambiente[variavel])
+    return opcoes
+
+
+def ler_pragmas(texto):
+    """Converte "journal_mode=WAL,synchronous=NORMAL" em dicionário."""
+    return dict(item.split('=', 1) for item in (texto or '').split(',') if '=' in item)
+
+
+def configurar_engines(engines, pragmas_sqlite, timeout_consulta_ms):
+    """Aplica pragmas do SQLite e o tempo máximo de consulta em cada nova conexão."""
+    for engine in engines:
+        dialeto = engine.dialect.name
+
+        @event.listens_for(engine, 'connect')
+        def ao_conectar(conexao_dbapi, registro, dialeto=dialeto):
+            cursor = conexao_dbapi.cursor()
+            try:
+                if dialeto == 'sqlite':
+                    for nome, valor in pragmas_sqlite.items():
+                        cursor.execute(f'PRAGMA {nome} = {valor}')
+                elif timeout_consulta_ms and dialeto == 'mysql':
+                    # Vale para SELECTs; o servidor interrompe a consulta ao atingir o limite
+                    cursor.execute(f'SET SESSION MAX_EXECUTION_TIME = {int(timeout_consulta_ms)}')
+                elif timeout_consulta_ms and dialeto == 'postgresql':
+                    cursor.execute(f'SET statement_timeout = {int(timeout_consulta_ms)}')
+            finally:
+                cursor.close()
+
+
+def _e_escrita(clause):
+    if getattr(clause, 'is_dml', False):
+        return True
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip().upper().startswith(('SELECT', 'WITH'))
+    return False
+
+
+class SessaoRoteada(Session):
+    """Sessão que lê da réplica escolhida para a requisição enquanto ela não escrever nada."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('replica'):
+            if self._flushing or _e_escrita(clause):
+                g.replica = None  # Daqui em diante a requisição fica no primário
+            else:
+                return g.replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def criar_replicas(app):
+    """Cria um engine por URI de DATABASE_REPLICAS, com as mesmas opções do primário.
+
+    As réplicas ficam fora de SQLALCHEMY_BINDS: não são binds de modelos e
+    não devem entrar em create_all/drop_all nem nas migrações.
+    """
+    opcoes = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    app.extensions['replicas'] = [create_engine(uri, **opcoes) for uri in app.config['DATABASE_REPLICAS']]
+    return app.extensions['replicas']
+
+
+def iniciar_roteamento(app):
+    """Registra a escolha da réplica por requisição e o cookie de leitura após escrita."""
+    replicas = app.extensions.get('replicas', [])
+
+    @app.before_request
+    def escolher_replica():
+        g.replica = None
+        if not replicas or request.method not in METODOS_LEITURA:
+            return
+        try:
+            primario_ate = float(request.cookies.get(COOKIE_PRIMARIO, 0))
+        except ValueError:
+            primario_ate = 0
+        if primario_ate < time.time():
+            g.replica = random.choice(replicas)
+
+    @app.after_request
+    def marcar_escrita(response):
+        if replicas and request.method not in METODOS_LEITURA and response.status_code < 400:
+            atraso = app.config['REPLICA_ATRASO_MAXIMO']
+            response.set_cookie(COOKIE_PRIMARIO, str(time.time() + atraso), max_age=int(atraso) + 1,
+                                httponly=True, samesite='Lax')
+        return response
@@ -1,4 +1,6 @@
 # app/database.py
 from flask_sqlalchemy import SQLAlchemy
+from app.conexoes import SessaoRoteada
 
-db = SQLAlchemy()
+# A sessão envia as leituras das requisições GET para uma réplica, quando configurada
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
@@ -0,0 +1,24 @@
+# app/eventos.py
+from sqlalchemy import event
+from app.database import db
+
+# Ações que só devem acontecer se a transação da rota for confirmada
+# (invalidação de caches, notificações). Em rollback elas são descartadas.
+
+CHAVE = 'apos_commit'
+
+
+def apos_commit(funcao, *args):
+    """Agenda ``funcao(*args)`` para logo depois do próximo commit da sessão corrente."""
+    db.session.info.setdefault(CHAVE, []).append((funcao, args))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _executar(session):
+    for funcao, args in session.info.pop(CHAVE, []):
+        funcao(*args)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _descartar(session):
+    session.info.pop(CHAVE, None)
@@ -0,0 +1,266 @@
+# app/exclusao.py
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, delete, or_
+from sqlalchemy.exc import IntegrityError
+from app.database import db
+from app.models import Usuario, Clube, Livro, Avaliacao, ResumoLivro, ResumoClube, LivroSimilar, TarefaExclusao
+from app.agregados import ajustar_estatisticas, ajustar_resumos_livros
+from app.busca import indice_busca
+from app.versoes import marcar_alteracao_livros, agora as agora_versao
+from app.cache_respostas import invalidar_apos_commit
+from app.filtro_emails import filtro_emails
+from app.mudancas import registrar_mudanca, registrar_mudancas
+
+# Exclusão de clubes e usuários em segundo plano.
+#
+# A rota só marca o alvo com excluido_em (ele some das leituras na hora) e
+# registra uma TarefaExclusao. A tarefa remove as dependentes em lotes
+# limitados, cada um na sua transação curta, na ordem das chaves
+# estrangeiras: avaliações -> livros -> clube (e, para um usuário, os clubes
+# dele, as avaliações dele em outros livros e por fim o usuário). Cada lote
+# ajusta os agregados e o progresso da tarefa na mesma transação, então uma
+# tarefa interrompida pode ser retomada (`flask exclusoes retomar`) sem
+# contar nada duas vezes. Cada lote também registra no log de mudanças as
+# avaliações e livros removidos.
+#
+# Nos agregados, o clube deixa de contar em total_clubes já no agendamento;
+# livros e avaliações são descontados pelos lotes que os removem. O
+# recálculo (`flask estatisticas recalcular`) segue a mesma regra, então pode
+# rodar com exclusões pendentes.
+#
+# Só um executor por tarefa: ela é reivindicada com um UPDATE condicional
+# do estado (quem não altera a linha desiste). Uma tarefa 'executando' só
+# volta a ser reivindicável depois de EXCLUSAO_TAREFA_EXPIRA segundos sem
+# lote confirmado, o sinal de que o processo que a executava morreu.
+#
+# Os livros de um clube oculto também somem das leituras (livro_visivel) e
+# deixam de aceitar avaliações. Uma avaliação que já estava em andamento
+# quando o clube foi ocultado ainda pode chegar entre a limpeza das
+# avaliações e a remoção dos livros: o lote é desfeito e repetido, e a
+# repetição leva a avaliação junto.
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+_threads = None
+
+
+def visivel(modelo, id):
+    """Retorna o clube/usuário se existir e não estiver com exclusão agendada."""
+    objeto = db.session.get(modelo, id)
+    return objeto if objeto is not None and objeto.excluido_em is None else None
+
+
+def livro_visivel(id_livro, id_usuario=None):
+    """Retorna o livro se existir e o clube dele não estiver com exclusão agendada.
+
+    Com ``id_usuario``, só se o clube tiver sido criado por esse usuário.
+    """
+    consulta = (db.session.query(Livro).join(Clube, Clube.id == Livro.id_clube)
+                .filter(Livro.id == id_livro, Clube.excluido_em.is_(None)))
+    if id_usuario is not None:
+        consulta = consulta.filter(Clube.id_usuario_criador == id_usuario)
+    return consulta.first()
+
+
+def agendar_exclusao(entidade, alvo):
+    """Oculta o alvo e cria a tarefa na transação corrente; chame executar() depois do commit."""
+    agora = datetime.utcnow()
+    alvo.excluido_em = agora
+    clubes = [alvo.id]
+    if entidade == 'usuario':
+        # Os clubes do usuário somem junto com ele
+        clubes = [id_clube for id_clube, in db.session.query(Clube.id)
+                  .filter(Clube.id_usuario_criador == alvo.id, Clube.excluido_em.is_(None))]
+        if clubes:
+            db.session.query(Clube).filter(Clube.id.in_(clubes)) \
+                .update({Clube.excluido_em: agora}, synchronize_session=False)
+    if clubes:
+        ajustar_estatisticas(total_clubes=-len(clubes), versao_clubes=1)
+        invalidar_apos_commit('clubes', 'estatisticas')
+        _ocultar_livros(clubes)
+    tarefa = TarefaExclusao(entidade=entidade, id_alvo=alvo.id, estado='pendente')
+    db.session.add(tarefa)
+    if entidade == 'usuario':
+        registrar_mudanca('usuario', alvo.id, 'excluido')
+    registrar_mudancas('clube', 'excluido', clubes)
+    return tarefa
+
+
+def _ocultar_livros(clubes):
+    # Os livros somem junto com o clube: respostas em cache e ETags deixam de valer já no commit,
+    # sem esperar a tarefa removê-los
+    momento = agora_versao()
+    for modelo, filtro in ((Clube, Clube.id.in_(clubes)), (Livro, Livro.id_clube.in_(clubes))):
+        db.session.query(modelo).filter(filtro).update(
+            {modelo.versao: modelo.versao + 1, modelo.atualizado_em: momento}, synchronize_session=False)
+    ids = [id_livro for id_livro, in db.session.query(Livro.id).filter(Livro.id_clube.in_(clubes))]
+    invalidar_apos_commit(*(f'livro:{id_livro}:avaliacoes' for id_livro in ids))
+
+
+def _obter_executor():
+    global _executor, _threads
+    threads = current_app.config.get('EXCLUSAO_THREADS', 0)
+    if threads <= 0:
+        return None
+    with _lock:
+        if _executor is None or _threads != threads:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='exclusao')
+            _threads = threads
+        return _executor
+
+
+def executar(id_tarefa):
+    """Executa a tarefa no pool de threads (EXCLUSAO_THREADS = 0: na thread atual)."""
+    executor = _obter_executor()
+    if executor is None:
+        executar_tarefa(id_tarefa)
+        return
+    app = current_app._get_current_object()
+
+    def em_contexto():
+        with app.app_context():
+            executar_tarefa(id_tarefa)
+
+    executor.submit(em_contexto)
+
+
+def _reivindicaveis():
+    # Pendentes, que falharam ou abandonadas no meio da execução
+    expiradas = datetime.utcnow() - timedelta(seconds=current_app.config['EXCLUSAO_TAREFA_EXPIRA'])
+    return or_(TarefaExclusao.estado.in_(['pendente', 'falhou']),
+               and_(TarefaExclusao.estado == 'executando',
+                    or_(TarefaExclusao.atualizado_em.is_(None), TarefaExclusao.atualizado_em < expiradas)))
+
+
+def executar_tarefa(id_tarefa):
+    """Remove o alvo da tarefa em lotes; retorna a tarefa com o estado final.
+
+    Se outro executor já estiver com a tarefa (ou ela tiver terminado),
+    retorna sem fazer nada.
+    """
+    reivindicada = db.session.query(TarefaExclusao) \
+        .filter(TarefaExclusao.id == id_tarefa, _reivindicaveis()) \
+        .update({TarefaExclusao.estado: 'executando', TarefaExclusao.erro: None,
+                 TarefaExclusao.atualizado_em: datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    tarefa = db.session.get(TarefaExclusao, id_tarefa)
+    if not reivindicada:
+        return tarefa
+
+    try:
+        if tarefa.entidade == 'clube':
+            _excluir_clube(tarefa, tarefa.id_alvo)
+        else:
+            _excluir_usuario(tarefa, tarefa.id_alvo)
+        tarefa.estado = 'concluida'
+        tarefa.concluido_em = datetime.utcnow()
+        db.session.commit()
+        logger.info(f'Exclusão de {tarefa.entidade} {tarefa.id_alvo} concluída: {tarefa.avaliacoes_removidas} '
+                    f'avaliações, {tarefa.livros_removidos} livros, {tarefa.clubes_removidos} clubes')
+    except Exception as e:
+        db.session.rollback()
+        tarefa = db.session.get(TarefaExclusao, id_tarefa)
+        tarefa.estado = 'falhou'
+        tarefa.erro = str(e)[:255]
+        db.session.commit()
+        logger.error(f'Exclusão de {tarefa.entidade} {tarefa.id_alvo} falhou: {e}')
+    return tarefa
+
+
+def retomar_pendentes():
+    """Executa, na thread atual, as tarefas pendentes, que falharam ou abandonadas (ex.: processo reiniciado no meio).
+
+    Tarefas que outro executor está rodando ficam de fora, assim como as
+    que ele reivindicar entre a listagem e a execução.
+    """
+    ids = [id_tarefa for id_tarefa, in db.session.query(TarefaExclusao.id)
+           .filter(_reivindicaveis()).order_by(TarefaExclusao.id)]
+    db.session.commit()
+    tarefas = [executar_tarefa(id_tarefa) for id_tarefa in ids]
+    return [tarefa for tarefa in tarefas if tarefa.estado != 'executando']
+
+
+def _lote():
+    return current_app.config['EXCLUSAO_TAMANHO_LOTE']
+
+
+def _confirmar_lote(tarefa, **progresso):
+    for campo, quantidade in progresso.items():
+        setattr(tarefa, campo, getattr(tarefa, campo) + quantidade)
+    tarefa.atualizado_em = datetime.utcnow()
+    db.session.commit()
+    pausa = current_app.config.get('EXCLUSAO_PAUSA', 0)
+    if pausa:
+        time.sleep(pausa)  # Deixa espaço para as transações das requisições
+
+
+def _excluir_avaliacoes(tarefa, filtro, ajustar_resumos):
+    # Avaliações do filtro em lotes; ajustar_resumos=False quando os livros também serão removidos
+    while True:
+        linhas = db.session.query(Avaliacao.id, Avaliacao.id_livro, Avaliacao.nota).filter(filtro) \
+            .order_by(Avaliacao.id).limit(_lote()).all()
+        if not linhas:
+            return
+        db.session.execute(delete(Avaliacao).where(Avaliacao.id.in_([linha.id for linha in linhas])))
+        ajustar_estatisticas(soma_notas=-sum(linha.nota for linha in linhas), total_avaliacoes=-len(linhas))
+        if ajustar_resumos:
+            _ajustar_resumos(linhas)
+        registrar_mudancas('avaliacao', 'excluido', [linha.id for linha in linhas])
+        _confirmar_lote(tarefa, avaliacoes_removidas=len(linhas))
+
+
+def _ajustar_resumos(linhas):
+    # Um UPDATE por livro com todas as notas removidas dele (em vez de um por avaliação)
+    livros = ajustar_resumos_livros(((id_livro, nota) for _, id_livro, nota in linhas), -1)
+    marcar_alteracao_livros(livros)
+    invalidar_apos_commit('estatisticas', *(f'livro:{id_livro}:avaliacoes' for id_livro in livros))
+
+
+def _excluir_clube(tarefa, id_clube):
+    id_criador = db.session.query(Clube.id_usuario_criador).filter_by(id=id_clube).scalar()
+    while True:
+        ids = [id_livro for id_livro, in db.session.query(Livro.id).filter(Livro.id_clube == id_clube)
+               .order_by(Livro.id).limit(_lote())]
+        if not ids:
+            break
+        # As avaliações desses livros primeiro (em lotes próprios), depois os livros
+        _excluir_avaliacoes(tarefa, Avaliacao.id_livro.in_(ids), ajustar_resumos=False)
+        db.session.execute(delete(LivroSimilar).where(or_(LivroSimilar.id_livro.in_(ids),
+                                                          LivroSimilar.id_similar.in_(ids))))
+        db.session.execute(delete(ResumoLivro).where(ResumoLivro.id_livro.in_(ids)))
+        indice_busca().remover_lote(ids)
+        try:
+            db.session.execute(delete(Livro).where(Livro.id.in_(ids)))
+        except IntegrityError:
+            # Avaliação gravada depois da limpeza acima: repete o lote
+            db.session.rollback()
+            continue
+        ajustar_estatisticas(total_livros=-len(ids))
+        registrar_mudancas('livro', 'excluido', ids, id_criador)
+        invalidar_apos_commit('estatisticas', *(f'livro:{id_livro}:avaliacoes' for id_livro in ids))
+        _confirmar_lote(tarefa, livros_removidos=len(ids))
+
+    db.session.execute(delete(ResumoClube).where(ResumoClube.id_clube == id_clube))
+    removidos = db.session.execute(delete(Clube).where(Clube.id == id_clube)).rowcount
+    _confirmar_lote(tarefa, clubes_removidos=removidos)
+
+
+def _excluir_usuario(tarefa, id_usuario):
+    for id_clube, in db.session.query(Clube.id).filter(Clube.id_usuario_criador == id_usuario).order_by(Clube.id).all():
+        _excluir_clube(tarefa, id_clube)
+    _excluir_avaliacoes(tarefa, Avaliacao.id_usuario == id_usuario, ajustar_resumos=True)
+    email = db.session.query(Usuario.email).filter_by(id=id_usuario).scalar()
+    db.session.execute(delete(Usuario).where(Usuario.id == id_usuario))
+    db.session.commit()
+    if email is not None:
+        filtro_emails().remover(email)  # O email volta a poder ser cadastrado
+
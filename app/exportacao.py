@@ -0,0 +1,99 @@
+# app/exportacao.py
+import csv
+import io
+import json
+import time
+from sqlalchemy import select, Integer
+from app.database import db
+from app.models import Clube, Livro, Avaliacao
+
+FORMATOS = ('csv', 'ndjson', 'parquet')
+ENTIDADES = ('clubes', 'livros', 'avaliacoes')
+TAMANHO_LOTE_PADRAO = 5000  # Linhas buscadas por vez do cursor do servidor (e por row group no Parquet)
+
+
+class ErroExportacao(ValueError):
+    """Erro levantado para entidade/formato inválidos ou dependência ausente."""
+
+
+def _consulta(entidade, juntar):
+    # Consulta apenas de colunas (sem objetos do ORM), opcionalmente com os dados do pai.
+    # Clubes com exclusão agendada (e seus livros e avaliações) ficam de fora, como nas rotas
+    if entidade == 'clubes':
+        return (select(Clube.id, Clube.nome, Clube.descricao, Clube.id_usuario_criador)
+                .where(Clube.excluido_em.is_(None)).order_by(Clube.id))
+    if entidade == 'livros':
+        colunas = [Livro.id, Livro.titulo, Livro.autor, Livro.id_clube]
+        if juntar:
+            colunas.append(Clube.nome.label('clube_nome'))
+        return (select(*colunas).join(Clube, Clube.id == Livro.id_clube)
+                .where(Clube.excluido_em.is_(None)).order_by(Livro.id))
+    if entidade == 'avaliacoes':
+        colunas = [Avaliacao.id, Avaliacao.nota, Avaliacao.comentario, Avaliacao.id_livro, Avaliacao.id_usuario]
+        if juntar:
+            colunas += [Livro.titulo.label('livro_titulo'), Livro.autor.label('livro_autor'), Livro.id_clube,
+                        Clube.nome.label('clube_nome')]
+        return (select(*colunas)
+                .join(Livro, Livro.id == Avaliacao.id_livro)
+                .join(Clube, Clube.id == Livro.id_clube)
+                .where(Clube.excluido_em.is_(None))
+                .order_by(Avaliacao.id))
+    raise ErroExportacao(f"Entidade inválida, use uma de: {', '.join(ENTIDADES)}")
+
+
+class Exportacao:
+    """Percorre uma entidade com cursor do lado do servidor e mede a vazão."""
+
+    def __init__(self, entidade, juntar=False, tamanho_lote=TAMANHO_LOTE_PADRAO):
+        self.consulta = _consulta(entidade, juntar)
+        self.entidade = entidade
+        self.colunas = [coluna.name for coluna in self.consulta.selected_columns]
+        self.tamanho_lote = tamanho_lote
+        self.linhas = 0
+        self.inicio = None
+        self.fim = None
+
+    def lotes(self):
+        """Gera listas de tuplas com no máximo ``tamanho_lote`` linhas."""
+        self.inicio = time.perf_counter()
+        resultado = db.session.execute(self.consulta.execution_options(stream_results=True,
+                                                                       yield_per=self.tamanho_lote))
+        for lote in resultado.partitions():
+            self.linhas += len(lote)
+            yield [tuple(linha) for linha in lote]
+        self.fim = time.perf_counter()
+
+    def vazao(self):
+        duracao = max((self.fim or time.perf_counter()) - (self.inicio or time.perf_counter()), 1e-9)
+        return {'linhas': self.linhas, 'segundos': round(duracao, 3), 'linhas_por_segundo': round(self.linhas / duracao)}
+
+    def csv(self):
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(self.colunas)
+        for lote in self.lotes():
+            escritor.writerows(lote)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    def ndjson(self):
+        for lote in self.lotes():
+            yield ''.join(json.dumps(dict(zip(self.colunas, linha)), ensure_ascii=False) + '\n' for linha in lote)
+
+    def parquet(self, destino):
+        """Grava em Parquet, um row group por lote. Requer o pacote opcional pyarrow."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ErroExportacao('Exportação em Parquet requer o pacote pyarrow')
+
+        # Esquema derivado das colunas, para que lotes só com nulos não mudem o tipo
+        esquema = pa.schema([(coluna.name, pa.int64() if isinstance(coluna.type, Integer) else pa.string())
+                             for coluna in self.consulta.selected_columns])
+        with pq.ParquetWriter(destino, esquema) as escritor:
+            for lote in self.lotes():
+                colunas = dict(zip(self.colunas, (list(valores) for valores in zip(*lote))))
+                escritor.write_table(pa.table(colunas, schema=esquema))
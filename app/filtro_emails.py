@@ -0,0 +1,133 @@
+# app/filtro_emails.py
+import hashlib
+import logging
+import math
+import threading
+from flask import current_app
+from app.database import db
+from app.models import Usuario
+
+# Verificação rápida de email já cadastrado, antes do hash da senha.
+#
+# Um filtro de Bloom com contadores guarda os emails conhecidos pelo
+# processo. Quando ele responde "não existe", o cadastro segue sem consultar
+# o banco; quando responde "talvez", uma consulta pelo índice único de email
+# confirma. Falsos positivos custam só essa consulta, e são contados para
+# acompanhar a taxa real do filtro.
+#
+# O filtro é local ao processo e montado a partir da tabela de usuários no
+# primeiro uso. Um email cadastrado por outro processo passa pelo filtro,
+# mas esbarra no índice único no commit, e a rota também responde 409.
+
+TAMANHO_LOTE_CARGA = 10000
+MAXIMO_CONTADOR = 255  # Contadores saturados não são mais decrementados
+
+logger = logging.getLogger(__name__)
+
+
+def normalizar(email):
+    # Minúsculas no filtro: em bancos com colação sensível a maiúsculas isso só gera falsos positivos
+    return str(email).strip().lower()
+
+
+class FiltroBloom:
+    """Filtro de Bloom com contadores de 8 bits: aceita remoções."""
+
+    def __init__(self, capacidade, taxa_falsos):
+        capacidade = max(1, capacidade)
+        self.tamanho = max(8, math.ceil(-capacidade * math.log(taxa_falsos) / math.log(2) ** 2))
+        self.funcoes = max(1, round(self.tamanho / capacidade * math.log(2)))
+        self.contadores = bytearray(self.tamanho)
+        self.elementos = 0
+
+    def _posicoes(self, chave):
+        # Hashing duplo: k posições a partir de dois hashes de 64 bits
+        digest = hashlib.blake2b(chave.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.tamanho for i in range(self.funcoes)]
+
+    def adicionar(self, chave):
+        for posicao in self._posicoes(chave):
+            if self.contadores[posicao] < MAXIMO_CONTADOR:
+                self.contadores[posicao] += 1
+        self.elementos += 1
+
+    def remover(self, chave):
+        posicoes = self._posicoes(chave)
+        if not all(self.contadores[posicao] for posicao in posicoes):
+            return  # Não estava no filtro
+        for posicao in posicoes:
+            if self.contadores[posicao] < MAXIMO_CONTADOR:
+                self.contadores[posicao] -= 1
+        self.elementos -= 1
+
+    def __contains__(self, chave):
+        return all(self.contadores[posicao] for posicao in self._posicoes(chave))
+
+
+class FiltroEmails:
+    """Filtro de Bloom dos emails cadastrados, com a confirmação no banco e os contadores."""
+
+    def __init__(self, capacidade=1000000, taxa_falsos=0.01):
+        self.capacidade = capacidade
+        self.taxa_falsos = taxa_falsos
+        self._filtro = None
+        self._lock = threading.Lock()
+        self.negativos = 0          # Descartados pelo filtro, sem consulta ao banco
+        self.duplicados = 0         # Filtro positivo confirmado pelo banco
+        self.falsos_positivos = 0   # Filtro positivo sem o email no banco
+
+    def carregar(self):
+        """Monta o filtro a partir da tabela de usuários (inclusive os com exclusão agendada)."""
+        filtro = FiltroBloom(self.capacidade, self.taxa_falsos)
+        for email, in db.session.query(Usuario.email).yield_per(TAMANHO_LOTE_CARGA):
+            filtro.adicionar(normalizar(email))
+        with self._lock:
+            self._filtro = filtro
+        if filtro.elementos > self.capacidade:
+            logger.warning(f'Filtro de emails acima da capacidade ({filtro.elementos} > {self.capacidade}): '
+                           'aumente EMAILS_FILTRO_CAPACIDADE')
+        return filtro.elementos
+
+    def existe(self, email):
+        """True se o email já está cadastrado; o banco só é consultado quando o filtro não descarta."""
+        if self._filtro is None:
+            self.carregar()
+        with self._lock:
+            talvez = normalizar(email) in self._filtro
+            if not talvez:
+                self.negativos += 1
+        if not talvez:
+            return False
+
+        existe = db.session.query(Usuario.id).filter_by(email=email).first() is not None
+        with self._lock:
+            if existe:
+                self.duplicados += 1
+            else:
+                self.falsos_positivos += 1
+        return existe
+
+    def adicionar(self, email):
+        with self._lock:
+            if self._filtro is not None:
+                self._filtro.adicionar(normalizar(email))
+
+    def remover(self, email):
+        with self._lock:
+            if self._filtro is not None:
+                self._filtro.remover(normalizar(email))
+
+    def estatisticas(self):
+        with self._lock:
+            ausentes = self.negativos + self.falsos_positivos
+            return {'elementos': self._filtro.elementos if self._filtro is not None else 0,
+                    'negativos': self.negativos, 'duplicados': self.duplicados,
+                    'falsos_positivos': self.falsos_positivos,
+                    # Fração dos emails novos que o filtro não conseguiu descartar
+                    'taxa_falsos_positivos': self.falsos_positivos / ausentes if ausentes else 0.0}
+
+
+def filtro_emails():
+    return current_app.extensions['filtro_emails']
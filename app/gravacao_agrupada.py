@@ -0,0 +1,145 @@
+# app/gravacao_agrupada.py
+import copy
+import logging
+import queue
+import threading
+import time
+from flask import current_app
+from app.database import db
+from app.models import Avaliacao
+from app.agregados import ajustar_estatisticas, ajustar_resumos_livros
+from app.versoes import marcar_alteracao_livros
+from app.cache_respostas import invalidar_apos_commit
+from app.metricas import Histograma, LIMITES_SEGUNDOS
+from app.mudancas import registrar_mudancas
+
+# Gravação agrupada (group commit) das avaliações novas.
+#
+# Com AVALIACOES_AGRUPADAS ligado, POST /livros/<id>/avaliacoes valida a
+# avaliação e a entrega a uma thread de gravação, que junta as avaliações
+# que chegarem em até AVALIACOES_LOTE_MS milissegundos (ou até
+# AVALIACOES_LOTE_MAXIMO delas) e grava todas numa única transação: um
+# INSERT com várias linhas, um UPDATE por livro nos resumos, um nos agregados
+# e um único commit (e fsync) para o lote inteiro.
+#
+# A requisição só responde 201 depois do commit do lote em que entrou: a
+# confirmação continua durável e a leitura seguinte do mesmo usuário já
+# enxerga a avaliação. Se o lote falhar, as avaliações dele são gravadas uma
+# a uma, e apenas a que falhar de novo recebe erro.
+
+LIMITES_LOTE = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+logger = logging.getLogger(__name__)
+
+
+class Pendente:
+    """Avaliação aguardando o commit do lote."""
+
+    __slots__ = ('dados', 'concluida', 'id', 'erro')
+
+    def __init__(self, dados):
+        self.dados = dados
+        self.concluida = threading.Event()
+        self.id = None
+        self.erro = None
+
+
+class GravacaoAgrupada:
+    """Fila de avaliações e a thread que as grava em lotes."""
+
+    def __init__(self, app):
+        self.app = app
+        self._fila = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.tamanhos = Histograma(LIMITES_LOTE)       # Avaliações por lote
+        self.duracoes = Histograma(LIMITES_SEGUNDOS)   # Segundos da transação do lote, até o commit
+        self.lotes_falhos = 0
+
+    def gravar(self, comentario, nota, id_livro, id_usuario):
+        """Enfileira a avaliação e bloqueia até o commit do lote; retorna o id ou levanta o erro da gravação."""
+        pendente = Pendente({'comentario': comentario, 'nota': nota, 'id_livro': id_livro,
+                             'id_usuario': id_usuario})
+        self._iniciar()
+        self._fila.put(pendente)
+        pendente.concluida.wait()
+        if pendente.erro is not None:
+            raise pendente.erro
+        return pendente.id
+
+    def estatisticas(self):
+        with self._lock:
+            return {'tamanhos': copy.deepcopy(self.tamanhos), 'duracoes': copy.deepcopy(self.duracoes),
+                    'lotes_falhos': self.lotes_falhos, 'na_fila': self._fila.qsize()}
+
+    def _iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name='gravacao-avaliacoes', daemon=True)
+                self._thread.start()
+
+    def _executar(self):
+        while True:
+            lote = [self._fila.get()]
+            try:
+                self._completar(lote)
+                self._gravar(lote)
+            except Exception as e:
+                logger.error(f'Erro na gravação agrupada de avaliações: {e}')
+                for pendente in lote:
+                    pendente.erro = pendente.erro or e
+            finally:
+                for pendente in lote:
+                    pendente.concluida.set()
+
+    def _completar(self, lote):
+        # Junta o que chegar até o prazo do lote ou até o tamanho máximo
+        maximo = self.app.config['AVALIACOES_LOTE_MAXIMO']
+        prazo = time.monotonic() + self.app.config['AVALIACOES_LOTE_MS'] / 1000
+        while len(lote) < maximo:
+            restante = prazo - time.monotonic()
+            try:
+                lote.append(self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait())
+            except queue.Empty:
+                return
+
+    def _gravar(self, lote):
+        inicio = time.perf_counter()
+        with self.app.app_context():
+            try:
+                _gravar_transacao(lote)
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f'Lote de {len(lote)} avaliações falhou ({e}); gravando uma a uma')
+                with self._lock:
+                    self.lotes_falhos += 1
+                for pendente in lote:
+                    try:
+                        _gravar_transacao([pendente])
+                    except Exception as erro:
+                        db.session.rollback()
+                        pendente.erro = erro
+        with self._lock:
+            self.tamanhos.observar(len(lote))
+            self.duracoes.observar(time.perf_counter() - inicio)
+
+
+def _gravar_transacao(lote):
+    avaliacoes = [Avaliacao(**pendente.dados) for pendente in lote]
+    db.session.add_all(avaliacoes)
+    db.session.flush()  # Um INSERT com todas as linhas
+    ids = [avaliacao.id for avaliacao in avaliacoes]
+
+    ajustar_estatisticas(soma_notas=sum(avaliacao.nota for avaliacao in avaliacoes), total_avaliacoes=len(avaliacoes))
+    livros = ajustar_resumos_livros(((avaliacao.id_livro, avaliacao.nota) for avaliacao in avaliacoes), 1)
+    marcar_alteracao_livros(livros)
+    registrar_mudancas('avaliacao', 'criado', ids)
+    invalidar_apos_commit('estatisticas', *(f'livro:{id_livro}:avaliacoes' for id_livro in livros))
+    db.session.commit()
+
+    for pendente, id_avaliacao in zip(lote, ids):
+        pendente.id = id_avaliacao
+
+
+def gravacao_agrupada():
+    return current_app.extensions['gravacao_avaliacoes']
@@ -0,0 +1,180 @@
+# app/importacao.py
+import codecs
+import csv
+import io
+import json
+from sqlalchemy import insert
+from app.database import db
+from app.models import Livro, Clube, ResumoLivro
+from app.agregados import ajustar_estatisticas, ajustar_resumo_clube
+from app.busca import indice_busca
+from app.versoes import marcar_alteracao
+from app.cache_respostas import invalidar_apos_commit
+from app.mudancas import registrar_mudancas
+
+TAMANHO_PEDACO = 64 * 1024  # Bytes lidos por vez do corpo da requisição
+TAMANHO_MAXIMO_CAMPO = 100  # Mesmo limite das colunas titulo/autor
+
+
+class FormatoInvalido(ValueError):
+    """Erro levantado quando o corpo enviado não pode ser interpretado."""
+
+
+def _ler_texto(stream):
+    # Decodifica o corpo em pedaços, sem carregar o arquivo inteiro na memória
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        pedaco = stream.read(TAMANHO_PEDACO)
+        if not pedaco:
+            resto = decodificador.decode(b'', final=True)
+            if resto:
+                yield resto
+            return
+        yield decodificador.decode(pedaco)
+
+
+def _ler_array_json(stream):
+    # Lê um array JSON de objetos incrementalmente, um elemento por vez
+    decodificador = json.JSONDecoder()
+    buffer = ''
+    pedacos = _ler_texto(stream)
+    inicio_encontrado = False
+    terminou = False
+
+    for pedaco in pedacos:
+        buffer += pedaco
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not inicio_encontrado:
+                if buffer[pos] != '[':
+                    raise FormatoInvalido('O corpo deve ser um array JSON')
+                inicio_encontrado = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                terminou = True
+                pos += 1
+                break
+            try:
+                item, fim = decodificador.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Elemento incompleto: aguarda o próximo pedaço
+            yield item
+            pos = fim
+        buffer = buffer[pos:]
+        if terminou:
+            break
+
+    if not terminou or buffer.strip():
+        raise FormatoInvalido('Array JSON malformado')
+
+
+def _ler_ndjson(stream):
+    for linha in io.TextIOWrapper(stream, encoding='utf-8'):
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            yield json.loads(linha)
+        except json.JSONDecodeError:
+            yield None  # Linha inválida vira erro no relatório
+
+
+def _ler_csv(stream):
+    yield from csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+
+
+def ler_registros(stream, mimetype):
+    """Retorna um iterador de registros conforme o Content-Type enviado."""
+    if mimetype == 'application/x-ndjson':
+        return _ler_ndjson(stream)
+    if mimetype == 'text/csv':
+        return _ler_csv(stream)
+    if mimetype == 'application/json':
+        return _ler_array_json(stream)
+    raise FormatoInvalido('Content-Type não suportado, use application/json, application/x-ndjson ou text/csv')
+
+
+def _validar(registro):
+    # Retorna (dados, None) quando o registro é válido ou (None, mensagem) caso contrário
+    if not isinstance(registro, dict):
+        return None, 'Registro inválido'
+    titulo = registro.get('titulo')
+    autor = registro.get('autor')
+    if not titulo or not autor or not isinstance(titulo, str) or not isinstance(autor, str):
+        return None, 'Dados incompletos'
+    titulo, autor = titulo.strip(), autor.strip()
+    if not titulo or not autor:
+        return None, 'Dados incompletos'
+    if len(titulo) > TAMANHO_MAXIMO_CAMPO or len(autor) > TAMANHO_MAXIMO_CAMPO:
+        return None, f'Título e autor devem ter no máximo {TAMANHO_MAXIMO_CAMPO} caracteres'
+    return {'titulo': titulo, 'autor': autor}, None
+
+
+def _gravar_lote(clube_id, id_criador, lote, resultados):
+    # Insere um lote numa transação curta. O flush dos objetos devolve o id exato de
+    # cada livro (INSERT ... RETURNING em lote onde o banco suporta, lastrowid nos
+    # demais), sem confundir com livros inseridos ao mesmo tempo por outra requisição
+    if not lote:
+        return 0
+    try:
+        livros = [Livro(id_clube=clube_id, **dados) for _, dados in lote]
+        db.session.add_all(livros)
+        db.session.flush()
+        ids = [livro.id for livro in livros]
+        # Resumos zerados, como em create_livro, num único executemany
+        db.session.execute(insert(ResumoLivro), [{'id_livro': id_livro, 'id_clube': clube_id} for id_livro in ids])
+        indice_busca().indexar_lote([(livro.id, livro.titulo, livro.autor) for livro in livros])
+        ajustar_estatisticas(total_livros=len(lote))
+        ajustar_resumo_clube(clube_id, livros=len(lote))
+        marcar_alteracao(Clube, clube_id)
+        registrar_mudancas('livro', 'criado', ids, id_criador)
+        invalidar_apos_commit('estatisticas')
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for linha, _ in lote:
+            resultados.append({'linha': linha, 'status': 'erro', 'mensagem': str(e)})
+        return 0
+
+    resultados.extend({'linha': linha, 'status': 'criado', 'id': id_livro} for (linha, _), id_livro in zip(lote, ids))
+    return len(lote)
+
+
+def importar_livros(clube_id, registros, tamanho_lote):
+    """Valida e insere os livros em lotes, retornando um relatório por linha.
+
+    Os lotes são gravados em transações separadas: uma falha no banco afeta
+    apenas as linhas do lote em que ocorreu.
+    """
+    resultados = []
+    criados = 0
+    lote = []
+    linha = 0
+    erro_formato = None
+    id_criador = db.session.query(Clube.id_usuario_criador).filter_by(id=clube_id).scalar()
+
+    try:
+        for linha, registro in enumerate(registros, start=1):
+            dados, erro = _validar(registro)
+            if erro:
+                resultados.append({'linha': linha, 'status': 'erro', 'mensagem': erro})
+                continue
+            lote.append((linha, dados))
+            if len(lote) >= tamanho_lote:
+                criados += _gravar_lote(clube_id, id_criador, lote, resultados)
+                lote = []
+    except (FormatoInvalido, UnicodeDecodeError, csv.Error) as e:
+        # O corpo parou de ser legível: grava o que já foi validado e informa onde parou
+        erro_formato = f'Leitura interrompida após a linha {linha}: {e}'
+    criados += _gravar_lote(clube_id, id_criador, lote, resultados)
+
+    resultados.sort(key=lambda r: r['linha'])
+    relatorio = {'total': linha, 'criados': criados, 'erros': linha - criados, 'resultados': resultados}
+    if erro_formato:
+        relatorio['mensagem'] = erro_formato
+    return relatorio
@@ -0,0 +1,170 @@
+# app/lote.py
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, g, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from app.database import db
+
+# POST /lote: várias chamadas da API em uma única requisição HTTP.
+#
+# As sub-requisições são despachadas dentro do próprio processo, pelo mesmo
+# roteamento das rotas normais. O token é verificado uma vez, na requisição
+# do lote: o Principal fica em g e requisicao_token o reaproveita. Em modo
+# sequencial as sub-requisições compartilham o contexto da aplicação, e com
+# ele a sessão do banco e o identity map (um clube carregado por uma
+# sub-requisição não é buscado de novo pela seguinte). Com "paralelo",
+# sequências de GETs consecutivos rodam ao mesmo tempo, cada uma com a sua
+# sessão; escritas continuam em ordem e separam esses grupos.
+#
+# O lote não é uma transação: cada sub-requisição faz o seu próprio commit,
+# como faria se fosse chamada sozinha.
+#
+# Cada sub-requisição passa pelos mesmos hooks de uma requisição normal
+# (before_request, after_request e teardown): a admissão aplica a ela os
+# limites de taxa e de concorrência do grupo da rota, e as métricas a contam
+# no próprio endpoint. Um lote de logins não escapa do limite de /login.
+
+METODOS_PERMITIDOS = ('GET', 'POST', 'PUT', 'DELETE')
+CAMINHO_LOTE = '/lote'
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+_threads = None
+
+
+class LoteInvalido(ValueError):
+    """Erro levantado quando o corpo de POST /lote não descreve uma lista válida de sub-requisições."""
+
+
+def ler_lote(dados, maximo):
+    """Valida o corpo do lote e retorna (sub-requisições normalizadas, paralelo)."""
+    if not isinstance(dados, dict) or not isinstance(dados.get('requisicoes'), list):
+        raise LoteInvalido('Envie {"requisicoes": [{"metodo": ..., "caminho": ...}, ...]}')
+    if not dados['requisicoes']:
+        raise LoteInvalido('O lote está vazio')
+    if len(dados['requisicoes']) > maximo:
+        raise LoteInvalido(f'O lote aceita no máximo {maximo} requisições')
+
+    requisicoes = []
+    for posicao, item in enumerate(dados['requisicoes']):
+        if not isinstance(item, dict) or not isinstance(item.get('caminho'), str):
+            raise LoteInvalido(f'Requisição {posicao}: informe o caminho')
+        metodo = str(item.get('metodo', 'GET')).upper()
+        caminho = item['caminho']
+        if metodo not in METODOS_PERMITIDOS:
+            raise LoteInvalido(f"Requisição {posicao}: método inválido, use {', '.join(METODOS_PERMITIDOS)}")
+        if not caminho.startswith('/') or caminho.split('?')[0].rstrip('/') == CAMINHO_LOTE:
+            raise LoteInvalido(f'Requisição {posicao}: caminho inválido')
+        cabecalhos = item.get('cabecalhos') or {}
+        if not isinstance(cabecalhos, dict):
+            raise LoteInvalido(f'Requisição {posicao}: cabecalhos deve ser um objeto')
+        requisicoes.append({'id': item.get('id', posicao), 'metodo': metodo, 'caminho': caminho,
+                            'corpo': item.get('corpo'), 'cabecalhos': cabecalhos})
+    return requisicoes, bool(dados.get('paralelo'))
+
+
+def principal_do_lote():
+    """Principal já autenticado pela requisição do lote, ou None fora de um lote."""
+    return g.get('principal_lote')
+
+
+def _obter_executor():
+    global _executor, _threads
+    threads = current_app.config.get('LOTE_THREADS', 0)
+    if threads <= 0:
+        return None
+    with _lock:
+        if _executor is None or _threads != threads:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='lote')
+            _threads = threads
+        return _executor
+
+
+def _montar_resultado(requisicao, resposta):
+    resultado = {'id': requisicao['id'], 'status': resposta.status_code}
+    for cabecalho in ('ETag', 'Last-Modified', 'Location'):
+        if cabecalho in resposta.headers:
+            resultado.setdefault('cabecalhos', {})[cabecalho] = resposta.headers[cabecalho]
+    dados = resposta.get_data()  # Também consome respostas em streaming
+    if not dados:
+        resultado['corpo'] = None
+    elif resposta.is_json:
+        resultado['corpo'] = json.loads(dados)
+    else:
+        resultado['corpo'] = dados.decode('utf-8', 'replace')
+    return resultado
+
+
+def _despachar(app, requisicao, ambiente_base, base_url):
+    ambiente = EnvironBuilder(path=requisicao['caminho'], method=requisicao['metodo'], json=requisicao['corpo'],
+                              base_url=base_url, environ_base=ambiente_base,
+                              headers={**requisicao['cabecalhos'], 'Accept': 'application/json'}).get_environ()
+    # Dentro do contexto da aplicação atual: sessão e identity map são os do lote. Os hooks guardam
+    # estado em g (ex.: início da medição), que volta ao da requisição do lote ao final
+    estado_lote = dict(vars(g))
+    try:
+        # Ao sair do contexto, os teardown_request rodam (ex.: a vaga da admissão é liberada)
+        with app.request_context(ambiente):
+            try:
+                resposta = app.preprocess_request()  # Admissão: pode responder 429/503 sem chamar a rota
+                if resposta is None:
+                    resposta = app.dispatch_request()
+                resposta = app.make_response(resposta)
+            except HTTPException as e:
+                resposta = app.make_response(({'message': e.description}, e.code))
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Erro na sub-requisição {requisicao['metodo']} {requisicao['caminho']}: {e}")
+                resposta = app.make_response(({'message': 'Erro interno'}, 500))
+            resposta = app.process_response(resposta)
+            return _montar_resultado(requisicao, resposta)
+    finally:
+        vars(g).clear()
+        vars(g).update(estado_lote)
+
+
+def _despachar_isolado(app, principal, *args):
+    # Thread do pool: contexto da aplicação (e sessão) próprio, com o mesmo Principal do lote
+    with app.app_context():
+        g.principal_lote = principal
+        return _despachar(app, *args)
+
+
+def executar_lote(requisicoes, principal, paralelo=False):
+    """Executa as sub-requisições e retorna os resultados na ordem recebida."""
+    app = current_app._get_current_object()
+    g.principal_lote = principal
+    contexto = ({'REMOTE_ADDR': request.remote_addr}, request.host_url)
+    executor = _obter_executor() if paralelo else None
+
+    resultados = []
+    grupo = []
+
+    def executar_grupo():
+        if executor is None or len(grupo) < 2:
+            resultados.extend(_despachar(app, requisicao, *contexto) for requisicao in grupo)
+        else:
+            futuros = [executor.submit(_despachar_isolado, app, principal, requisicao, *contexto)
+                       for requisicao in grupo]
+            resultados.extend(futuro.result() for futuro in futuros)
+        grupo.clear()
+
+    try:
+        for requisicao in requisicoes:
+            if requisicao['metodo'] == 'GET':
+                grupo.append(requisicao)
+            else:
+                executar_grupo()
+                resultados.append(_despachar(app, requisicao, *contexto))
+        executar_grupo()
+    finally:
+        # O contexto da aplicação pode sobreviver à requisição (ex.: testes); a identidade não
+        g.pop('principal_lote', None)
+    return resultados
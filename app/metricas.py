@@ -0,0 +1,217 @@
+# app/metricas.py
+import threading
+import time
+from collections import Counter
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from app.database import db
+
+# Métricas das requisições no formato texto do Prometheus: latência por
+# endpoint, quantidade e tempo de SQL por requisição e tempo de checkout
+# de conexões do pool. As consultas são contadas pelos eventos do engine,
+# dentro do contexto da requisição que as emitiu; em respostas em streaming
+# a medição vai até o fim do envio do corpo.
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100)
+LIMITES_CHECKOUT_POOL = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class Histograma:
+    """Histograma acumulado com limites fixos, como os do Prometheus."""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * len(limites)
+        self.soma = 0.0
+        self.contagem = 0
+
+    def observar(self, valor):
+        self.soma += valor
+        self.contagem += 1
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.contagens[i] += 1
+                break
+
+    def linhas(self, nome, rotulos):
+        acumulado = 0
+        for limite, contagem in zip(self.limites, self.contagens):
+            acumulado += contagem
+            yield f'{nome}_bucket{_rotulos(rotulos, le=_numero(limite))} {acumulado}'
+        yield f'{nome}_bucket{_rotulos(rotulos, le="+Inf")} {self.contagem}'
+        yield f'{nome}_sum{_rotulos(rotulos)} {_numero(self.soma)}'
+        yield f'{nome}_count{_rotulos(rotulos)} {self.contagem}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _rotulos(rotulos, **extras):
+    pares = {**rotulos, **extras}
+    if not pares:
+        return ''
+    texto = ','.join('{}="{}"'.format(chave, str(valor).replace('\\', '\\\\').replace('"', '\\"')
+                                      .replace('\n', '\\n'))
+                     for chave, valor in pares.items())
+    return '{' + texto + '}'
+
+
+class Metricas:
+    """Acumula as métricas do processo; todas as atualizações passam pelo mesmo lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requisicoes = Counter()  # (endpoint, metodo, status) -> total
+        self.latencia = {}            # (endpoint, metodo) -> Histograma
+        self.consultas = {}           # endpoint -> Histograma de consultas por requisição
+        self.tempo_sql = {}           # endpoint -> Histograma de segundos em SQL por requisição
+        self.checkout_pool = Histograma(LIMITES_CHECKOUT_POOL)
+        self.lentas = Counter()       # endpoint -> requisições acima do limite do log de lentas
+
+    def registrar_requisicao(self, endpoint, metodo, status, duracao, consultas, tempo_sql):
+        with self._lock:
+            self.requisicoes[(endpoint, metodo, status)] += 1
+            self.latencia.setdefault((endpoint, metodo), Histograma(LIMITES_SEGUNDOS)).observar(duracao)
+            self.consultas.setdefault(endpoint, Histograma(LIMITES_CONSULTAS)).observar(consultas)
+            self.tempo_sql.setdefault(endpoint, Histograma(LIMITES_SEGUNDOS)).observar(tempo_sql)
+
+    def registrar_checkout_pool(self, segundos):
+        with self._lock:
+            self.checkout_pool.observar(segundos)
+
+    def registrar_lenta(self, endpoint):
+        with self._lock:
+            self.lentas[endpoint] += 1
+
+    def texto(self, extras=()):
+        """Formato texto do Prometheus; ``extras`` são (nome, tipo, ajuda, valor, [(rótulos, valor)] ou Histograma)."""
+        linhas = []
+
+        def cabecalho(nome, tipo, ajuda):
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+
+        with self._lock:
+            cabecalho('bookbridge_requisicoes_total', 'counter', 'Requisições atendidas por endpoint, método e status')
+            for (endpoint, metodo, status), total in sorted(self.requisicoes.items()):
+                linhas.append(f'bookbridge_requisicoes_total'
+                              f'{_rotulos({"endpoint": endpoint, "metodo": metodo, "status": status})} {total}')
+
+            cabecalho('bookbridge_requisicao_segundos', 'histogram', 'Latência das requisições por endpoint')
+            for (endpoint, metodo), histograma in sorted(self.latencia.items()):
+                linhas.extend(histograma.linhas('bookbridge_requisicao_segundos',
+                                                {'endpoint': endpoint, 'metodo': metodo}))
+
+            cabecalho('bookbridge_sql_consultas', 'histogram', 'Consultas SQL emitidas por requisição')
+            for endpoint, histograma in sorted(self.consultas.items()):
+                linhas.extend(histograma.linhas('bookbridge_sql_consultas', {'endpoint': endpoint}))
+
+            cabecalho('bookbridge_sql_segundos', 'histogram', 'Tempo gasto em SQL por requisição')
+            for endpoint, histograma in sorted(self.tempo_sql.items()):
+                linhas.extend(histograma.linhas('bookbridge_sql_segundos', {'endpoint': endpoint}))
+
+            cabecalho('bookbridge_pool_checkout_segundos', 'histogram',
+                      'Tempo para obter uma conexão do pool (espera por conexão livre e abertura de conexões novas)')
+            linhas.extend(self.checkout_pool.linhas('bookbridge_pool_checkout_segundos', {}))
+
+            cabecalho('bookbridge_requisicoes_lentas_total', 'counter', 'Requisições acima de METRICAS_LENTAS_MS')
+            for endpoint, total in sorted(self.lentas.items()):
+                linhas.append(f'bookbridge_requisicoes_lentas_total{_rotulos({"endpoint": endpoint})} {total}')
+
+        for nome, tipo, ajuda, valor in extras:
+            cabecalho(nome, tipo, ajuda)
+            if isinstance(valor, Histograma):
+                linhas.extend(valor.linhas(nome, {}))
+                continue
+            # Valor único ou lista de (rótulos, valor)
+            for rotulos, numero in (valor if isinstance(valor, list) else [({}, valor)]):
+                linhas.append(f'{nome}{_rotulos(rotulos)} {_numero(numero)}')
+        return '\n'.join(linhas) + '\n'
+
+
+def _antes_de_executar(conn, cursor, sql, parametros, contexto, executemany):
+    if has_request_context():
+        conn.info.setdefault('inicio_consultas', []).append(time.perf_counter())
+
+
+def _depois_de_executar(conn, cursor, sql, parametros, contexto, executemany):
+    if not has_request_context() or not conn.info.get('inicio_consultas'):
+        return
+    duracao = time.perf_counter() - conn.info['inicio_consultas'].pop()
+    g.metricas_consultas = g.get('metricas_consultas', 0) + 1
+    g.metricas_tempo_sql = g.get('metricas_tempo_sql', 0.0) + duracao
+    if 'metricas_sql' in g:
+        g.metricas_sql.append(' '.join(sql.split()))
+
+
+def _medir_checkout_pool(pool, metricas):
+    # O pool não tem evento anterior ao checkout; o connect é envolvido para medir o tempo
+    # total, que inclui abrir uma conexão nova quando não há livre e ainda cabe no pool
+    connect = pool.connect
+
+    def connect_medido():
+        inicio = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            metricas.registrar_checkout_pool(time.perf_counter() - inicio)
+
+    pool.connect = connect_medido
+
+
+def instrumentar(app, logger):
+    """Liga a coleta de métricas à aplicação e ao engine dela.
+
+    Com METRICAS_LENTAS_MS > 0, requisições acima do limite são registradas
+    no log com as consultas emitidas, agrupadas por texto (repetições indicam N+1).
+    """
+    metricas = Metricas()
+    app.extensions['metricas'] = metricas
+
+    with app.app_context():
+        engines = [*db.engines.values(), *app.extensions.get('replicas', [])]
+    for engine in engines:  # Primário e réplicas
+        event.listen(engine, 'before_cursor_execute', _antes_de_executar)
+        event.listen(engine, 'after_cursor_execute', _depois_de_executar)
+        _medir_checkout_pool(engine.pool, metricas)
+
+    @app.before_request
+    def iniciar_medicao():
+        g.metricas_inicio = time.perf_counter()
+        g.metricas_consultas = 0
+        g.metricas_tempo_sql = 0.0
+        if app.config.get('METRICAS_LENTAS_MS'):
+            g.metricas_sql = []
+
+    @app.after_request
+    def registrar_medicao(response):
+        if 'metricas_inicio' not in g:
+            return response
+        contexto = g._get_current_object()
+        endpoint = request.endpoint or 'desconhecido'
+        metodo, caminho = request.method, request.full_path
+
+        def registrar():
+            duracao = time.perf_counter() - contexto.metricas_inicio
+            metricas.registrar_requisicao(endpoint, metodo, response.status_code, duracao,
+                                          contexto.metricas_consultas, contexto.metricas_tempo_sql)
+            limite_lentas = app.config.get('METRICAS_LENTAS_MS', 0) / 1000
+            if 'metricas_sql' in contexto and duracao >= limite_lentas:
+                metricas.registrar_lenta(endpoint)
+                repetidas = Counter(contexto.metricas_sql).most_common()
+                logger.warning(f'Requisição lenta: {metodo} {caminho} ({endpoint}) em '
+                               f'{duracao * 1000:.1f} ms, {contexto.metricas_consultas} consultas, '
+                               f'{contexto.metricas_tempo_sql * 1000:.1f} ms em SQL: '
+                               + ' | '.join(f'{n}x {sql}' for sql, n in repetidas))
+
+        if response.is_streamed:
+            # O gerador só roda depois do after_request (e consulta o banco enquanto envia):
+            # registra quando o servidor fecha a resposta, com o corpo já enviado
+            response.call_on_close(registrar)
+        else:
+            registrar()
+        return response
+
+    return metricas
@@ -1,7 +1,8 @@
 # app/models.py
 
+from datetime import datetime
 from app.database import db  # Importa o objeto db que representa o banco de dados
-from werkzeug.security import generate_password_hash, check_password_hash  # Importa funções para gerar/verificar senhas
+from app.senhas import gerar_hash, verificar_hash, precisa_rehash as hash_desatualizado  # Hash de senhas executado no pool de processos
 
 
 # Definir modelo de dados Usuario
@@ -12,17 +13,28 @@ class Usuario(db.Model):
     nome = db.Column(db.String(50), nullable=False)  # Define a coluna nome
     email = db.Column(db.String(100), unique=True, nullable=False)  # Define a coluna email
     senha_hash = db.Column(db.String(512), nullable=False)  # Define uma string para armazenar o hash da senha
+    # Preenchido quando a exclusão é agendada: o usuário some das leituras antes de a tarefa remover as linhas
+    excluido_em = db.Column(db.DateTime, nullable=True)
     clubes = db.relationship('Clube', backref='criador', lazy=True)  # Define relacionamento com Clube
 
+    __table_args__ = (
+        # Listagem dos usuários visíveis (excluido_em IS NULL) já na ordem do id
+        db.Index('ix_usuarios_visiveis', 'excluido_em', 'id'),
+    )
+
     # Função para definir a senha do usuário
     def set_password(self, senha):
         # Recebe uma senha, gera um hash e armazena no campo senha_hash
-        self.senha_hash = generate_password_hash(senha)
+        self.senha_hash = gerar_hash(senha)
 
     # Função para verificar se a senha é válida
     def check_password(self, senha):
         # Compara a senha fornecida com o hash armazenado e retorna True se coincidirem
-        return check_password_hash(self.senha_hash, senha)
+        return verificar_hash(self.senha_hash, senha)
+
+    # Função para verificar se o hash foi gerado com parâmetros antigos
+    def precisa_rehash(self):
+        return hash_desatualizado(self.senha_hash)
 
     # Método para representar o objeto como string
     def __repr__(self):
@@ -37,7 +49,16 @@ class Clube(db.Model):
     nome = db.Column(db.String(100), nullable=False)  # Define a coluna nome
     descricao = db.Column(db.String(255), nullable=True)  # Define a coluna descrição
     id_usuario_criador = db.Column(db.Integer, db.ForeignKey('usuarios.id'),
-                                   nullable=False)  # Chave estrangeira para o criador
+                                   nullable=False, index=True)  # Chave estrangeira para o criador
+    # Versão da lista de livros do clube, incrementada a cada escrita nos livros (usada no ETag)
+    versao = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    atualizado_em = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    # Preenchido quando a exclusão é agendada (ver TarefaExclusao)
+    excluido_em = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_clubes_visiveis', 'excluido_em', 'id'),
+    )
 
     # Método para representar o objeto como string
     def __repr__(self):
@@ -49,19 +70,159 @@ class Livro(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(100), nullable=False)
     autor = db.Column(db.String(100), nullable=False)
-    id_clube = db.Column(db.Integer, db.ForeignKey('clubes.id'), nullable=False)
+    # Indexado: listagem de livros do clube (o índice secundário já inclui o id para paginação)
+    id_clube = db.Column(db.Integer, db.ForeignKey('clubes.id'), nullable=False, index=True)
+    # Versão da lista de avaliações do livro, incrementada a cada escrita nas avaliações (usada no ETag)
+    versao = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    atualizado_em = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
 
     def __repr__(self):
         return f"<Livro {self.titulo} por {self.autor}>"
 
 class Avaliacao(db.Model):
     __tablename__ = 'avaliacoes'
+    __table_args__ = (
+        # Avaliações de um usuário (e de um usuário para um livro); também atende filtros só por id_usuario
+        db.Index('ix_avaliacoes_usuario_livro', 'id_usuario', 'id_livro'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     comentario = db.Column(db.String(255), nullable=True)
     nota = db.Column(db.Integer, nullable=False)  # Exemplo de escala: 1 a 5
-    id_livro = db.Column(db.Integer, db.ForeignKey('livros.id'), nullable=False)
+    id_livro = db.Column(db.Integer, db.ForeignKey('livros.id'), nullable=False, index=True)
     id_usuario = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
 
     def __repr__(self):
-        return f"<Avaliacao {self.nota} para o Livro {self.id_livro}>"
\ No newline at end of file
+        return f"<Avaliacao {self.nota} para o Livro {self.id_livro}>"
+
+# Tabela de agregados mantida pelas rotas de escrita (uma única linha, id = 1)
+class Estatistica(db.Model):
+    __tablename__ = 'estatisticas'
+
+    id = db.Column(db.Integer, primary_key=True)
+    total_livros = db.Column(db.Integer, nullable=False, default=0)
+    total_clubes = db.Column(db.Integer, nullable=False, default=0)
+    soma_notas = db.Column(db.BigInteger, nullable=False, default=0)
+    total_avaliacoes = db.Column(db.Integer, nullable=False, default=0)
+    # Versão da lista de clubes (GET /clubes), incrementada a cada escrita em clubes
+    versao_clubes = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    clubes_atualizado_em = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    # Início da última execução de `flask recomendacoes calcular` (base do modo incremental)
+    similares_calculado_em = db.Column(db.DateTime, nullable=True)
+    # Log de mudanças (GET /mudancas): último cursor reservado, até onde a compactação já leu e
+    # até onde exclusões antigas foram descartadas (cursores anteriores não podem mais sincronizar)
+    ultima_mudanca = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    mudancas_compactadas_ate = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    mudancas_expurgadas_ate = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f"<Estatistica livros={self.total_livros} clubes={self.total_clubes}>"
+
+
+# Resumo desnormalizado das avaliações de cada livro (contagem, soma e histograma de notas)
+class ResumoLivro(db.Model):
+    __tablename__ = 'resumos_livros'
+    __table_args__ = (
+        # Ranking global e por clube lidos em ordem direto do índice (GET /livros/ranking)
+        db.Index('ix_resumos_livros_ranking', 'pontuacao', 'id_livro'),
+        db.Index('ix_resumos_livros_clube_ranking', 'id_clube', 'pontuacao', 'id_livro'),
+    )
+
+    id_livro = db.Column(db.Integer, db.ForeignKey('livros.id'), primary_key=True)
+    # Cópia de livros.id_clube, para o ranking por clube não precisar de JOIN
+    id_clube = db.Column(db.Integer, nullable=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    soma = db.Column(db.Integer, nullable=False, default=0)
+    nota_1 = db.Column(db.Integer, nullable=False, default=0)
+    nota_2 = db.Column(db.Integer, nullable=False, default=0)
+    nota_3 = db.Column(db.Integer, nullable=False, default=0)
+    nota_4 = db.Column(db.Integer, nullable=False, default=0)
+    nota_5 = db.Column(db.Integer, nullable=False, default=0)
+    # Média bayesiana das notas (NULL enquanto o livro não tem avaliações), atualizada junto com o resumo
+    pontuacao = db.Column(db.Double, nullable=True)
+
+    # O resumo é removido junto com o livro
+    livro = db.relationship('Livro', backref=db.backref('resumo', uselist=False, cascade='all, delete-orphan'),
+                            lazy=True)
+
+    def histograma(self):
+        return {str(n): getattr(self, f'nota_{n}') for n in range(1, 6)}
+
+    def __repr__(self):
+        return f"<ResumoLivro {self.id_livro}: {self.total} avaliações>"
+
+
+# Agregados de cada clube (livros, avaliações e soma das notas), mantidos pelas rotas de escrita de livros e avaliações
+class ResumoClube(db.Model):
+    __tablename__ = 'resumos_clubes'
+
+    id_clube = db.Column(db.Integer, db.ForeignKey('clubes.id'), primary_key=True)
+    total_livros = db.Column(db.Integer, nullable=False, default=0)
+    total_avaliacoes = db.Column(db.Integer, nullable=False, default=0)
+    soma_notas = db.Column(db.BigInteger, nullable=False, default=0)
+
+    clube = db.relationship('Clube', backref=db.backref('resumo', uselist=False, cascade='all, delete-orphan'),
+                            lazy=True)
+
+    def __repr__(self):
+        return f"<ResumoClube {self.id_clube}: {self.total_livros} livros>"
+
+
+# Vizinhos mais próximos de cada livro pela similaridade das notas, gerados por `flask recomendacoes calcular`
+class LivroSimilar(db.Model):
+    __tablename__ = 'livros_similares'
+
+    # A chave primária (id_livro, posicao) atende a consulta das rotas já na ordem de exibição
+    id_livro = db.Column(db.Integer, db.ForeignKey('livros.id'), primary_key=True)
+    posicao = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # Indexado: remoção das entradas que apontam para um livro excluído
+    id_similar = db.Column(db.Integer, db.ForeignKey('livros.id'), nullable=False, index=True)
+    similaridade = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<LivroSimilar {self.id_livro} -> {self.id_similar} ({self.similaridade:.3f})>"
+
+
+# Exclusão de um clube ou usuário e das linhas dependentes, executada em lotes fora da requisição
+class TarefaExclusao(db.Model):
+    __tablename__ = 'tarefas_exclusao'
+
+    id = db.Column(db.Integer, primary_key=True)
+    entidade = db.Column(db.String(20), nullable=False)  # 'clube' ou 'usuario'
+    id_alvo = db.Column(db.Integer, nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default='pendente', index=True)  # pendente, executando, concluida, falhou
+    # Progresso, gravado na mesma transação de cada lote removido
+    avaliacoes_removidas = db.Column(db.Integer, nullable=False, default=0)
+    livros_removidos = db.Column(db.Integer, nullable=False, default=0)
+    clubes_removidos = db.Column(db.Integer, nullable=False, default=0)
+    erro = db.Column(db.String(255), nullable=True)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    concluido_em = db.Column(db.DateTime, nullable=True)
+    # Renovado a cada lote: uma tarefa 'executando' parada há mais de EXCLUSAO_TAREFA_EXPIRA foi abandonada
+    atualizado_em = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<TarefaExclusao {self.entidade} {self.id_alvo}: {self.estado}>"
+
+
+# Log de mudanças das entidades, lido por GET /mudancas; o id é o cursor, reservado em
+# Estatistica.ultima_mudanca na ordem dos commits
+class Mudanca(db.Model):
+    __tablename__ = 'mudancas'
+    __table_args__ = (
+        # Compactação: entradas anteriores da mesma entidade
+        db.Index('ix_mudancas_entidade', 'entidade', 'id_entidade', 'id'),
+        # Descarte das exclusões antigas
+        db.Index('ix_mudancas_operacao', 'operacao', 'criado_em'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    entidade = db.Column(db.String(20), nullable=False)  # usuario, clube, livro ou avaliacao
+    id_entidade = db.Column(db.Integer, nullable=False)
+    operacao = db.Column(db.String(10), nullable=False)  # criado, atualizado ou excluido
+    # Entradas visíveis só a este usuário: livros, listados apenas ao criador do clube
+    id_usuario = db.Column(db.Integer, nullable=True)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Mudanca {self.id}: {self.entidade} {self.id_entidade} {self.operacao}>"
@@ -0,0 +1,244 @@
+# app/mudancas.py
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, delete, insert, or_
+from sqlalchemy.orm import aliased
+from app.database import db
+from app.models import Usuario, Clube, Livro, Avaliacao, Estatistica, Mudanca
+from app.agregados import ID_ESTATISTICAS, reservar_cursores_mudancas
+from app.eventos import apos_commit
+
+# Log de mudanças para sincronização incremental (GET /mudancas?desde=<cursor>).
+#
+# Toda rota de escrita registra, na própria transação, uma entrada por
+# entidade criada, atualizada ou excluída. O id da entrada é o cursor: ele é
+# reservado na linha de agregados, que fica travada até o commit, então os
+# cursores aparecem na ordem dos commits e um cliente que leu até N nunca
+# perde uma entrada menor que N. A leitura devolve o estado atual de cada
+# entidade alterada (nulo para as excluídas), não o histórico das escritas.
+#
+# Exclusões em cascata também entram no log: os livros e avaliações de um
+# clube são registrados como excluídos à medida que a tarefa de exclusão os
+# remove, depois da entrada do próprio clube.
+#
+# A compactação roda em segundo plano: cada entrada nova apaga as anteriores
+# da mesma entidade, e as exclusões mais antigas que
+# MUDANCAS_RETENCAO_EXCLUSOES dias são descartadas. Assim o log guarda no
+# máximo uma entrada por entidade, e sincronizar custa proporcional ao que
+# mudou desde o cursor, não ao tamanho da base. Quem estiver parado antes da
+# última exclusão descartada recebe 410 e precisa recarregar tudo.
+
+MODELOS = {'usuario': Usuario, 'clube': Clube, 'livro': Livro, 'avaliacao': Avaliacao}
+TAMANHO_LOTE_COMPACTACAO = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class CursorExpirado(ValueError):
+    """Erro levantado quando o cursor é anterior às exclusões já descartadas do log."""
+
+
+class LogMudancas:
+    """Avisos de commits para as leituras em espera e a thread de compactação."""
+
+    def __init__(self, app):
+        self.app = app
+        self._condicao = threading.Condition()
+        self._ultimo = 0           # Maior cursor confirmado neste processo
+        self._thread = None
+        self._lock = threading.Lock()
+        self.aguardando = 0        # Leituras em long-poll/SSE esperando mudanças
+        self.compactadas = 0       # Entradas substituídas por outra mais nova da mesma entidade
+        self.expurgadas = 0        # Exclusões descartadas pela retenção
+
+    def notificar(self, cursor):
+        with self._condicao:
+            self._ultimo = max(self._ultimo, cursor)
+            self._condicao.notify_all()
+
+    def aguardar(self, cursor, timeout):
+        """Espera um commit com cursor acima de ``cursor`` neste processo, por até ``timeout`` segundos.
+
+        Escritas de outros processos não avisam: quem chama consulta o banco
+        de novo ao fim de cada espera.
+        """
+        with self._condicao:
+            if self._ultimo > cursor:
+                return
+            self.aguardando += 1
+            try:
+                self._condicao.wait(timeout)
+            finally:
+                self.aguardando -= 1
+
+    def estatisticas(self):
+        with self._lock:
+            return {'aguardando': self.aguardando, 'compactadas': self.compactadas, 'expurgadas': self.expurgadas}
+
+    def iniciar(self):
+        """Sobe a thread de compactação (MUDANCAS_COMPACTAR_INTERVALO = 0 desativa)."""
+        if self.app.config['MUDANCAS_COMPACTAR_INTERVALO'] <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name='compactacao-mudancas', daemon=True)
+                self._thread.start()
+
+    def _executar(self):
+        while True:
+            time.sleep(self.app.config['MUDANCAS_COMPACTAR_INTERVALO'])
+            with self.app.app_context():
+                try:
+                    compactar_mudancas()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f'Erro na compactação do log de mudanças: {e}')
+
+    def _contar(self, compactadas=0, expurgadas=0):
+        with self._lock:
+            self.compactadas += compactadas
+            self.expurgadas += expurgadas
+
+
+def log_mudancas():
+    return current_app.extensions['mudancas']
+
+
+def registrar_mudancas(entidade, operacao, ids, id_usuario=None):
+    """Registra ``operacao`` para as entidades ``ids`` na transação corrente.
+
+    ``id_usuario`` restringe as entradas a um usuário: os livros só
+    aparecem para o criador do clube. Chame depois dos demais ajustes da
+    rota (ver reservar_cursores_mudancas).
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    ultimo = reservar_cursores_mudancas(len(ids))
+    agora = datetime.utcnow()
+    db.session.execute(insert(Mudanca), [
+        {'id': cursor, 'entidade': entidade, 'id_entidade': id_entidade, 'operacao': operacao,
+         'id_usuario': id_usuario, 'criado_em': agora}
+        for cursor, id_entidade in enumerate(ids, start=ultimo - len(ids) + 1)])
+    log = log_mudancas()
+    apos_commit(log.notificar, ultimo)
+    log.iniciar()
+
+
+def registrar_mudanca(entidade, id_entidade, operacao, id_usuario=None):
+    registrar_mudancas(entidade, operacao, [id_entidade], id_usuario)
+
+
+def cursor_atual():
+    estatistica = db.session.get(Estatistica, ID_ESTATISTICAS)
+    return estatistica.ultima_mudanca if estatistica is not None else 0
+
+
+def consultar(desde, limite, id_usuario, representacoes):
+    """Entidades alteradas depois do cursor ``desde``, com o estado atual de cada uma.
+
+    Retorna {'mudancas': [...], 'cursor': próximo cursor, 'mais': há outra
+    página}. Várias entradas da mesma entidade na página viram uma só.
+    """
+    estatistica = db.session.get(Estatistica, ID_ESTATISTICAS)
+    if estatistica is None:
+        return {'mudancas': [], 'cursor': 0, 'mais': False}
+    if desde < estatistica.mudancas_expurgadas_ate:
+        raise CursorExpirado('Cursor expirado: exclusões posteriores a ele já foram descartadas, sincronize '
+                             'novamente sem ?desde')
+    # Todo cursor até ultima_mudanca já foi confirmado: entradas acima dele ainda podem estar em transação
+    ultimo = estatistica.ultima_mudanca
+    linhas = (db.session.query(Mudanca.id, Mudanca.entidade, Mudanca.id_entidade, Mudanca.operacao)
+              .filter(Mudanca.id > desde, Mudanca.id <= ultimo,
+                      or_(Mudanca.id_usuario.is_(None), Mudanca.id_usuario == id_usuario))
+              .order_by(Mudanca.id)
+              .limit(limite + 1)
+              .all())
+    mais = len(linhas) > limite
+    linhas = linhas[:limite]
+    cursor = linhas[-1].id if mais else max(desde, ultimo)
+
+    recentes = {}
+    for linha in linhas:
+        recentes.pop((linha.entidade, linha.id_entidade), None)
+        recentes[(linha.entidade, linha.id_entidade)] = linha  # Mantém a ordem da última entrada
+
+    dados = _carregar(recentes.values(), representacoes)
+    mudancas = [{'cursor': linha.id, 'entidade': linha.entidade, 'id': linha.id_entidade,
+                 'operacao': linha.operacao, 'dados': dados.get((linha.entidade, linha.id_entidade))}
+                for linha in recentes.values()]
+    return {'mudancas': mudancas, 'cursor': cursor, 'mais': mais}
+
+
+def _carregar(linhas, representacoes):
+    # Uma consulta por tipo de entidade; excluídas (ou com exclusão agendada) ficam sem dados
+    ids = {}
+    for linha in linhas:
+        if linha.operacao != 'excluido':
+            ids.setdefault(linha.entidade, []).append(linha.id_entidade)
+    dados = {}
+    for entidade, ids_entidade in ids.items():
+        modelo = MODELOS[entidade]
+        selecao = representacoes[entidade].selecao(modelo.id)
+        consulta = db.session.query(*selecao.colunas).filter(modelo.id.in_(ids_entidade))
+        if hasattr(modelo, 'excluido_em'):
+            consulta = consulta.filter(modelo.excluido_em.is_(None))
+        elif modelo is Livro:
+            consulta = consulta.join(Clube, Clube.id == Livro.id_clube).filter(Clube.excluido_em.is_(None))
+        dados.update(((entidade, linha[0]), selecao.montar(linha)) for linha in consulta)
+    return dados
+
+
+def compactar_mudancas(lote=TAMANHO_LOTE_COMPACTACAO):
+    """Compacta o log a partir de onde a última execução parou; retorna as entradas removidas.
+
+    Cada lote, em sua transação: para as entradas novas, apaga as anteriores
+    da mesma entidade. Depois descarta as exclusões mais antigas que a
+    retenção e avança mudancas_expurgadas_ate.
+    """
+    estatistica = db.session.get(Estatistica, ID_ESTATISTICAS)
+    if estatistica is None:
+        return {'compactadas': 0, 'expurgadas': 0}
+    inicio, fim = estatistica.mudancas_compactadas_ate, estatistica.ultima_mudanca
+    db.session.commit()
+
+    compactadas = 0
+    posterior = aliased(Mudanca)
+    while inicio < fim:
+        ate = min(fim, inicio + lote)
+        # Lido a partir das entradas novas (intervalo do id) e do índice por entidade
+        ids = [id_mudanca for id_mudanca, in db.session.query(Mudanca.id).join(posterior, and_(
+            posterior.entidade == Mudanca.entidade, posterior.id_entidade == Mudanca.id_entidade,
+            posterior.id > Mudanca.id)).filter(posterior.id > inicio, posterior.id <= ate).distinct()]
+        if ids:
+            db.session.execute(delete(Mudanca).where(Mudanca.id.in_(ids)))
+        db.session.query(Estatistica).filter_by(id=ID_ESTATISTICAS).update(
+            {Estatistica.mudancas_compactadas_ate: ate}, synchronize_session=False)
+        db.session.commit()
+        compactadas += len(ids)
+        inicio = ate
+
+    expurgadas = 0
+    limite = datetime.utcnow() - timedelta(days=current_app.config['MUDANCAS_RETENCAO_EXCLUSOES'])
+    while True:
+        ids = [id_mudanca for id_mudanca, in db.session.query(Mudanca.id)
+               .filter(Mudanca.operacao == 'excluido', Mudanca.criado_em < limite)
+               .order_by(Mudanca.id).limit(lote)]
+        if not ids:
+            break
+        db.session.execute(delete(Mudanca).where(Mudanca.id.in_(ids)))
+        # Cursores anteriores à última exclusão descartada deixariam de ver essa exclusão
+        db.session.query(Estatistica).filter(Estatistica.id == ID_ESTATISTICAS,
+                                             Estatistica.mudancas_expurgadas_ate < ids[-1]) \
+            .update({Estatistica.mudancas_expurgadas_ate: ids[-1]}, synchronize_session=False)
+        db.session.commit()
+        expurgadas += len(ids)
+
+    log_mudancas()._contar(compactadas, expurgadas)
+    if compactadas or expurgadas:
+        logger.info(f'Log de mudanças compactado: {compactadas} entradas substituídas, {expurgadas} exclusões '
+                    'descartadas')
+    return {'compactadas': compactadas, 'expurgadas': expurgadas}
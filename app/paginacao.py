@@ -0,0 +1,111 @@
+# app/paginacao.py
+from flask import request, jsonify, Response, stream_with_context
+from app.serializacao import para_json, responder, campos_solicitados, CamposInvalidos
+
+# Limites da paginação por cursor (?after=<id>&limit=<n>)
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 500
+
+# Quantidade de linhas buscadas por vez do cursor do servidor no modo streaming
+TAMANHO_LOTE_STREAM = 500
+
+FORMATOS_STREAM = ('json', 'ndjson')
+
+
+class ParametrosInvalidos(ValueError):
+    """Erro levantado quando ?after, ?limit ou ?stream não são válidos."""
+
+
+def _ler_parametros():
+    # Lê e valida os parâmetros de paginação da query string
+    # request.args.get com type=int devolve None quando o valor não é um inteiro
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', type=int)
+
+    if ('after' in request.args and after is None) or ('limit' in request.args and limit is None):
+        raise ParametrosInvalidos('Parâmetros de paginação inválidos')
+    if limit is not None and limit < 1:
+        raise ParametrosInvalidos('Parâmetros de paginação inválidos')
+
+    formato = request.args.get('stream')
+    if formato is None and 'application/x-ndjson' in request.headers.get('Accept', ''):
+        formato = 'ndjson'
+    if formato is not None and formato not in FORMATOS_STREAM:
+        raise ParametrosInvalidos('Formato de stream inválido, use json ou ndjson')
+
+    return after, limit, formato
+
+
+def _gerar_stream(consulta, montar, formato):
+    # Percorre a consulta com um cursor do lado do servidor, sem carregar a tabela inteira
+    linhas = consulta.yield_per(TAMANHO_LOTE_STREAM)
+
+    if formato == 'ndjson':
+        buffer = []
+        for linha in linhas:
+            buffer.append(para_json(montar(linha)))
+            if len(buffer) >= TAMANHO_LOTE_STREAM:
+                yield b'\n'.join(buffer) + b'\n'
+                buffer = []
+        if buffer:
+            yield b'\n'.join(buffer) + b'\n'
+        return
+
+    # Array JSON enviado em pedaços (chunked)
+    yield b'['
+    primeiro = True
+    buffer = []
+    for linha in linhas:
+        item = para_json(montar(linha))
+        buffer.append(item if primeiro else b',' + item)
+        primeiro = False
+        if len(buffer) >= TAMANHO_LOTE_STREAM:
+            yield b''.join(buffer)
+            buffer = []
+    yield b''.join(buffer) + b']'
+
+
+def listar(consulta, coluna_id, representacao):
+    """Responde uma listagem usando paginação por cursor ou streaming.
+
+    - ``?after=<id>&limit=<n>``: retorna ``{'itens': [...], 'next': <id ou null>}``
+    - ``?stream=json`` / ``?stream=ndjson`` (ou ``Accept: application/x-ndjson``):
+      envia as linhas em pedaços direto do cursor do banco; o streaming só
+      existe em JSON/NDJSON, então um Accept que não aceita o formato (ex.:
+      só ``application/msgpack``) recebe 406
+    - sem parâmetros: mantém o formato antigo (lista completa)
+    - ``?fields=a,b``: apenas esses campos da ``representacao``
+
+    Só as colunas dos campos pedidos são consultadas (sem objetos do ORM).
+    """
+    try:
+        after, limit, formato = _ler_parametros()
+        selecao = representacao.selecao(coluna_id, campos_solicitados())
+    except (ParametrosInvalidos, CamposInvalidos) as e:
+        return jsonify({'message': str(e)}), 400
+
+    if after is not None:
+        consulta = consulta.filter(coluna_id > after)
+    consulta = consulta.with_entities(*selecao.colunas).order_by(coluna_id)
+    montar = selecao.montar
+
+    if formato is not None:
+        if limit is not None:
+            consulta = consulta.limit(min(limit, LIMITE_MAXIMO))
+        mimetype = 'application/x-ndjson' if formato == 'ndjson' else 'application/json'
+        if request.accept_mimetypes and not request.accept_mimetypes.quality(mimetype):
+            return jsonify({'message': 'Streaming disponível apenas em JSON ou NDJSON'}), 406
+        return Response(stream_with_context(_gerar_stream(consulta, montar, formato)), mimetype=mimetype)
+
+    if after is None and limit is None:
+        # Formato legado: lista completa, sem envelope
+        return responder([montar(linha) for linha in consulta])
+
+    limit = min(limit or LIMITE_PADRAO, LIMITE_MAXIMO)
+    linhas = consulta.limit(limit + 1).all()  # Uma linha a mais indica que existe próxima página
+    proximo = None
+    if len(linhas) > limit:
+        linhas = linhas[:limit]
+        proximo = linhas[-1][0]  # A coluna de id é sempre a primeira da seleção
+
+    return responder({'itens': [montar(linha) for linha in linhas], 'next': proximo})
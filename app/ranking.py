@@ -0,0 +1,106 @@
+# app/ranking.py
+from flask import current_app
+from sqlalchemy import case, or_, and_, select
+from app.database import db
+from app.models import Clube, Livro, ResumoLivro
+
+# Ranking dos livros pela média bayesiana das notas:
+#
+#     pontuacao = (C * m + soma) / (C + total)
+#
+# m é a nota atribuída a priori e C o seu peso, em avaliações. Um livro com
+# poucas avaliações fica perto de m e só se afasta dela conforme acumula
+# avaliações. m e C são fixos (configuração), então a pontuação de um livro
+# só muda quando as avaliações dele mudam: ela é gravada em resumos_livros
+# na mesma transação da avaliação e o ranking é uma leitura em ordem do
+# índice (pontuacao, id_livro), sem agregar avaliações.
+
+TAMANHO_LOTE_RECONSTRUCAO = 5000
+
+
+class CursorInvalido(ValueError):
+    """Erro levantado quando ?after do ranking não é um cursor válido."""
+
+
+def _priori():
+    return current_app.config['RANKING_PESO_PRIORI'], current_app.config['RANKING_MEDIA_PRIORI']
+
+
+def pontuacao_bayesiana(total, soma):
+    """Média bayesiana de um livro; None quando ele ainda não tem avaliações."""
+    if not total:
+        return None
+    peso, media = _priori()
+    return (peso * media + soma) / (peso + total)
+
+
+def expressao_pontuacao():
+    """A mesma conta de pontuacao_bayesiana, calculada pelo banco sobre as colunas do resumo."""
+    peso, media = _priori()
+    return case((ResumoLivro.total > 0, (ResumoLivro.soma + peso * media) / (ResumoLivro.total + peso)),
+                else_=None)
+
+
+def atualizar_pontuacao(id_livro):
+    """Recalcula a pontuação do livro na transação corrente, a partir do resumo já ajustado."""
+    db.session.query(ResumoLivro).filter_by(id_livro=id_livro).update(
+        {ResumoLivro.pontuacao: expressao_pontuacao()}, synchronize_session=False)
+
+
+def codificar_cursor(pontuacao, id_livro):
+    return f'{pontuacao!r}_{id_livro}'
+
+
+def decodificar_cursor(cursor):
+    try:
+        pontuacao, id_livro = cursor.split('_')
+        return float(pontuacao), int(id_livro)
+    except ValueError:
+        raise CursorInvalido('Cursor de paginação inválido') from None
+
+
+def consultar_ranking(limite, id_clube=None, depois=None, id_usuario=None):
+    """Retorna até ``limite`` linhas (id, titulo, autor, id_clube, pontuacao, total, soma) em ordem de ranking.
+
+    ``id_usuario`` restringe aos livros dos clubes criados por esse usuário.
+    A paginação é por cursor sobre (pontuacao, id_livro), em ordem
+    decrescente dos dois: as páginas não repetem nem pulam livros cuja
+    pontuação não mudou entre as requisições.
+    """
+    consulta = (db.session.query(Livro.id, Livro.titulo, Livro.autor, Livro.id_clube, ResumoLivro.pontuacao,
+                                 ResumoLivro.total, ResumoLivro.soma)
+                .join(Livro, Livro.id == ResumoLivro.id_livro)
+                .join(Clube, Clube.id == Livro.id_clube)
+                .filter(ResumoLivro.pontuacao.isnot(None), Clube.excluido_em.is_(None)))
+    if id_clube is not None:
+        consulta = consulta.filter(ResumoLivro.id_clube == id_clube)
+    if id_usuario is not None:
+        consulta = consulta.filter(Clube.id_usuario_criador == id_usuario)
+    if depois is not None:
+        pontuacao, id_livro = depois
+        consulta = consulta.filter(or_(ResumoLivro.pontuacao < pontuacao,
+                                       and_(ResumoLivro.pontuacao == pontuacao, ResumoLivro.id_livro < id_livro)))
+    return consulta.order_by(ResumoLivro.pontuacao.desc(), ResumoLivro.id_livro.desc()).limit(limite).all()
+
+
+def reconstruir_ranking():
+    """Regrava id_clube e pontuacao de todos os resumos em lotes e retorna quantos foram processados.
+
+    Necessário após mudar RANKING_MEDIA_PRIORI/RANKING_PESO_PRIORI ou para
+    resumos criados antes do ranking; os contadores em si são corrigidos
+    por `flask estatisticas recalcular`.
+    """
+    processados = 0
+    ultimo_id = 0
+    id_clube = select(Livro.id_clube).where(Livro.id == ResumoLivro.id_livro).scalar_subquery()
+    while True:
+        ids = [linha[0] for linha in db.session.query(ResumoLivro.id_livro).filter(ResumoLivro.id_livro > ultimo_id)
+               .order_by(ResumoLivro.id_livro).limit(TAMANHO_LOTE_RECONSTRUCAO)]
+        if not ids:
+            return processados
+        db.session.query(ResumoLivro).filter(ResumoLivro.id_livro.between(ids[0], ids[-1])).update(
+            {ResumoLivro.id_clube: id_clube, ResumoLivro.pontuacao: expressao_pontuacao()},
+            synchronize_session=False)
+        db.session.commit()
+        processados += len(ids)
+        ultimo_id = ids[-1]
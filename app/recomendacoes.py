@@ -0,0 +1,207 @@
+# app/recomendacoes.py
+import heapq
+import math
+import time
+from collections import defaultdict
+from sqlalchemy import select, delete, func, insert
+from app.database import db
+from app.models import Avaliacao, Livro, LivroSimilar, Estatistica
+from app.agregados import obter_estatisticas
+from app.versoes import agora
+
+# Recomendações item a item: a similaridade entre dois livros é o cosseno
+# entre seus vetores de notas (um componente por usuário). O cálculo roda
+# fora das requisições (`flask recomendacoes calcular`) e grava os K
+# vizinhos mais próximos de cada livro em livros_similares; as rotas só
+# fazem uma consulta indexada nessa tabela.
+#
+# Com NumPy/SciPy instalados a matriz usuário x livro é esparsa e as
+# similaridades são calculadas em blocos de livros cujo tamanho respeita o
+# limite de memória; sem eles há uma implementação em Python puro, adequada
+# apenas para bases pequenas. NumPy/SciPy são dependências opcionais
+# (`pip install numpy scipy`, ver README); os dois motores são comparados
+# por test_similares_scipy_igual_python.
+
+try:
+    import numpy as np
+    import scipy.sparse as sp
+except ImportError:  # Dependências opcionais
+    np = sp = None
+
+TOP_K_PADRAO = 20
+MEMORIA_PADRAO_MB = 256
+TAMANHO_LOTE_LEITURA = 50000
+NOTA_MINIMA_RECOMENDACAO = 4  # Livros do usuário com nota a partir desta servem de base para recomendações
+
+
+def _ler_avaliacoes():
+    # Média das notas por (usuário, livro), lida do cursor do servidor em lotes
+    consulta = (select(Avaliacao.id_usuario, Avaliacao.id_livro, func.avg(Avaliacao.nota))
+                .group_by(Avaliacao.id_usuario, Avaliacao.id_livro)
+                .execution_options(stream_results=True, yield_per=TAMANHO_LOTE_LEITURA))
+    yield from db.session.execute(consulta).partitions()
+
+
+class MatrizSciPy:
+    """Matriz livro x usuário esparsa (CSR) com as linhas normalizadas."""
+
+    motor = 'scipy'
+
+    def __init__(self):
+        usuarios, livros, notas = [], [], []
+        for lote in _ler_avaliacoes():
+            colunas = np.array(lote, dtype=np.float64)
+            usuarios.append(colunas[:, 0].astype(np.int64))
+            livros.append(colunas[:, 1].astype(np.int64))
+            notas.append(colunas[:, 2].astype(np.float32))
+        usuarios = np.concatenate(usuarios) if usuarios else np.empty(0, np.int64)
+        livros = np.concatenate(livros) if livros else np.empty(0, np.int64)
+        notas = np.concatenate(notas) if notas else np.empty(0, np.float32)
+
+        self.ids_livros, linhas = np.unique(livros, return_inverse=True)
+        _, colunas = np.unique(usuarios, return_inverse=True)
+        self.avaliacoes = len(notas)
+        matriz = sp.csr_matrix((notas, (linhas, colunas)),
+                               shape=(len(self.ids_livros), int(colunas.max()) + 1 if len(colunas) else 0))
+        normas = np.sqrt(np.asarray(matriz.multiply(matriz).sum(axis=1)).ravel())
+        normas[normas == 0] = 1
+        self.matriz = sp.diags(1 / normas).astype(np.float32) @ matriz
+        self.transposta = self.matriz.T.tocsc()
+        self._posicoes = {int(id_livro): i for i, id_livro in enumerate(self.ids_livros)}
+
+    def livros(self):
+        return [int(id_livro) for id_livro in self.ids_livros]
+
+    def vizinhos(self, ids, k, memoria_bytes):
+        """Gera (id_livro, [(id_similar, similaridade)]) para cada livro de ``ids``."""
+        total = len(self.ids_livros)
+        # Cada bloco vira uma matriz densa de bloco x total (float32) mais a cópia usada na ordenação
+        bloco = max(1, memoria_bytes // max(1, total * 4 * 2))
+        posicoes = [self._posicoes[id_livro] for id_livro in ids if id_livro in self._posicoes]
+        for id_livro in ids:
+            if id_livro not in self._posicoes:
+                yield id_livro, []
+        for inicio in range(0, len(posicoes), bloco):
+            linhas = posicoes[inicio:inicio + bloco]
+            similaridades = (self.matriz[linhas] @ self.transposta).toarray()
+            similaridades[np.arange(len(linhas)), linhas] = 0  # O próprio livro não é vizinho
+            quantidade = min(k, total - 1)
+            for i, posicao in enumerate(linhas):
+                linha = similaridades[i]
+                if quantidade <= 0:
+                    yield int(self.ids_livros[posicao]), []
+                    continue
+                melhores = np.argpartition(-linha, quantidade - 1)[:quantidade]
+                melhores = melhores[np.argsort(-linha[melhores], kind='stable')]
+                yield int(self.ids_livros[posicao]), [(int(self.ids_livros[j]), float(linha[j]))
+                                                      for j in melhores if linha[j] > 0]
+
+
+class MatrizPython:
+    """Mesma interface de MatrizSciPy com dicionários; usada quando NumPy/SciPy não estão instalados."""
+
+    motor = 'python'
+
+    def __init__(self):
+        self.por_livro = defaultdict(dict)
+        self.avaliacoes = 0
+        for lote in _ler_avaliacoes():
+            for id_usuario, id_livro, nota in lote:
+                self.por_livro[id_livro][id_usuario] = float(nota)
+                self.avaliacoes += 1
+        self.por_usuario = defaultdict(list)
+        for id_livro, notas in self.por_livro.items():
+            norma = math.sqrt(sum(nota * nota for nota in notas.values()))
+            for id_usuario in notas:
+                notas[id_usuario] /= norma
+                self.por_usuario[id_usuario].append((id_livro, notas[id_usuario]))
+
+    def livros(self):
+        return sorted(self.por_livro)
+
+    def vizinhos(self, ids, k, memoria_bytes):
+        for id_livro in ids:
+            produtos = defaultdict(float)
+            for id_usuario, nota in self.por_livro.get(id_livro, {}).items():
+                for outro, nota_outro in self.por_usuario[id_usuario]:
+                    if outro != id_livro:
+                        produtos[outro] += nota * nota_outro
+            melhores = heapq.nlargest(k, produtos.items(), key=lambda item: (item[1], -item[0]))
+            yield id_livro, [(outro, similaridade) for outro, similaridade in melhores if similaridade > 0]
+
+
+def _gravar(resultados, tamanho_lote=1000):
+    # Substitui os vizinhos de cada livro, uma transação por lote de livros
+    gravados = 0
+    lote = []
+
+    def descarregar():
+        nonlocal gravados
+        db.session.execute(delete(LivroSimilar).where(LivroSimilar.id_livro.in_([id_livro for id_livro, _ in lote])))
+        linhas = [{'id_livro': id_livro, 'posicao': posicao, 'id_similar': id_similar, 'similaridade': similaridade}
+                  for id_livro, vizinhos in lote
+                  for posicao, (id_similar, similaridade) in enumerate(vizinhos, start=1)]
+        if linhas:
+            db.session.execute(insert(LivroSimilar), linhas)
+        db.session.commit()
+        gravados += len(linhas)
+
+    for resultado in resultados:
+        lote.append(resultado)
+        if len(lote) >= tamanho_lote:
+            descarregar()
+            lote = []
+    if lote:
+        descarregar()
+    return gravados
+
+
+def calcular_similares(k=TOP_K_PADRAO, completo=False, memoria_mb=MEMORIA_PADRAO_MB, motor=None):
+    """Recalcula a tabela livros_similares e retorna um resumo da execução.
+
+    No modo incremental só são recalculados os livros com avaliações
+    alteradas desde a última execução, os livros que os tinham como vizinhos
+    e os seus novos vizinhos. Um livro pode ainda deixar de entrar na lista
+    de outro livro não relacionado; uma execução ``completo`` periódica
+    corrige isso.
+    """
+    inicio = time.perf_counter()
+    marcador = agora()
+    estatistica = obter_estatisticas()
+    ultima = estatistica.similares_calculado_em
+
+    if motor is None:
+        motor = 'scipy' if sp is not None else 'python'
+    matriz = MatrizSciPy() if motor == 'scipy' else MatrizPython()
+    memoria_bytes = memoria_mb * 1024 * 1024
+
+    if completo or ultima is None:
+        alvos = matriz.livros()
+        gravados = _gravar(matriz.vizinhos(alvos, k, memoria_bytes))
+        # Livros que perderam todas as avaliações não aparecem na matriz
+        db.session.execute(delete(LivroSimilar).where(
+            LivroSimilar.id_livro.notin_(select(Avaliacao.id_livro).distinct())))
+        recalculados = len(alvos)
+    else:
+        alterados = {id_livro for id_livro, in db.session.query(Livro.id).filter(Livro.atualizado_em >= ultima)}
+        antigos = {id_livro for id_livro, in db.session.query(LivroSimilar.id_livro)
+                   .filter(LivroSimilar.id_similar.in_(alterados))} if alterados else set()
+        alvos = sorted(alterados | antigos)
+        novos_vizinhos = set()
+
+        def com_vizinhos(resultados):
+            for id_livro, vizinhos in resultados:
+                if id_livro in alterados:
+                    novos_vizinhos.update(id_similar for id_similar, _ in vizinhos)
+                yield id_livro, vizinhos
+
+        gravados = _gravar(com_vizinhos(matriz.vizinhos(alvos, k, memoria_bytes)))
+        segunda_passada = sorted(novos_vizinhos - set(alvos))
+        gravados += _gravar(matriz.vizinhos(segunda_passada, k, memoria_bytes))
+        recalculados = len(alvos) + len(segunda_passada)
+
+    db.session.query(Estatistica).filter_by(id=estatistica.id).update(
+        {'similares_calculado_em': marcador}, synchronize_session=False)
+    db.session.commit()
+    return {'motor': matriz.motor, 'avaliacoes': matriz.avaliacoes, 'livros_recalculados': recalculados,
+            'vizinhos_gravados': gravados, 'segundos': round(time.perf_counter() - inicio, 2)}
@@ -0,0 +1,224 @@
+# app/registro.py
+import atexit
+import itertools
+import json
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Pipeline de logs fora do caminho da requisição: as rotas só colocam o
+# registro em uma fila limitada (QueueHandler) e uma thread (QueueListener)
+# formata e grava em lotes no arquivo. Com a fila cheia o registro é
+# descartado e contado, em vez de a requisição esperar pelo disco.
+
+FORMATO_TEXTO = '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+
+# Logger das mensagens de alto volume (uma por requisição autenticada), sujeito a amostragem
+LOGGER_ACESSO = 'bookbridge.acesso'
+
+
+class FormatadorJSON(logging.Formatter):
+    """Formata cada registro como uma linha JSON."""
+
+    def format(self, record):
+        dados = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensagem': record.getMessage(),
+            'modulo': record.module,
+            'linha': record.lineno,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            dados['excecao'] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False)
+
+
+class FiltroAmostragem(logging.Filter):
+    """Mantém apenas 1 a cada ``round(1 / taxa)`` registros abaixo de WARNING.
+
+    Avisos e erros sempre passam. A amostragem é determinística (por contagem)
+    para que a proporção gravada seja exata mesmo com poucos registros.
+    """
+
+    def __init__(self, taxa):
+        super().__init__()
+        self.intervalo = max(1, round(1 / taxa)) if taxa > 0 else 0
+        self._contador = itertools.count()
+        self.descartados = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.intervalo and next(self._contador) % self.intervalo == 0:
+            return True
+        self.descartados += 1
+        return False
+
+
+class ManipuladorFila(QueueHandler):
+    """QueueHandler que não bloqueia: com a fila cheia o registro é descartado e contado."""
+
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.enfileirados = 0
+        self.descartados = 0
+
+    def prepare(self, record):
+        # Só resolve a mensagem e a exceção; a formatação fica para a thread de escrita
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            self.enfileirados += 1
+        except queue.Full:
+            self.descartados += 1
+
+
+class ManipuladorLotes(logging.Handler):
+    """Acumula os registros recebidos do QueueListener e grava vários de uma vez.
+
+    O lote é gravado quando atinge ``tamanho_lote`` ou quando a fila esvazia,
+    então em baixa carga cada registro ainda chega ao arquivo logo em seguida.
+    """
+
+    def __init__(self, arquivo, fila, tamanho_lote=256):
+        super().__init__()
+        self.arquivo = arquivo
+        self.fila = fila
+        self.tamanho_lote = tamanho_lote
+        self._stream = open(arquivo, 'a', encoding='utf-8')
+        self._pendentes = []
+        self.escritos = 0
+        self.lotes = 0
+
+    def emit(self, record):
+        try:
+            self._pendentes.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._pendentes) >= self.tamanho_lote or self.fila.empty():
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self._pendentes or self._stream is None:
+                return
+            self._stream.write('\n'.join(self._pendentes) + '\n')
+            self._stream.flush()
+            self.escritos += len(self._pendentes)
+            self.lotes += 1
+            self._pendentes = []
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+        super().close()
+
+
+class OuvinteFila(QueueListener):
+    """QueueListener cujo sentinela de parada espera espaço na fila em vez de falhar."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class RegistroAssincrono:
+    """Fila limitada + thread de escrita em lotes, ligadas a um logger."""
+
+    def __init__(self, arquivo, formatador, tamanho_fila=10000, tamanho_lote=256):
+        self.fila = queue.Queue(tamanho_fila)
+        self.manipulador_fila = ManipuladorFila(self.fila)
+        self.manipulador_lotes = ManipuladorLotes(arquivo, self.fila, tamanho_lote)
+        self.manipulador_lotes.setFormatter(formatador)
+        self.ouvinte = OuvinteFila(self.fila, self.manipulador_lotes)
+        self._lock = threading.Lock()
+        self._ativo = False
+
+    def iniciar(self):
+        with self._lock:
+            if not self._ativo:
+                self.ouvinte.start()
+                self._ativo = True
+
+    def parar(self):
+        """Grava o que ainda estiver na fila e encerra a thread."""
+        with self._lock:
+            if self._ativo:
+                self.ouvinte.stop()
+                self._ativo = False
+        self.manipulador_lotes.close()
+
+    def estatisticas(self):
+        return {'enfileirados': self.manipulador_fila.enfileirados,
+                'descartados_fila_cheia': self.manipulador_fila.descartados,
+                'na_fila': self.fila.qsize(),
+                'escritos': self.manipulador_lotes.escritos,
+                'lotes': self.manipulador_lotes.lotes}
+
+
+_registro = None
+_filtros_amostragem = {}
+
+
+def ler_amostragem(texto):
+    """Converte "logger=taxa,logger=taxa" em {logger: taxa}."""
+    taxas = {}
+    for item in (texto or '').split(','):
+        if '=' in item:
+            nome, taxa = item.split('=', 1)
+            taxas[nome.strip()] = float(taxa)
+    return taxas
+
+
+def configurar_log(arquivo='app.log', modo='assincrono', formato='json', tamanho_fila=10000,
+                   tamanho_lote=256, amostragem=None, nivel=logging.INFO):
+    """Configura o logger raiz da aplicação e retorna-o.
+
+    ``modo`` 'assincrono' usa a fila com thread de escrita; 'sincrono' grava
+    direto no arquivo (o comportamento antigo). ``amostragem`` mapeia nome de
+    logger -> fração de registros INFO/DEBUG mantidos.
+    """
+    global _registro
+    formatador = FormatadorJSON() if formato == 'json' else logging.Formatter(FORMATO_TEXTO)
+    raiz = logging.getLogger()
+    raiz.setLevel(nivel)
+
+    if modo == 'assincrono':
+        _registro = RegistroAssincrono(arquivo, formatador, tamanho_fila, tamanho_lote)
+        raiz.addHandler(_registro.manipulador_fila)
+        _registro.iniciar()
+        atexit.register(_registro.parar)
+    else:
+        manipulador = logging.FileHandler(arquivo, encoding='utf-8')
+        manipulador.setFormatter(formatador)
+        raiz.addHandler(manipulador)
+
+    for nome, taxa in (amostragem or {}).items():
+        if taxa < 1:
+            filtro = FiltroAmostragem(taxa)
+            logging.getLogger(nome).addFilter(filtro)
+            _filtros_amostragem[nome] = filtro
+    return raiz
+
+
+def estatisticas_log():
+    """Contadores do pipeline de logs (vazio no modo síncrono)."""
+    dados = _registro.estatisticas() if _registro else {}
+    dados['descartados_amostragem'] = {nome: filtro.descartados for nome, filtro in _filtros_amostragem.items()}
+    return dados
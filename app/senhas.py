@@ -0,0 +1,100 @@
+# app/senhas.py
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TempoEsgotado
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Hash e verificação de senhas fora das threads que atendem requisições.
+# O scrypt é CPU-bound e segura o GIL; em um pool de processos ele roda em
+# paralelo de verdade e limita quantos hashes acontecem ao mesmo tempo.
+# Sobrecarga vira FilaSenhasCheia (503) sem esperar: fila cheia, hash que
+# passou de SENHA_HASH_TIMEOUT ou processo do pool que morreu.
+
+METODO_PADRAO = 'scrypt:32768:8:1'
+
+_lock = threading.Lock()
+_executor = None
+_configuracao = None  # (processos, fila) do pool atual
+_vagas = None
+
+
+class FilaSenhasCheia(RuntimeError):
+    """Levantado quando o hash não pode ser feito agora: fila cheia, tempo esgotado ou pool quebrado."""
+
+
+def _obter_executor():
+    global _executor, _configuracao, _vagas
+    processos = current_app.config.get('SENHA_HASH_PROCESSOS', 0)
+    if processos <= 0:
+        return None, None
+
+    configuracao = (processos, current_app.config.get('SENHA_HASH_FILA', 0))
+    with _lock:
+        if _executor is None or _configuracao != configuracao:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=processos)
+            _configuracao = configuracao
+            # Vagas = processos ocupados + pedidos aguardando na fila
+            _vagas = threading.BoundedSemaphore(sum(configuracao))
+        return _executor, _vagas
+
+
+def _descartar_executor(executor):
+    # Um pool com processo morto recusa tudo: o próximo pedido cria outro
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def _executar(funcao, *args):
+    executor, vagas = _obter_executor()
+    if executor is None:
+        return funcao(*args)
+
+    # Sem esperar por vaga: com os processos e a fila ocupados, recusa na hora
+    if not vagas.acquire(blocking=False):
+        raise FilaSenhasCheia('Fila de hash de senhas cheia')
+    try:
+        futuro = executor.submit(funcao, *args)
+    except BrokenProcessPool:
+        vagas.release()
+        _descartar_executor(executor)
+        raise FilaSenhasCheia('Pool de hash de senhas indisponível') from None
+    # A vaga só volta quando o trabalho termina: um hash que estourou o tempo
+    # continua ocupando o processo e não pode abrir espaço para outro
+    futuro.add_done_callback(lambda _: vagas.release())
+    try:
+        return futuro.result(timeout=current_app.config.get('SENHA_HASH_TIMEOUT', 10))
+    except TempoEsgotado:
+        futuro.cancel()  # Ainda na fila: não chega a rodar (e a vaga é liberada já)
+        raise FilaSenhasCheia('Tempo esgotado aguardando o hash da senha') from None
+    except BrokenProcessPool:
+        _descartar_executor(executor)
+        raise FilaSenhasCheia('Pool de hash de senhas indisponível') from None
+
+
+def gerar_hash(senha):
+    """Gera o hash da senha com o método configurado em SENHA_HASH_METODO."""
+    return _executar(generate_password_hash, senha, current_app.config.get('SENHA_HASH_METODO', METODO_PADRAO))
+
+
+def verificar_hash(senha_hash, senha):
+    """Compara a senha com o hash armazenado."""
+    return _executar(check_password_hash, senha_hash, senha)
+
+
+@lru_cache(maxsize=8)
+def _prefixo_metodo(metodo):
+    # O werkzeug completa os parâmetros omitidos (ex.: "scrypt" -> "scrypt:32768:8:1")
+    return generate_password_hash('', method=metodo, salt_length=1).split('$', 1)[0]
+
+
+def precisa_rehash(senha_hash):
+    """Indica se o hash armazenado foi gerado com parâmetros diferentes da política atual."""
+    metodo = current_app.config.get('SENHA_HASH_METODO', METODO_PADRAO)
+    return senha_hash.split('$', 1)[0] != _prefixo_metodo(metodo)
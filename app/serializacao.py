@@ -0,0 +1,116 @@
+# app/serializacao.py
+import json
+from flask import request, Response
+
+# Serialização das respostas: linhas de consultas só de colunas viram
+# dicionários sem passar por objetos do ORM, e o corpo é gerado pelo
+# orjson (quando instalado) ou em MessagePack, conforme o Accept.
+
+try:
+    import orjson  # Dependência opcional: codificador JSON bem mais rápido que o da biblioteca padrão
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # Dependência opcional: habilita Accept: application/msgpack
+except ImportError:
+    msgpack = None
+
+MIMETYPE_JSON = 'application/json'
+MIMETYPE_MSGPACK = 'application/msgpack'
+
+
+class CamposInvalidos(ValueError):
+    """Erro levantado quando ?fields pede campos que a entidade não tem."""
+
+
+def para_json(dados):
+    """Codifica em JSON (bytes, UTF-8)."""
+    if orjson is not None:
+        return orjson.dumps(dados)
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def formatos_disponiveis():
+    return [MIMETYPE_JSON, MIMETYPE_MSGPACK] if msgpack is not None else [MIMETYPE_JSON]
+
+
+def negociar():
+    """Escolhe o formato da resposta pelo Accept; sem preferência atendível, responde JSON."""
+    return request.accept_mimetypes.best_match(formatos_disponiveis(), default=MIMETYPE_JSON)
+
+
+def responder(dados, status=200, headers=None):
+    """Resposta em JSON ou MessagePack, conforme o Accept da requisição."""
+    mimetype = negociar()
+    corpo = msgpack.packb(dados) if mimetype == MIMETYPE_MSGPACK else para_json(dados)
+    resposta = Response(corpo, status=status, mimetype=mimetype, headers=headers)
+    resposta.vary.add('Accept')
+    return resposta
+
+
+def campos_solicitados():
+    """Lê ?fields=a,b,c; None quando o parâmetro não foi enviado."""
+    if 'fields' not in request.args:
+        return None
+    return [campo.strip() for campo in request.args['fields'].split(',') if campo.strip()]
+
+
+class Selecao:
+    """Colunas a consultar e como montar cada linha retornada como dicionário."""
+
+    def __init__(self, colunas, montadores):
+        self.colunas = colunas
+        self._montadores = montadores
+
+    def montar(self, linha):
+        return {nome: montar(linha) for nome, montar in self._montadores}
+
+
+class Representacao:
+    """Campos expostos de uma entidade, cada um ligado a uma coluna.
+
+    ``compostos`` mapeia nome -> (colunas, função) para campos montados a
+    partir de várias colunas (ex.: o resumo de um livro).
+    """
+
+    def __init__(self, campos, compostos=None):
+        self.campos = campos
+        self.compostos = compostos or {}
+
+    def nomes(self):
+        return [*self.campos, *self.compostos]
+
+    def selecao(self, coluna_id=None, nomes=None):
+        """Monta a seleção dos campos ``nomes`` (todos se None).
+
+        ``coluna_id`` é sempre consultada como primeira coluna, mesmo fora
+        dos campos pedidos, para a paginação por cursor.
+        """
+        nomes = self.nomes() if nomes is None else nomes
+        desconhecidos = [nome for nome in nomes if nome not in self.campos and nome not in self.compostos]
+        if desconhecidos or not nomes:
+            raise CamposInvalidos(f"Campos inválidos em fields, use: {', '.join(self.nomes())}")
+
+        colunas = [coluna_id] if coluna_id is not None else []
+        montadores = []
+        for nome in self.nomes():  # Mantém a ordem da representação
+            if nome not in nomes:
+                continue
+            if nome in self.campos:
+                montadores.append((nome, _item(len(colunas))))
+                colunas.append(self.campos[nome])
+            else:
+                colunas_composto, funcao = self.compostos[nome]
+                inicio = len(colunas)
+                montadores.append((nome, _composto(inicio, inicio + len(colunas_composto), funcao)))
+                colunas.extend(colunas_composto)
+        return Selecao(colunas, montadores)
+
+
+def _item(indice):
+    return lambda linha: linha[indice]
+
+
+def _composto(inicio, fim, funcao):
+    return lambda linha: funcao(*linha[inicio:fim])
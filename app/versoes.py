@@ -0,0 +1,72 @@
+# app/versoes.py
+import hashlib
+from datetime import datetime, timezone
+from flask import request, make_response, Response
+from sqlalchemy import select
+from app.database import db
+from app.models import Clube, Livro
+
+# GET condicional: cada coleção tem uma versão incrementada pelas rotas de
+# escrita. O ETag é derivado dessa versão, então um If-None-Match igual é
+# respondido com 304 sem carregar nem serializar as linhas da coleção.
+
+
+def agora():
+    # Last-Modified tem precisão de segundos
+    return datetime.utcnow().replace(microsecond=0)
+
+
+def marcar_alteracao(modelo, id):
+    """Incrementa versao e atualizado_em de um Clube ou Livro na transação corrente."""
+    db.session.query(modelo).filter_by(id=id).update(
+        {modelo.versao: modelo.versao + 1, modelo.atualizado_em: agora()}, synchronize_session=False)
+
+
+def marcar_alteracao_livros(ids):
+    """Incrementa a versão dos livros ``ids`` e dos clubes deles, para escritas de avaliações.
+
+    A listagem de livros do clube (?incluir=resumo) traz o resumo das
+    avaliações, então o ETag do clube também precisa mudar.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    momento = agora()
+    db.session.query(Livro).filter(Livro.id.in_(ids)).update(
+        {Livro.versao: Livro.versao + 1, Livro.atualizado_em: momento}, synchronize_session=False)
+    db.session.query(Clube).filter(Clube.id.in_(select(Livro.id_clube).where(Livro.id.in_(ids)))).update(
+        {Clube.versao: Clube.versao + 1, Clube.atualizado_em: momento}, synchronize_session=False)
+
+
+def _etag(chave):
+    # A mesma coleção tem representações diferentes por página, formato e campos
+    variante = hashlib.sha1(request.query_string + request.headers.get('Accept', '').encode()).hexdigest()[:10]
+    return f'{chave}-{variante}'
+
+
+def _nao_modificado(etag, atualizado_em):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    # If-Modified-Since só é considerado quando o cliente não enviou If-None-Match
+    return (atualizado_em is not None and request.if_modified_since is not None
+            and request.if_modified_since >= atualizado_em.replace(microsecond=0, tzinfo=timezone.utc))
+
+
+def responder_condicional(chave, atualizado_em, gerar):
+    """Responde 304 quando o cliente já tem a versão ``chave``; senão chama ``gerar()``.
+
+    ``chave`` deve mudar sempre que o conteúdo mudar (ex.: ``clube-3-v17``).
+    """
+    etag = _etag(chave)
+    if _nao_modificado(etag, atualizado_em):
+        resposta = Response(status=304)
+    else:
+        resposta = make_response(gerar())
+        if resposta.status_code != 200:
+            return resposta
+
+    resposta.set_etag(etag)
+    if atualizado_em is not None:
+        resposta.last_modified = atualizado_em.replace(microsecond=0, tzinfo=timezone.utc)
+    resposta.headers['Cache-Control'] = 'no-cache'  # Sempre revalidar com o servidor
+    return resposta
@@ -0,0 +1,90 @@
+# benchmarks/avaliacoes.py
+"""Mede a vazão de POST /livros/<id>/avaliacoes com e sem a gravação agrupada.
+
+Cada modo roda num banco SQLite em arquivo com synchronous=FULL (um fsync
+por commit), com várias threads enviando avaliações ao mesmo tempo.
+
+Uso:
+    python -m benchmarks.avaliacoes --concorrencia 32 --avaliacoes 2000 --lote-ms 2 5
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.app import create_app
+from app.database import db
+
+LIVROS = 50
+EMAIL = 'bench@example.com'
+SENHA = 'senha_bench'
+
+
+def medir(concorrencia, avaliacoes, lote_ms):
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(pasta, 'bench.db')}",
+            'SQLITE_PRAGMAS': {'journal_mode': 'WAL', 'synchronous': 'FULL', 'busy_timeout': 30000},
+            'SENHA_HASH_PROCESSOS': 0,
+            'ADMISSAO_LIMITES': {},
+            'AVALIACOES_AGRUPADAS': lote_ms is not None,
+            'AVALIACOES_LOTE_MS': lote_ms or 0,
+        })
+        cliente = app.test_client()
+        with app.app_context():
+            db.create_all()
+        cliente.post('/usuarios', json={'nome': 'Bench', 'email': EMAIL, 'senha': SENHA})
+        token = cliente.post('/login', json={'email': EMAIL, 'senha': SENHA}).get_json()['token']
+        headers = {'Authorization': f'Bearer {token}'}
+        cliente.post('/clubes', json={'nome': 'Clube'}, headers=headers)
+        for i in range(LIVROS):
+            cliente.post('/clubes/1/livros', json={'titulo': f'Livro {i}', 'autor': 'Autor'}, headers=headers)
+
+        gerador = random.Random(42)
+        envios = [(gerador.randint(1, LIVROS), gerador.randint(1, 5)) for _ in range(avaliacoes)]
+
+        def avaliar(envio):
+            id_livro, nota = envio
+            inicio = time.perf_counter()
+            response = app.test_client().post(f'/livros/{id_livro}/avaliacoes', json={'nota': nota}, headers=headers)
+            return response.status_code, time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            resultados = list(executor.map(avaliar, envios))
+        duracao = time.perf_counter() - inicio
+
+        with app.app_context():
+            gravadas = db.session.execute(db.text('SELECT COUNT(*) FROM avaliacoes')).scalar()
+        lotes = app.extensions['gravacao_avaliacoes'].estatisticas()['tamanhos']
+
+    latencias = sorted(latencia for _, latencia in resultados)
+    return {
+        'modo': 'agrupada' if lote_ms is not None else 'um_commit_por_avaliacao',
+        'lote_ms': lote_ms,
+        'falhas': sum(1 for status, _ in resultados if status != 201),
+        'gravadas': gravadas,
+        'avaliacoes_por_segundo': round(avaliacoes / duracao, 1),
+        'media_por_lote': round(lotes.soma / lotes.contagem, 1) if lotes.contagem else None,
+        'p50_ms': round(latencias[len(latencias) // 2] * 1000, 1),
+        'p99_ms': round(latencias[int(len(latencias) * 0.99) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concorrencia', type=int, default=32)
+    parser.add_argument('--avaliacoes', type=int, default=2000)
+    parser.add_argument('--lote-ms', type=float, nargs='+', default=[2, 5])
+    args = parser.parse_args()
+
+    resultados = [medir(args.concorrencia, args.avaliacoes, None)]
+    resultados += [medir(args.concorrencia, args.avaliacoes, lote_ms) for lote_ms in args.lote_ms]
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/busca.py
+"""Mede a latência de GET /livros/busca sobre um catálogo sintético.
+
+Uso:
+    python -m benchmarks.busca --livros 1000000 --consultas 500
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import insert
+
+from app.app import create_app
+from app.database import db
+from app.models import Usuario, Clube, Livro
+from app.busca import indice_busca
+
+PALAVRAS = ['memórias', 'póstumas', 'coração', 'sertão', 'veredas', 'cidade', 'noite', 'mar', 'viagem',
+            'história', 'canção', 'exílio', 'amor', 'sombra', 'janela', 'relógio', 'inverno', 'jardim',
+            'ilha', 'estrela', 'rio', 'caminho', 'lição', 'irmãos', 'família', 'música', 'silêncio']
+AUTORES = ['Machado de Assis', 'Clarice Lispector', 'Graciliano Ramos', 'Cecília Meireles', 'Jorge Amado',
+           'Érico Veríssimo', 'Rachel de Queiroz', 'João Guimarães Rosa', 'Lygia Fagundes Telles']
+TAMANHO_LOTE = 10000
+
+
+def popular(total, gerador):
+    usuario = Usuario(nome='Bench', email='bench@example.com', senha_hash='-')
+    db.session.add(usuario)
+    db.session.flush()
+    clube = Clube(nome='Clube Bench', id_usuario_criador=usuario.id)
+    db.session.add(clube)
+    db.session.commit()
+
+    for inicio in range(0, total, TAMANHO_LOTE):
+        lote = [{'titulo': ' '.join(gerador.sample(PALAVRAS, 3)).capitalize(), 'autor': gerador.choice(AUTORES),
+                 'id_clube': clube.id} for _ in range(min(TAMANHO_LOTE, total - inicio))]
+        db.session.execute(insert(Livro), lote)
+        db.session.commit()
+    return indice_busca().reindexar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--livros', type=int, default=1_000_000)
+    parser.add_argument('--consultas', type=int, default=500)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+    gerador = random.Random(args.semente)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(pasta, 'busca.db')}",
+                          'SENHA_HASH_PROCESSOS': 0})
+        with app.app_context():
+            db.create_all()
+            inicio = time.perf_counter()
+            indexados = popular(args.livros, gerador)
+            carga = time.perf_counter() - inicio
+
+            from routes.routes import gerador_token
+            headers = {'Authorization': f'Bearer {gerador_token(1)}'}
+            cliente = app.test_client()
+            latencias = []
+            for _ in range(args.consultas):
+                termos = gerador.sample(PALAVRAS, gerador.choice([1, 2]))
+                consulta = ' '.join(termos)[:-2]  # Corta o fim da última palavra para exercitar a busca por prefixo
+                inicio = time.perf_counter()
+                response = cliente.get('/livros/busca', query_string={'q': consulta, 'limit': 20}, headers=headers)
+                latencias.append(time.perf_counter() - inicio)
+                assert response.status_code == 200, response.get_json()
+
+    latencias.sort()
+    print(json.dumps({
+        'livros': indexados,
+        'segundos_carga_e_indexacao': round(carga, 1),
+        'consultas': args.consultas,
+        'p50_ms': round(latencias[len(latencias) // 2] * 1000, 2),
+        'p95_ms': round(latencias[int(len(latencias) * 0.95) - 1] * 1000, 2),
+        'p99_ms': round(latencias[int(len(latencias) * 0.99) - 1] * 1000, 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
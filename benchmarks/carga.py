@@ -0,0 +1,470 @@
+# benchmarks/carga.py
+"""Gerador de carga: popula uma base sintética e mede todas as rotas com uma mistura ponderada.
+
+A base é gerada de forma determinística a partir da semente, e cada thread
+usa o próprio usuário (token obtido em /login) e o próprio gerador
+aleatório, então duas execuções com os mesmos parâmetros fazem a mesma
+sequência de requisições. O resultado (JSON) traz p50/p95/p99 e vazão por
+operação e pode ser comparado com uma execução anterior:
+
+    python -m benchmarks.carga --avaliacoes 2000000 --requisicoes 20000 --saida atual.json
+    python -m benchmarks.carga --avaliacoes 2000000 --requisicoes 20000 --comparar base.json
+
+Com --banco apontando para um MySQL (ou compatível), o banco precisa estar vazio.
+
+A mistura cobre todas as rotas da API, exceto o modo Server-Sent Events e a
+espera longa de /mudancas (conexões abertas por segundos não têm latência
+comparável). livros_similares é calculada na carga com NumPy/SciPy
+instalados; sem eles a tabela fica vazia (o motor em Python puro não
+suporta bases deste tamanho) e similares/recomendações medem só a consulta.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import insert
+
+from app.app import create_app
+from app.admissao import ler_limites
+from app.database import db
+from app.models import Usuario, Clube, Livro, Avaliacao
+from app.agregados import recalcular_estatisticas
+from app.busca import indice_busca
+from app.recomendacoes import calcular_similares, sp
+from app.senhas import gerar_hash
+
+SENHA = 'senha_carga'
+TAMANHO_LOTE = 50000
+PALAVRAS = ['memórias', 'coração', 'sertão', 'veredas', 'cidade', 'noite', 'mar', 'viagem', 'história',
+            'canção', 'exílio', 'amor', 'sombra', 'janela', 'relógio', 'inverno', 'jardim', 'ilha', 'estrela']
+
+# operação -> peso na mistura (proporção aproximada das requisições)
+MISTURA_PADRAO = {
+    'listar_clubes': 8, 'listar_livros': 12, 'listar_avaliacoes': 12, 'resumo_livro': 10, 'buscar_livros': 8,
+    'estatisticas': 8, 'listar_usuarios': 2, 'metricas': 1,
+    'login': 1, 'criar_usuario': 1, 'atualizar_usuario': 1, 'deletar_usuario': 1,
+    'criar_clube': 2, 'atualizar_clube': 1, 'deletar_clube': 1,
+    'criar_livro': 3, 'importar_livros': 1, 'atualizar_livro': 2, 'deletar_livro': 1,
+    'criar_avaliacao': 10, 'atualizar_avaliacao': 3, 'deletar_avaliacao': 2,
+    'exportar_clubes': 1, 'lote': 2,
+    'ranking_livros': 4, 'livros_similares': 3, 'recomendacoes': 3, 'mudancas': 2, 'consultar_tarefa': 1,
+}
+
+
+class Base:
+    """Layout determinístico dos ids gerados por ``popular``.
+
+    Além dos dados regulares, cada thread recebe ``reserva`` usuários, clubes
+    e livros sem dependentes, consumidos pelas operações de exclusão.
+    """
+
+    def __init__(self, usuarios, clubes, livros, avaliacoes, threads, reserva):
+        self.usuarios = max(usuarios, threads)
+        self.clubes = max(clubes, threads)
+        self.livros = max(livros, self.clubes)
+        self.avaliacoes = avaliacoes
+        self.threads = threads
+        self.reserva = reserva
+
+    def usuario_reserva(self, thread, k):
+        return self.usuarios + thread * self.reserva + k + 1
+
+    def clube_reserva(self, thread, k):
+        return self.clubes + thread * self.reserva + k + 1
+
+    def livro_reserva(self, thread, k):
+        return self.livros + thread * self.reserva + k + 1
+
+    # Dados regulares: o dono de cada linha é definido pelo id, em rodízio
+    def criador_clube(self, id_clube):
+        return (id_clube - 1) % self.usuarios + 1
+
+    def clube_livro(self, id_livro):
+        return (id_livro - 1) % self.clubes + 1
+
+    def usuario_avaliacao(self, id_avaliacao):
+        return (id_avaliacao - 1) % self.usuarios + 1
+
+
+def _inserir_em_lotes(modelo, total, gerar_linha):
+    for inicio in range(1, total + 1, TAMANHO_LOTE):
+        db.session.execute(insert(modelo), [gerar_linha(i) for i in range(inicio, min(inicio + TAMANHO_LOTE, total + 1))])
+        db.session.commit()
+
+
+def popular(base, gerador):
+    """Grava a base sintética e reconstrói os agregados, o índice de busca e os livros similares."""
+    senha_hash = gerar_hash(SENHA)
+    reservas = base.threads * base.reserva
+
+    _inserir_em_lotes(Usuario, base.usuarios + reservas, lambda i: {
+        'id': i, 'nome': f'Usuário {i}', 'email': f'usuario{i}@carga.example', 'senha_hash': senha_hash})
+
+    def clube(i):
+        criador = base.criador_clube(i) if i <= base.clubes else (i - base.clubes - 1) // base.reserva + 1
+        return {'id': i, 'nome': f'Clube {i}', 'descricao': f'Clube sintético {i}', 'id_usuario_criador': criador}
+    _inserir_em_lotes(Clube, base.clubes + reservas, clube)
+
+    def livro(i):
+        # Os livros de reserva ficam no clube regular da própria thread (id = thread + 1)
+        id_clube = base.clube_livro(i) if i <= base.livros else (i - base.livros - 1) // base.reserva + 1
+        return {'id': i, 'titulo': ' '.join(gerador.sample(PALAVRAS, 3)).capitalize(),
+                'autor': f'Autor {gerador.randrange(1000)}', 'id_clube': id_clube}
+    _inserir_em_lotes(Livro, base.livros + reservas, livro)
+
+    _inserir_em_lotes(Avaliacao, base.avaliacoes, lambda i: {
+        'id': i, 'nota': gerador.randint(1, 5), 'comentario': None,
+        'id_livro': gerador.randint(1, base.livros), 'id_usuario': base.usuario_avaliacao(i)})
+
+    recalcular_estatisticas()
+    db.session.commit()
+    indice_busca().reindexar()
+    if sp is not None:
+        calcular_similares(completo=True)
+
+
+class Cliente:
+    """Uma thread da carga: usuário, token, gerador e cursores das exclusões próprios."""
+
+    def __init__(self, app, base, indice, semente):
+        self.app = app
+        self.cliente = app.test_client()
+        self.base = base
+        self.indice = indice
+        self.id_usuario = indice + 1
+        self.gerador = random.Random(f'{semente}-{indice}')
+        self.cursores = {'usuario': 0, 'clube': 0, 'livro': 0, 'avaliacao': 0}
+        self.criados = 0
+        self.tarefa = None  # Última tarefa de exclusão agendada pela thread
+        response = self.cliente.post('/login', json={'email': f'usuario{self.id_usuario}@carga.example',
+                                                     'senha': SENHA})
+        self.headers = {'Authorization': f"Bearer {response.get_json()['token']}"}
+        self.cursor_mudancas = self.cliente.get('/mudancas', headers=self.headers).get_json()['cursor']
+
+    # Escolha de alvos -------------------------------------------------------
+
+    def _livro(self):
+        return self.gerador.randint(1, self.base.livros)
+
+    def _livro_proprio(self):
+        # Livros regulares do clube da thread: ids ≡ indice (mod clubes)
+        voltas = (self.base.livros - self.id_usuario) // self.base.clubes
+        return self.id_usuario + self.gerador.randint(0, voltas) * self.base.clubes
+
+    def _avaliacao_propria(self, consumir=False):
+        # Avaliações regulares do usuário da thread: ids ≡ indice (mod usuarios), a partir do cursor de exclusão
+        voltas = (self.base.avaliacoes - self.id_usuario) // self.base.usuarios
+        if self.base.avaliacoes < self.id_usuario or self.cursores['avaliacao'] > voltas:
+            return None
+        k = self.cursores['avaliacao'] if consumir else self.gerador.randint(self.cursores['avaliacao'], voltas)
+        if consumir:
+            self.cursores['avaliacao'] += 1
+        return self.id_usuario + k * self.base.usuarios
+
+    def _reserva(self, tipo, montar):
+        if self.cursores[tipo] >= self.base.reserva:
+            return None
+        self.cursores[tipo] += 1
+        return montar(self.indice, self.cursores[tipo] - 1)
+
+    def _unico(self):
+        self.criados += 1
+        return f'{self.indice}-{self.criados}'
+
+    # Operações: cada uma retorna (rota, metodo, url, kwargs) ----------------
+
+    def listar_clubes(self):
+        return 'GET /clubes', 'GET', '/clubes', {'query_string': {'limit': 50}}
+
+    def listar_livros(self):
+        # A listagem só é permitida ao criador: clubes regulares da thread são ids ≡ indice (mod usuarios)
+        clube = self.id_usuario + self.gerador.randint(0, (self.base.clubes - self.id_usuario) // self.base.usuarios) \
+            * self.base.usuarios
+        return ('GET /clubes/<id>/livros', 'GET', f'/clubes/{clube}/livros',
+                {'query_string': {'limit': 50}, 'headers': self.headers})
+
+    def listar_avaliacoes(self):
+        return 'GET /livros/<id>/avaliacoes', 'GET', f'/livros/{self._livro()}/avaliacoes', {}
+
+    def resumo_livro(self):
+        return 'GET /livros/<id>/resumo', 'GET', f'/livros/{self._livro()}/resumo', {}
+
+    def buscar_livros(self):
+        consulta = self.gerador.choice(PALAVRAS)[:-1]
+        return ('GET /livros/busca', 'GET', '/livros/busca',
+                {'query_string': {'q': consulta, 'limit': 20}, 'headers': self.headers})
+
+    def estatisticas(self):
+        return 'GET /estatisticas', 'GET', '/estatisticas', {}
+
+    def listar_usuarios(self):
+        return 'GET /usuarios', 'GET', '/usuarios', {'query_string': {'limit': 50}}
+
+    def metricas(self):
+        return 'GET /metrics', 'GET', '/metrics', {}
+
+    def ranking_livros(self):
+        return 'GET /livros/ranking', 'GET', '/livros/ranking', {'query_string': {'limit': 20}, 'headers': self.headers}
+
+    def livros_similares(self):
+        return ('GET /livros/<id>/similares', 'GET', f'/livros/{self._livro_proprio()}/similares',
+                {'headers': self.headers})
+
+    def recomendacoes(self):
+        return ('GET /usuarios/<id>/recomendacoes', 'GET', f'/usuarios/{self.id_usuario}/recomendacoes',
+                {'headers': self.headers})
+
+    def mudancas(self):
+        return ('GET /mudancas', 'GET', '/mudancas',
+                {'query_string': {'desde': self.cursor_mudancas, 'limit': 50}, 'headers': self.headers})
+
+    def consultar_tarefa(self):
+        return self.tarefa and ('GET /tarefas/<id>', 'GET', f'/tarefas/{self.tarefa}', {})
+
+    def lote(self):
+        # Página de um livro em uma ida e volta: listagem de avaliações e resumo
+        livro = self._livro()
+        return ('POST /lote', 'POST', '/lote',
+                {'json': {'requisicoes': [{'caminho': f'/livros/{livro}/avaliacoes'},
+                                          {'caminho': f'/livros/{livro}/resumo'}]},
+                 'headers': self.headers})
+
+    def login(self):
+        return ('POST /login', 'POST', '/login',
+                {'json': {'email': f'usuario{self.id_usuario}@carga.example', 'senha': SENHA}})
+
+    def criar_usuario(self):
+        unico = self._unico()
+        return ('POST /usuarios', 'POST', '/usuarios',
+                {'json': {'nome': f'Novo {unico}', 'email': f'novo{unico}@carga.example', 'senha': SENHA}})
+
+    def atualizar_usuario(self):
+        return ('PUT /usuarios/<id>', 'PUT', f'/usuarios/{self.id_usuario}',
+                {'json': {'nome': f'Usuário {self.id_usuario} ({self._unico()})'}})
+
+    def deletar_usuario(self):
+        alvo = self._reserva('usuario', self.base.usuario_reserva)
+        return alvo and ('DELETE /usuarios/<id>', 'DELETE', f'/usuarios/{alvo}', {})
+
+    def criar_clube(self):
+        return ('POST /clubes', 'POST', '/clubes',
+                {'json': {'nome': f'Clube novo {self._unico()}'}, 'headers': self.headers})
+
+    def atualizar_clube(self):
+        return ('PUT /clubes/<id>', 'PUT', f'/clubes/{self.id_usuario}',
+                {'json': {'descricao': f'Atualizado {self._unico()}'}, 'headers': self.headers})
+
+    def deletar_clube(self):
+        alvo = self._reserva('clube', self.base.clube_reserva)
+        return alvo and ('DELETE /clubes/<id>', 'DELETE', f'/clubes/{alvo}', {'headers': self.headers})
+
+    def criar_livro(self):
+        return ('POST /clubes/<id>/livros', 'POST', f'/clubes/{self.id_usuario}/livros',
+                {'json': {'titulo': f'Livro novo {self._unico()}', 'autor': 'Autor Carga'}, 'headers': self.headers})
+
+    def importar_livros(self):
+        unico = self._unico()
+        corpo = ''.join(json.dumps({'titulo': f'Importado {unico} {i}', 'autor': 'Autor Carga'}) + '\n'
+                        for i in range(100))
+        return ('POST /clubes/<id>/livros/lote', 'POST', f'/clubes/{self.id_usuario}/livros/lote',
+                {'data': corpo, 'content_type': 'application/x-ndjson', 'headers': self.headers})
+
+    def atualizar_livro(self):
+        return ('PUT /livros/<id>', 'PUT', f'/livros/{self._livro_proprio()}',
+                {'json': {'titulo': ' '.join(self.gerador.sample(PALAVRAS, 3))}, 'headers': self.headers})
+
+    def deletar_livro(self):
+        alvo = self._reserva('livro', self.base.livro_reserva)
+        return alvo and ('DELETE /livros/<id>', 'DELETE', f'/livros/{alvo}', {'headers': self.headers})
+
+    def criar_avaliacao(self):
+        return ('POST /livros/<id>/avaliacoes', 'POST', f'/livros/{self._livro()}/avaliacoes',
+                {'json': {'nota': self.gerador.randint(1, 5), 'comentario': 'Carga'}, 'headers': self.headers})
+
+    def atualizar_avaliacao(self):
+        alvo = self._avaliacao_propria()
+        return alvo and ('PUT /avaliacoes/<id>', 'PUT', f'/avaliacoes/{alvo}',
+                         {'json': {'nota': self.gerador.randint(1, 5)}, 'headers': self.headers})
+
+    def deletar_avaliacao(self):
+        alvo = self._avaliacao_propria(consumir=True)
+        return alvo and ('DELETE /avaliacoes/<id>', 'DELETE', f'/avaliacoes/{alvo}', {'headers': self.headers})
+
+    def exportar_clubes(self):
+        return ('GET /admin/exportar/clubes', 'GET', '/admin/exportar/clubes',
+                {'query_string': {'formato': 'ndjson'}, 'headers': self.headers})
+
+    def executar(self, operacao):
+        """Executa a operação e retorna (rota, status, segundos); None quando não há alvo disponível."""
+        requisicao = getattr(self, operacao)()
+        if not requisicao:
+            return None
+        rota, metodo, url, kwargs = requisicao
+        inicio = time.perf_counter()
+        response = self.cliente.open(url, method=metodo, **kwargs)
+        response.get_data()  # Inclui o envio do corpo (respostas em streaming) na latência
+        duracao = time.perf_counter() - inicio
+        # Alvos das operações seguintes: tarefa de exclusão agendada e cursor de sincronização
+        if response.status_code == 202:
+            self.tarefa = response.get_json()['tarefa']
+        elif rota == 'GET /mudancas' and response.status_code == 200:
+            self.cursor_mudancas = response.get_json()['cursor']
+        response.close()
+        return rota, response.status_code, duracao
+
+
+def percentil(valores_ordenados, p):
+    """Percentil pelo método do posto mais próximo."""
+    return valores_ordenados[max(0, math.ceil(p * len(valores_ordenados)) - 1)]
+
+
+def resumir(amostras, duracao):
+    rotas = {}
+    for rota, status, segundos in amostras:
+        rotas.setdefault(rota, []).append((status, segundos))
+    resultado = {}
+    for rota, medidas in sorted(rotas.items()):
+        latencias = sorted(segundos for _, segundos in medidas)
+        resultado[rota] = {
+            'requisicoes': len(medidas),
+            'erros': sum(1 for status, _ in medidas if status >= 500),
+            'status': {str(s): sum(1 for status, _ in medidas if status == s) for s in sorted({s for s, _ in medidas})},
+            'por_segundo': round(len(medidas) / duracao, 1),
+            'p50_ms': round(percentil(latencias, 0.50) * 1000, 2),
+            'p95_ms': round(percentil(latencias, 0.95) * 1000, 2),
+            'p99_ms': round(percentil(latencias, 0.99) * 1000, 2),
+        }
+    return resultado
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, anterior, tolerancia):
+    """Retorna as rotas cujo p95 piorou mais que ``tolerancia`` (fração) em relação à execução anterior."""
+    regressoes = []
+    for rota, medidas in atual['rotas'].items():
+        base = anterior['rotas'].get(rota)
+        if not base or not base['p95_ms']:
+            continue
+        razao = medidas['p95_ms'] / base['p95_ms']
+        if razao > 1 + tolerancia:
+            regressoes.append({'rota': rota, 'p95_ms_anterior': base['p95_ms'], 'p95_ms': medidas['p95_ms'],
+                               'razao': round(razao, 2)})
+    return regressoes
+
+
+def executar_carga(app, base, mistura, requisicoes, aquecimento, semente):
+    clientes = [Cliente(app, base, i, semente) for i in range(base.threads)]
+    operacoes = [op for op, peso in mistura.items() if peso > 0]
+    pesos = [mistura[op] for op in operacoes]
+    amostras = []
+    lock = threading.Lock()
+
+    def trabalhar(cliente, quantidade, registrar):
+        locais = []
+        for operacao in cliente.gerador.choices(operacoes, pesos, k=quantidade):
+            medida = cliente.executar(operacao)
+            if medida is None:
+                medida = cliente.executar('criar_livro')  # Reserva esgotada: mantém a carga com uma escrita
+            locais.append(medida)
+        if registrar:
+            with lock:
+                amostras.extend(locais)
+
+    por_thread = [requisicoes // base.threads + (1 if i < requisicoes % base.threads else 0)
+                  for i in range(base.threads)]
+    with ThreadPoolExecutor(max_workers=base.threads) as executor:
+        list(executor.map(lambda c: trabalhar(c, aquecimento // base.threads, False), clientes))
+        inicio = time.perf_counter()
+        list(executor.map(lambda par: trabalhar(par[0], par[1], True), zip(clientes, por_thread)))
+        duracao = time.perf_counter() - inicio
+    return amostras, duracao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--banco', help='URI SQLAlchemy de um banco vazio (padrão: SQLite temporário)')
+    parser.add_argument('--usuarios', type=int, default=1000)
+    parser.add_argument('--clubes', type=int, default=500)
+    parser.add_argument('--livros', type=int, default=20000)
+    parser.add_argument('--avaliacoes', type=int, default=1_000_000)
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--requisicoes', type=int, default=5000)
+    parser.add_argument('--aquecimento', type=int, default=200)
+    parser.add_argument('--reserva', type=int, default=200, help='Linhas descartáveis por thread para as exclusões')
+    parser.add_argument('--mistura', type=json.loads, default={},
+                        help='JSON com pesos que substituem os padrão, ex.: \'{"login": 0}\'')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='Arquivo onde gravar o resultado JSON')
+    parser.add_argument('--comparar', help='Resultado JSON anterior para comparação dos p95')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='Piora de p95 aceita na comparação (fração)')
+    args = parser.parse_args()
+
+    base = Base(args.usuarios, args.clubes, args.livros, args.avaliacoes, args.concorrencia, args.reserva)
+    mistura = {**MISTURA_PADRAO, **args.mistura}
+    with tempfile.TemporaryDirectory() as pasta:
+        uri = args.banco or f"sqlite:///{os.path.join(pasta, 'carga.db')}"
+        app = create_app({'SQLALCHEMY_DATABASE_URI': uri,
+                          'ADMIN_IDS': set(range(1, base.threads + 1)),
+                          'SENHA_HASH_FILA': max(64, base.threads * 2),
+                          # Todas as threads saem do mesmo IP: mantém os limites de concorrência, sem os de taxa
+                          'ADMISSAO_LIMITES': {grupo: dict(opcoes, taxa=0) for grupo, opcoes
+                                               in ler_limites(os.environ.get('ADMISSAO_LIMITES')).items()}})
+        with app.app_context():
+            db.create_all()
+            if db.session.query(Usuario.id).first() is not None:
+                sys.exit('O banco informado em --banco precisa estar vazio')
+            inicio = time.perf_counter()
+            popular(base, random.Random(args.semente))
+            carga = time.perf_counter() - inicio
+            dialeto = db.engine.dialect.name
+
+        amostras, duracao = executar_carga(app, base, mistura, args.requisicoes, args.aquecimento, args.semente)
+
+    resultado = {
+        'commit': _commit_atual(),
+        'python': platform.python_version(),
+        'banco': dialeto,
+        'parametros': {k: v for k, v in vars(args).items() if k not in ('banco', 'saida', 'comparar', 'tolerancia')},
+        'mistura': mistura,
+        'segundos_populando': round(carga, 1),
+        'segundos_medindo': round(duracao, 2),
+        'requisicoes_por_segundo': round(len(amostras) / duracao, 1),
+        'rotas': resumir(amostras, duracao),
+    }
+
+    codigo_saida = 0
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+        if anterior.get('parametros') != resultado['parametros']:
+            print('Aviso: parâmetros diferentes da execução comparada', file=sys.stderr)
+        resultado['comparado_com'] = anterior.get('commit')
+        resultado['regressoes'] = comparar(resultado, anterior, args.tolerancia)
+        codigo_saida = 1 if resultado['regressoes'] else 0
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    print(texto)
+    sys.exit(codigo_saida)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/clubes.py
+"""Compara GET /clubes?incluir=estatisticas com o cálculo por fan-out no cliente.
+
+O fan-out é o caminho sem o resumo por clube: para cada clube da página,
+GET /clubes/<id>/livros e, para cada livro, GET /livros/<id>/avaliacoes,
+somando as notas no cliente. As duas abordagens são medidas por página
+(?limit=) e contam as consultas SQL emitidas.
+
+Uso:
+    python -m benchmarks.clubes --clubes 10000 --livros-por-clube 5 --avaliacoes-por-livro 4 --paginas 20
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import insert
+
+from app.app import create_app
+from app.auditoria import capturar_consultas
+from app.database import db
+from app.models import Clube, Livro, Avaliacao
+from app.agregados import recalcular_estatisticas
+
+TAMANHO_LOTE = 10000
+EMAIL = 'bench@example.com'
+SENHA = 'senha_bench'
+
+
+def popular(clubes, livros_por_clube, avaliacoes_por_livro, gerador):
+    db.session.execute(insert(Clube), [{'nome': f'Clube {i}', 'id_usuario_criador': 1} for i in range(clubes)])
+    livros = clubes * livros_por_clube
+    for inicio in range(0, livros, TAMANHO_LOTE):
+        db.session.execute(insert(Livro), [{'titulo': f'Livro {i}', 'autor': 'Autor', 'id_clube': i % clubes + 1}
+                                           for i in range(inicio, min(livros, inicio + TAMANHO_LOTE))])
+    avaliacoes = livros * avaliacoes_por_livro
+    for inicio in range(0, avaliacoes, TAMANHO_LOTE):
+        db.session.execute(insert(Avaliacao), [{'nota': gerador.randint(1, 5), 'id_livro': i % livros + 1,
+                                                'id_usuario': 1}
+                                               for i in range(inicio, min(avaliacoes, inicio + TAMANHO_LOTE))])
+    db.session.commit()
+    recalcular_estatisticas()  # Carga direta no banco: constrói os resumos
+
+
+def pagina_resumo(cliente, depois, limite):
+    response = cliente.get('/clubes', query_string={'incluir': 'estatisticas', 'limit': limite, 'after': depois})
+    return [(item['id'], item['estatisticas']) for item in response.get_json()['itens']]
+
+
+def pagina_fan_out(cliente, headers, depois, limite):
+    itens = cliente.get('/clubes', query_string={'limit': limite, 'after': depois}).get_json()['itens']
+    resultado = []
+    for clube in itens:
+        livros = cliente.get(f"/clubes/{clube['id']}/livros", headers=headers).get_json()
+        notas = [avaliacao['nota'] for livro in livros
+                 for avaliacao in cliente.get(f"/livros/{livro['id']}/avaliacoes").get_json()]
+        resultado.append((clube['id'], {'total_livros': len(livros), 'total_avaliacoes': len(notas),
+                                        'media_avaliacoes': round(sum(notas) / len(notas), 2) if notas else 0}))
+    return resultado
+
+
+def medir(funcao, paginas, clubes, limite, gerador):
+    latencias = []
+    consultas = 0
+    resultados = {}
+    for _ in range(paginas):
+        depois = gerador.randint(0, max(0, clubes - limite))
+        with capturar_consultas() as capturadas:
+            inicio = time.perf_counter()
+            resultados[depois] = funcao(depois, limite)
+            latencias.append(time.perf_counter() - inicio)
+        consultas += len(capturadas)
+    latencias.sort()
+    return resultados, {
+        'p50_ms': round(latencias[len(latencias) // 2] * 1000, 2),
+        'max_ms': round(latencias[-1] * 1000, 2),
+        'consultas_por_pagina': round(consultas / paginas, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clubes', type=int, default=10000)
+    parser.add_argument('--livros-por-clube', type=int, default=5)
+    parser.add_argument('--avaliacoes-por-livro', type=int, default=4)
+    parser.add_argument('--limite', type=int, default=50)
+    parser.add_argument('--paginas', type=int, default=20)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+    gerador = random.Random(args.semente)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(pasta, 'clubes.db')}",
+                          'SENHA_HASH_PROCESSOS': 0, 'CACHE_RESPOSTAS_TIPO': 'nenhum', 'ADMISSAO_LIMITES': {}})
+        cliente = app.test_client()
+        with app.app_context():
+            db.create_all()
+        cliente.post('/usuarios', json={'nome': 'Bench', 'email': EMAIL, 'senha': SENHA})
+        token = cliente.post('/login', json={'email': EMAIL, 'senha': SENHA}).get_json()['token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        with app.app_context():
+            popular(args.clubes, args.livros_por_clube, args.avaliacoes_por_livro, gerador)
+            semente = gerador.random()
+            resumo, medida_resumo = medir(lambda depois, limite: pagina_resumo(cliente, depois, limite),
+                                          args.paginas, args.clubes, args.limite, random.Random(semente))
+            fan_out, medida_fan_out = medir(lambda depois, limite: pagina_fan_out(cliente, headers, depois, limite),
+                                            args.paginas, args.clubes, args.limite, random.Random(semente))
+
+    print(json.dumps({'clubes': args.clubes, 'limite': args.limite, 'resultados_iguais': resumo == fan_out,
+                      'incluir_estatisticas': medida_resumo, 'fan_out': medida_fan_out}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/login.py
+"""Mede a vazão de /login em função do tamanho do pool de processos de hash.
+
+Uso:
+    python -m benchmarks.login --processos 0 1 2 4 --concorrencia 16 --logins 200
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.app import create_app
+from app.database import db
+
+EMAIL = 'bench@example.com'
+SENHA = 'senha_bench'
+
+
+def medir(processos, concorrencia, logins, metodo):
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(pasta, 'bench.db')}",
+            'SENHA_HASH_PROCESSOS': processos,
+            'SENHA_HASH_METODO': metodo,
+            'SENHA_HASH_FILA': logins,
+            'ADMISSAO_LIMITES': {},  # Mede o hash em si, sem o controle de admissão de /login
+        })
+        with app.app_context():
+            db.create_all()
+            app.test_client().post('/usuarios', json={'nome': 'Bench', 'email': EMAIL, 'senha': SENHA})
+
+        def logar(_):
+            inicio = time.perf_counter()
+            response = app.test_client().post('/login', json={'email': EMAIL, 'senha': SENHA})
+            return response.status_code, time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            resultados = list(executor.map(logar, range(logins)))
+        duracao = time.perf_counter() - inicio
+
+    latencias = sorted(latencia for _, latencia in resultados)
+    return {
+        'processos': processos,
+        'concorrencia': concorrencia,
+        'logins': logins,
+        'falhas': sum(1 for status, _ in resultados if status != 200),
+        'logins_por_segundo': round(logins / duracao, 1),
+        'p50_ms': round(latencias[len(latencias) // 2] * 1000, 1),
+        'p99_ms': round(latencias[int(len(latencias) * 0.99) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processos', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--concorrencia', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--metodo', default='scrypt:32768:8:1')
+    args = parser.parse_args()
+
+    resultados = [medir(p, args.concorrencia, args.logins, args.metodo) for p in args.processos]
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
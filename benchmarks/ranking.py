@@ -0,0 +1,108 @@
+# benchmarks/ranking.py
+"""Mede GET /livros/ranking conforme o volume de avaliações cresce.
+
+A cada etapa o banco recebe mais avaliações e o ranking é consultado; a
+latência deve ficar estável, já que a rota só lê o índice de pontuação de
+resumos_livros. Para comparação, mede também uma vez por etapa a agregação
+direta (AVG agrupado sobre avaliacoes), que cresce com o volume.
+
+Uso:
+    python -m benchmarks.ranking --livros 20000 --etapas 100000,1000000,5000000 --consultas 300
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import insert, func
+
+from app.app import create_app
+from app.database import db
+from app.models import Usuario, Clube, Livro, Avaliacao
+from app.agregados import recalcular_resumos_livros
+
+TAMANHO_LOTE = 10000
+USUARIOS = 1000
+CLUBES = 50
+
+
+def popular_catalogo(livros):
+    db.session.execute(insert(Usuario), [{'nome': f'Leitor {i}', 'email': f'leitor{i}@example.com', 'senha_hash': '-'}
+                                         for i in range(USUARIOS)])
+    db.session.execute(insert(Clube), [{'nome': f'Clube {i}', 'id_usuario_criador': 1} for i in range(CLUBES)])
+    for inicio in range(0, livros, TAMANHO_LOTE):
+        db.session.execute(insert(Livro), [{'titulo': f'Livro {i}', 'autor': 'Autor', 'id_clube': i % CLUBES + 1}
+                                           for i in range(inicio, min(livros, inicio + TAMANHO_LOTE))])
+    db.session.commit()
+
+
+def adicionar_avaliacoes(quantidade, livros, gerador):
+    # Cada livro tem uma "qualidade" fixa para o ranking ter uma ordem estável
+    for inicio in range(0, quantidade, TAMANHO_LOTE):
+        lote = []
+        for _ in range(min(TAMANHO_LOTE, quantidade - inicio)):
+            id_livro = int(gerador.paretovariate(1.2)) % livros + 1  # Poucos livros concentram as avaliações
+            nota = min(5, max(1, round(gerador.gauss(1 + id_livro % 5, 1))))
+            lote.append({'nota': nota, 'id_livro': id_livro, 'id_usuario': gerador.randint(1, USUARIOS)})
+        db.session.execute(insert(Avaliacao), lote)
+        db.session.commit()
+
+
+def medir(cliente, consultas, gerador):
+    latencias = []
+    for _ in range(consultas):
+        parametros = {'limit': 20}
+        if gerador.random() < 0.5:
+            parametros['clube'] = gerador.randint(1, CLUBES)
+        inicio = time.perf_counter()
+        response = cliente.get('/livros/ranking', query_string=parametros)
+        latencias.append(time.perf_counter() - inicio)
+        assert response.status_code == 200, response.get_json()
+    latencias.sort()
+    return {
+        'p50_ms': round(latencias[len(latencias) // 2] * 1000, 2),
+        'p95_ms': round(latencias[int(len(latencias) * 0.95) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--livros', type=int, default=20000)
+    parser.add_argument('--etapas', default='100000,1000000',
+                        help='Total acumulado de avaliações em cada etapa, separado por vírgula.')
+    parser.add_argument('--consultas', type=int, default=300)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+    gerador = random.Random(args.semente)
+    etapas = [int(etapa) for etapa in args.etapas.split(',')]
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(pasta, 'ranking.db')}",
+                          'SENHA_HASH_PROCESSOS': 0, 'CACHE_RESPOSTAS_TIPO': 'nenhum'})
+        with app.app_context():
+            db.create_all()
+            popular_catalogo(args.livros)
+            cliente = app.test_client()
+            total = 0
+            for etapa in etapas:
+                adicionar_avaliacoes(etapa - total, args.livros, gerador)
+                total = etapa
+                # Carga direta no banco: os resumos (e as pontuações) são reconstruídos uma vez por etapa
+                recalcular_resumos_livros()
+
+                inicio = time.perf_counter()
+                db.session.query(Avaliacao.id_livro, func.avg(Avaliacao.nota)).group_by(Avaliacao.id_livro) \
+                    .order_by(func.avg(Avaliacao.nota).desc()).limit(20).all()
+                agregacao = time.perf_counter() - inicio
+
+                resultados.append({'avaliacoes': total, 'ranking': medir(cliente, args.consultas, gerador),
+                                   'agregacao_direta_ms': round(agregacao * 1000, 2)})
+
+    print(json.dumps({'livros': args.livros, 'consultas': args.consultas, 'etapas': resultados}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 # create_tables.py
 
+from flask_migrate import stamp
 from app.app import create_app, db
 from app.models import Usuario, Clube, Livro, Avaliacao
 
@@ -9,4 +10,6 @@ app = create_app()
 with app.app_context():
     #db.drop_all()  Remove as tabelas existentes (cuidado com perda de dados)
     db.create_all()  # Cria as tabelas novamente com as novas configurações
+    # O banco já nasce no esquema da última revisão: `flask db upgrade` não deve reaplicá-las
+    stamp(revision='head')
     print("Tabelas recriadas com sucesso!")
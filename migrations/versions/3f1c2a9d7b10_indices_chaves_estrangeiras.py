@@ -0,0 +1,45 @@
+"""Índices nas chaves estrangeiras de clubes, livros e avaliações
+
+Bancos criados pelo create_tables.py antes desta revisão não possuem esses
+índices nem as tabelas das revisões seguintes: rode `flask db upgrade`.
+Bancos novos criados pelo create_tables.py já nascem no esquema completo e
+são marcados na última revisão.
+
+Revision ID: 3f1c2a9d7b10
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('clubes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_clubes_id_usuario_criador'), ['id_usuario_criador'], unique=False)
+
+    with op.batch_alter_table('livros', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_livros_id_clube'), ['id_clube'], unique=False)
+
+    with op.batch_alter_table('avaliacoes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_avaliacoes_id_livro'), ['id_livro'], unique=False)
+        batch_op.create_index('ix_avaliacoes_usuario_livro', ['id_usuario', 'id_livro'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('avaliacoes', schema=None) as batch_op:
+        batch_op.drop_index('ix_avaliacoes_usuario_livro')
+        batch_op.drop_index(batch_op.f('ix_avaliacoes_id_livro'))
+
+    with op.batch_alter_table('livros', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_livros_id_clube'))
+
+    with op.batch_alter_table('clubes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_clubes_id_usuario_criador'))
@@ -0,0 +1,32 @@
+"""Tabela de agregados de /estatisticas
+
+Revision ID: 5e1a9c3f7b22
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1a9c3f7b22'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A linha única (id = 1) é criada com a contagem das tabelas na primeira leitura ou escrita
+    op.create_table('estatisticas',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('total_livros', sa.Integer(), nullable=False),
+                    sa.Column('total_clubes', sa.Integer(), nullable=False),
+                    sa.Column('soma_notas', sa.BigInteger(), nullable=False),
+                    sa.Column('total_avaliacoes', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+
+
+def downgrade():
+    op.drop_table('estatisticas')
@@ -0,0 +1,48 @@
+"""Resumo das avaliações por livro (contagem, soma e histograma)
+
+Revision ID: 6c2b8d4e9a31
+Revises: 5e1a9c3f7b22
+Create Date: 2026-10-18 10:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2b8d4e9a31'
+down_revision = '5e1a9c3f7b22'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resumos_livros',
+                    sa.Column('id_livro', sa.Integer(), nullable=False),
+                    sa.Column('total', sa.Integer(), nullable=False),
+                    sa.Column('soma', sa.Integer(), nullable=False),
+                    sa.Column('nota_1', sa.Integer(), nullable=False),
+                    sa.Column('nota_2', sa.Integer(), nullable=False),
+                    sa.Column('nota_3', sa.Integer(), nullable=False),
+                    sa.Column('nota_4', sa.Integer(), nullable=False),
+                    sa.Column('nota_5', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['id_livro'], ['livros.id'], ),
+                    sa.PrimaryKeyConstraint('id_livro')
+                    )
+
+    # Preenche a partir das avaliações existentes; `flask estatisticas recalcular` refaz a contagem se preciso
+    op.execute("""
+        INSERT INTO resumos_livros (id_livro, total, soma, nota_1, nota_2, nota_3, nota_4, nota_5)
+        SELECT livros.id, COUNT(avaliacoes.id), COALESCE(SUM(avaliacoes.nota), 0),
+               COALESCE(SUM(CASE WHEN avaliacoes.nota = 1 THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN avaliacoes.nota = 2 THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN avaliacoes.nota = 3 THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN avaliacoes.nota = 4 THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN avaliacoes.nota = 5 THEN 1 ELSE 0 END), 0)
+        FROM livros LEFT JOIN avaliacoes ON avaliacoes.id_livro = livros.id
+        GROUP BY livros.id
+    """)
+
+
+def downgrade():
+    op.drop_table('resumos_livros')
@@ -0,0 +1,36 @@
+"""Índice de busca textual de livros (livros_busca)
+
+A tabela não é um modelo: no SQLite é uma tabela virtual FTS5 e no MySQL
+uma tabela com índice FULLTEXT, criadas aqui por DDL própria. Ela nasce
+vazia; depois do upgrade rode `flask busca reindexar`.
+
+Revision ID: 7d3c9e5f0b42
+Revises: 6c2b8d4e9a31
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3c9e5f0b42'
+down_revision = '6c2b8d4e9a31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialeto = op.get_bind().dialect.name
+    if dialeto == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE livros_busca USING fts5("
+                   "titulo, autor, tokenize = 'unicode61 remove_diacritics 2')")
+    elif dialeto == 'mysql':
+        op.execute("CREATE TABLE livros_busca ("
+                   "id_livro INTEGER PRIMARY KEY, titulo VARCHAR(100) NOT NULL, autor VARCHAR(100) NOT NULL, "
+                   "FULLTEXT INDEX ix_livros_busca_texto (titulo, autor)) ENGINE=InnoDB")
+    # Outros bancos não têm busca textual: GET /livros/busca responde erro
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS livros_busca")
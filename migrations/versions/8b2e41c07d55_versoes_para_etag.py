@@ -0,0 +1,44 @@
+"""Versões e data de alteração de clubes, livros e da lista de clubes (ETag)
+
+Revision ID: 8b2e41c07d55
+Revises: 7d3c9e5f0b42
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e41c07d55'
+down_revision = '7d3c9e5f0b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('clubes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('versao', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('atualizado_em', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('livros', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('versao', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('atualizado_em', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('estatisticas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('versao_clubes', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('clubes_atualizado_em', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('estatisticas', schema=None) as batch_op:
+        batch_op.drop_column('clubes_atualizado_em')
+        batch_op.drop_column('versao_clubes')
+
+    with op.batch_alter_table('livros', schema=None) as batch_op:
+        batch_op.drop_column('atualizado_em')
+        batch_op.drop_column('versao')
+
+    with op.batch_alter_table('clubes', schema=None) as batch_op:
+        batch_op.drop_column('atualizado_em')
+        batch_op.drop_column('versao')
@@ -0,0 +1,46 @@
+"""Log de mudanças para sincronização incremental (GET /mudancas)
+
+Revision ID: a9d4e6f2b7c3
+Revises: f5c1a7e3b920
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d4e6f2b7c3'
+down_revision = 'f5c1a7e3b920'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('mudancas',
+                    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('entidade', sa.String(length=20), nullable=False),
+                    sa.Column('id_entidade', sa.Integer(), nullable=False),
+                    sa.Column('operacao', sa.String(length=10), nullable=False),
+                    sa.Column('id_usuario', sa.Integer(), nullable=True),
+                    sa.Column('criado_em', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('ix_mudancas_entidade', 'mudancas', ['entidade', 'id_entidade', 'id'], unique=False)
+    op.create_index('ix_mudancas_operacao', 'mudancas', ['operacao', 'criado_em'], unique=False)
+
+    # O log começa vazio: os clientes fazem a carga inicial pelas listagens e sincronizam a partir do cursor 0
+    with op.batch_alter_table('estatisticas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ultima_mudanca', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('mudancas_compactadas_ate', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('mudancas_expurgadas_ate', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('estatisticas', schema=None) as batch_op:
+        batch_op.drop_column('mudancas_expurgadas_ate')
+        batch_op.drop_column('mudancas_compactadas_ate')
+        batch_op.drop_column('ultima_mudanca')
+    op.drop_index('ix_mudancas_operacao', table_name='mudancas')
+    op.drop_index('ix_mudancas_entidade', table_name='mudancas')
+    op.drop_table('mudancas')
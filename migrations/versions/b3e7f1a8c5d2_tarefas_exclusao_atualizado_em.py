@@ -0,0 +1,26 @@
+"""Última atividade das tarefas de exclusão (tarefas_exclusao.atualizado_em)
+
+Revision ID: b3e7f1a8c5d2
+Revises: a9d4e6f2b7c3
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e7f1a8c5d2'
+down_revision = 'a9d4e6f2b7c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tarefas_exclusao', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('atualizado_em', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('tarefas_exclusao', schema=None) as batch_op:
+        batch_op.drop_column('atualizado_em')
@@ -0,0 +1,42 @@
+"""Tabela livros_similares e marcador da última execução das recomendações
+
+Revision ID: c4d9e2a61f03
+Revises: 8b2e41c07d55
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d9e2a61f03'
+down_revision = '8b2e41c07d55'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('livros_similares',
+                    sa.Column('id_livro', sa.Integer(), nullable=False),
+                    sa.Column('posicao', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('id_similar', sa.Integer(), nullable=False),
+                    sa.Column('similaridade', sa.Float(), nullable=False),
+                    sa.ForeignKeyConstraint(['id_livro'], ['livros.id'], ),
+                    sa.ForeignKeyConstraint(['id_similar'], ['livros.id'], ),
+                    sa.PrimaryKeyConstraint('id_livro', 'posicao'))
+    with op.batch_alter_table('livros_similares', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_livros_similares_id_similar'), ['id_similar'], unique=False)
+
+    with op.batch_alter_table('estatisticas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('similares_calculado_em', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('estatisticas', schema=None) as batch_op:
+        batch_op.drop_column('similares_calculado_em')
+
+    with op.batch_alter_table('livros_similares', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_livros_similares_id_similar'))
+
+    op.drop_table('livros_similares')
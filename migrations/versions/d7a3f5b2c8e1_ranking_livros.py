@@ -0,0 +1,39 @@
+"""Pontuação bayesiana e clube nos resumos dos livros (ranking)
+
+Revision ID: d7a3f5b2c8e1
+Revises: c4d9e2a61f03
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3f5b2c8e1'
+down_revision = 'c4d9e2a61f03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('resumos_livros', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('id_clube', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('pontuacao', sa.Double(), nullable=True))
+        batch_op.create_index('ix_resumos_livros_ranking', ['pontuacao', 'id_livro'], unique=False)
+        batch_op.create_index('ix_resumos_livros_clube_ranking', ['id_clube', 'pontuacao', 'id_livro'], unique=False)
+
+    # Preenche com a priori padrão (média 3, peso 10); com outra configuração rode `flask ranking reconstruir`
+    op.execute("""
+        UPDATE resumos_livros
+        SET id_clube = (SELECT livros.id_clube FROM livros WHERE livros.id = resumos_livros.id_livro),
+            pontuacao = CASE WHEN total > 0 THEN (soma + 30.0) / (total + 10.0) END
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('resumos_livros', schema=None) as batch_op:
+        batch_op.drop_index('ix_resumos_livros_clube_ranking')
+        batch_op.drop_index('ix_resumos_livros_ranking')
+        batch_op.drop_column('pontuacao')
+        batch_op.drop_column('id_clube')
@@ -0,0 +1,57 @@
+"""Exclusão de clubes e usuários em segundo plano (excluido_em e tarefas_exclusao)
+
+Revision ID: e2b8c6d4a9f7
+Revises: d7a3f5b2c8e1
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8c6d4a9f7'
+down_revision = 'd7a3f5b2c8e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('excluido_em', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_usuarios_visiveis', ['excluido_em', 'id'], unique=False)
+
+    with op.batch_alter_table('clubes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('excluido_em', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_clubes_visiveis', ['excluido_em', 'id'], unique=False)
+
+    op.create_table('tarefas_exclusao',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('entidade', sa.String(length=20), nullable=False),
+        sa.Column('id_alvo', sa.Integer(), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('avaliacoes_removidas', sa.Integer(), nullable=False),
+        sa.Column('livros_removidos', sa.Integer(), nullable=False),
+        sa.Column('clubes_removidos', sa.Integer(), nullable=False),
+        sa.Column('erro', sa.String(length=255), nullable=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=False),
+        sa.Column('concluido_em', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('tarefas_exclusao', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_tarefas_exclusao_estado'), ['estado'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tarefas_exclusao', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_tarefas_exclusao_estado'))
+
+    op.drop_table('tarefas_exclusao')
+
+    with op.batch_alter_table('clubes', schema=None) as batch_op:
+        batch_op.drop_index('ix_clubes_visiveis')
+        batch_op.drop_column('excluido_em')
+
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.drop_index('ix_usuarios_visiveis')
+        batch_op.drop_column('excluido_em')
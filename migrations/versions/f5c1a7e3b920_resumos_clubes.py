@@ -0,0 +1,43 @@
+"""Resumo por clube (livros, avaliações e soma das notas)
+
+Revision ID: f5c1a7e3b920
+Revises: e2b8c6d4a9f7
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c1a7e3b920'
+down_revision = 'e2b8c6d4a9f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resumos_clubes',
+                    sa.Column('id_clube', sa.Integer(), nullable=False),
+                    sa.Column('total_livros', sa.Integer(), nullable=False),
+                    sa.Column('total_avaliacoes', sa.Integer(), nullable=False),
+                    sa.Column('soma_notas', sa.BigInteger(), nullable=False),
+                    sa.ForeignKeyConstraint(['id_clube'], ['clubes.id'], ),
+                    sa.PrimaryKeyConstraint('id_clube')
+                    )
+
+    # Preenche a partir das tabelas; `flask estatisticas recalcular` refaz a contagem se preciso
+    op.execute("""
+        INSERT INTO resumos_clubes (id_clube, total_livros, total_avaliacoes, soma_notas)
+        SELECT clubes.id,
+               (SELECT COUNT(*) FROM livros WHERE livros.id_clube = clubes.id),
+               (SELECT COUNT(*) FROM avaliacoes JOIN livros ON livros.id = avaliacoes.id_livro
+                WHERE livros.id_clube = clubes.id),
+               (SELECT COALESCE(SUM(avaliacoes.nota), 0) FROM avaliacoes JOIN livros ON livros.id = avaliacoes.id_livro
+                WHERE livros.id_clube = clubes.id)
+        FROM clubes
+    """)
+
+
+def downgrade():
+    op.drop_table('resumos_clubes')
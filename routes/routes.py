@@ -1,12 +1,35 @@
 # routes/routes.py
+import logging
+import os
+import tempfile
+import time
 from functools import wraps
 import jwt
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
-from flask import Blueprint, request, jsonify, current_app
-from sqlalchemy import func
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from app.app import logger
-from app.models import Usuario, Clube, Livro, Avaliacao  # Importa os modelos Usuario e Clube
+from app.registro import LOGGER_ACESSO, estatisticas_log
+from app.models import Usuario, Clube, Livro, Avaliacao, ResumoLivro, ResumoClube, LivroSimilar, TarefaExclusao  # Importa os modelos
 from app.database import db  # Importa o objeto db
+from app.paginacao import listar, LIMITE_PADRAO, LIMITE_MAXIMO  # Paginação por cursor e streaming das listagens
+from app.serializacao import Representacao, responder, campos_solicitados, CamposInvalidos, para_json
+from app.agregados import obter_estatisticas as obter_agregados, ajustar_estatisticas
+from app.agregados import obter_resumo_livro, ajustar_resumo_livro, ajustar_resumo_clube
+from app.cache_principal import Principal
+from app.senhas import FilaSenhasCheia
+from app.importacao import ler_registros, importar_livros, FormatoInvalido
+from app.exportacao import Exportacao, ErroExportacao, FORMATOS as FORMATOS_EXPORTACAO
+from app.busca import indice_busca, ErroBusca
+from app.versoes import marcar_alteracao, marcar_alteracao_livros, responder_condicional
+from app.cache_respostas import cache_resposta, invalidar_apos_commit
+from app.recomendacoes import NOTA_MINIMA_RECOMENDACAO
+from app.gravacao_agrupada import gravacao_agrupada
+from app.filtro_emails import filtro_emails
+from app.exclusao import visivel, livro_visivel, agendar_exclusao, executar as executar_exclusao
+from app.lote import ler_lote, executar_lote, principal_do_lote, LoteInvalido
+from app.ranking import consultar_ranking, codificar_cursor, decodificar_cursor, CursorInvalido
+from app.mudancas import registrar_mudanca, consultar as consultar_mudancas, cursor_atual, log_mudancas, CursorExpirado
 
 # Blueprint para as rotas de usuários
 usuarios_bp = Blueprint('usuarios', __name__)
@@ -15,15 +38,68 @@ livros_bp = Blueprint('Livros', __name__)
 avaliacoes_bp = Blueprint('avaliacoes', __name__)
 stats_bp = Blueprint('stats', __name__)
 estatisticas_bp = Blueprint('estatisticas', __name__)
+admin_bp = Blueprint('admin', __name__)
+metricas_bp = Blueprint('metricas', __name__)
+lote_bp = Blueprint('lote', __name__)
+tarefas_bp = Blueprint('tarefas', __name__)
+mudancas_bp = Blueprint('mudancas', __name__)
+
+# Mensagens emitidas a cada requisição autenticada; amostradas conforme LOG_AMOSTRAGEM
+logger_acesso = logging.getLogger(LOGGER_ACESSO)
 
 def gerador_token(user_id):
     # gera um token valido por 1 hora
 
     payload = {'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)}  # expiração de uma hora para o token
     token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
-    logger.info(f'Token gerado para user_id: {user_id}')
+    logger_acesso.info(f'Token gerado para user_id: {user_id}')
     return token
 
+
+# Representações usadas pelas listagens: cada campo é uma coluna, consultada só quando pedida (?fields=)
+USUARIO = Representacao({'id': Usuario.id, 'nome': Usuario.nome, 'email': Usuario.email})
+CLUBE = Representacao({'id': Clube.id, 'nome': Clube.nome, 'descricao': Clube.descricao})
+LIVRO = Representacao({'id': Livro.id, 'titulo': Livro.titulo, 'autor': Livro.autor})
+AVALIACAO = Representacao({'id': Avaliacao.id, 'comentario': Avaliacao.comentario, 'nota': Avaliacao.nota,
+                           'id_usuario': Avaliacao.id_usuario})
+LIVRO_BUSCA = Representacao({**LIVRO.campos, 'id_clube': Livro.id_clube})
+
+
+def _resumo(total, soma, histograma):
+    media = round(soma / total, 2) if total else 0
+    return {'total': total, 'soma': soma, 'media': media, 'histograma': histograma}
+
+
+def serializar_resumo(resumo):
+    return _resumo(resumo.total, resumo.soma, resumo.histograma())
+
+
+# Livros criados antes dos resumos aparecem zerados até o `flask estatisticas recalcular`
+RESUMO_VAZIO = {'total': 0, 'soma': 0, 'media': 0, 'histograma': {str(n): 0 for n in range(1, 6)}}
+
+
+def montar_resumo(total, soma, *notas):
+    # Colunas do LEFT JOIN com resumos_livros: tudo None quando o livro não tem resumo
+    if total is None:
+        return RESUMO_VAZIO
+    return _resumo(total, soma, {str(n): quantidade for n, quantidade in enumerate(notas, start=1)})
+
+
+LIVRO_COM_RESUMO = Representacao(LIVRO.campos, {'resumo': (
+    [ResumoLivro.total, ResumoLivro.soma, *(getattr(ResumoLivro, f'nota_{n}') for n in range(1, 6))],
+    montar_resumo)})
+
+
+def montar_estatisticas_clube(total_livros, total_avaliacoes, soma_notas):
+    # Colunas do LEFT JOIN com resumos_clubes: tudo None quando o clube não tem resumo
+    total_avaliacoes = total_avaliacoes or 0
+    return {'total_livros': total_livros or 0, 'total_avaliacoes': total_avaliacoes,
+            'media_avaliacoes': round(soma_notas / total_avaliacoes, 2) if total_avaliacoes else 0}
+
+
+CLUBE_COM_ESTATISTICAS = Representacao(CLUBE.campos, {'estatisticas': (
+    [ResumoClube.total_livros, ResumoClube.total_avaliacoes, ResumoClube.soma_notas], montar_estatisticas_clube)})
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """Rota de login para autenticar o usuário e fornecer um token JWT."""
@@ -32,8 +108,19 @@ def login():
     senha = data.get('senha')
 
     # Verifica se o usuário existe e se a senha está correta
-    usuario = Usuario.query.filter_by(email=email).first()
-    if usuario and usuario.check_password(senha):
+    usuario = Usuario.query.filter_by(email=email, excluido_em=None).first()
+    try:
+        senha_valida = usuario is not None and usuario.check_password(senha)
+        if senha_valida and usuario.precisa_rehash():
+            # Hash gerado com parâmetros antigos: regrava com a política atual
+            usuario.set_password(senha)
+            db.session.commit()
+            logger.info(f'Hash de senha atualizado para user_id: {usuario.id}')
+    except FilaSenhasCheia as e:
+        logger.warning(f'Login recusado: {e}')
+        return jsonify({'message': 'Servidor ocupado, tente novamente'}), 503, {'Retry-After': '1'}
+
+    if senha_valida:
         # Gera um token JWT
         token = gerador_token(usuario.id)
         logger.info(f'Usuário {usuario.email} autenticado com sucesso.')
@@ -47,24 +134,50 @@ def login():
 # verificar se o token é valido
 
 
+def cache_principais():
+    return current_app.extensions['cache_principais']
+
+
+def carregar_principal(token):
+    """Valida o token e retorna o Principal, consultando o banco apenas quando não está em cache."""
+    cache = cache_principais()
+    principal = cache.obter(token)
+    if principal is not None:
+        return principal
+
+    payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+    usuario = db.session.query(Usuario.id, Usuario.nome, Usuario.email) \
+        .filter_by(id=payload['user_id'], excluido_em=None).first()
+    if usuario is None:
+        raise jwt.InvalidTokenError('Usuário do token não existe')
+
+    principal = Principal(*usuario)
+    cache.guardar(token, principal, payload['exp'])
+    return principal
+
+
 def requisicao_token(f):
     @wraps(f)  # Isso preserva o nome e a docstring originais da função
     def decorated(*args, **kwargs):
+        principal = principal_do_lote()
+        if principal is not None:
+            # Sub-requisição de POST /lote: o token já foi verificado pelo lote
+            return f(principal, *args, **kwargs)
+
         token = request.headers.get('Authorization')
         if not token:
-            logger.warning('Tentativa de acesso sem token de autenticação.')
+            logger_acesso.warning('Tentativa de acesso sem token de autenticação.')
             return jsonify({'message': 'Token é necessário'}), 401
 
         try:
             token = token.split(" ")[1]  # Token está no formato "Bearer <token>"
-            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = Usuario.query.get(payload['user_id'])
-            logger.info(f'Acesso autorizado para user_id: {current_user.id}')
+            current_user = carregar_principal(token)
+            logger_acesso.info(f'Acesso autorizado para user_id: {current_user.id}')
         except jwt.ExpiredSignatureError:
-            logger.warning('Token expirado')
+            logger_acesso.warning('Token expirado')
             return jsonify({'message': 'Token expirado'}), 401
         except jwt.InvalidTokenError:
-            logger.error('Token inválido')
+            logger_acesso.error('Token inválido')
             return jsonify({'message': 'Token inválido'}), 401
 
         return f(current_user, *args, **kwargs)
@@ -84,14 +197,33 @@ def create_usuario():
         logger.warning('Tentativa de criação de usuário com dados incompletos.')
         return jsonify({'message': 'Dados incompletos'}), 400
 
+    # Email repetido é recusado antes do hash da senha, a parte cara do cadastro
+    if filtro_emails().existe(email):
+        logger.warning('Criação de usuário recusada: email já cadastrado')
+        return jsonify({'message': 'Email já cadastrado'}), 409
+    db.session.commit()  # Encerra a leitura e devolve a conexão ao pool durante o hash
+
     usuario = Usuario(nome=nome, email=email)
-    usuario.set_password(senha)
+    try:
+        usuario.set_password(senha)
+    except FilaSenhasCheia as e:
+        logger.warning(f'Criação de usuário recusada: {e}')
+        return jsonify({'message': 'Servidor ocupado, tente novamente'}), 503, {'Retry-After': '1'}
 
     try:
         db.session.add(usuario)
+        db.session.flush()
+        registrar_mudanca('usuario', usuario.id, 'criado')
         db.session.commit()
+        filtro_emails().adicionar(email)
         logger.info(f'Usuário criado com sucesso: {nome} (ID: {usuario.id})')
         return jsonify({'message': 'Usuário criado com sucesso!'}), 201
+    except IntegrityError:
+        # Cadastrado por outro processo (ou requisição concorrente) depois da verificação
+        db.session.rollback()
+        filtro_emails().adicionar(email)
+        logger.warning('Criação de usuário recusada: email já cadastrado')
+        return jsonify({'message': 'Email já cadastrado'}), 409
     except Exception as e:
         db.session.rollback()
         logger.error(f'Erro ao criar usuário: {e}')
@@ -100,31 +232,50 @@ def create_usuario():
 
 @usuarios_bp.route('/usuarios', methods=['GET'])
 def get_usuarios():
-    """Rota para listar todos os usuários."""
-    usuarios = Usuario.query.all()
-    return jsonify([{'id': u.id, 'nome': u.nome, 'email': u.email} for u in usuarios])
+    """Rota para listar os usuários (aceita ?after=&limit=, ?stream=json|ndjson e ?fields=)."""
+    return listar(Usuario.query.filter(Usuario.excluido_em.is_(None)), Usuario.id, USUARIO)
 
 
 @usuarios_bp.route('/usuarios/<int:id>', methods=['PUT'])
 def update_usuario(id):
     """Rota para atualizar um usuário existente."""
     data = request.get_json()
-    usuario = Usuario.query.get(id)
+    usuario = visivel(Usuario, id)
 
     if not usuario:
         logger.warning(f'Tentativa de atualização de usuário não encontrado: ID {id}')
         return jsonify({'message': 'Usuário não encontrado'}), 404
 
+    email_anterior = usuario.email
+    email = data.get('email', email_anterior)
+    if email and email != email_anterior and filtro_emails().existe(email):
+        logger.warning(f'Atualização de usuário recusada: email já cadastrado (ID {id})')
+        return jsonify({'message': 'Email já cadastrado'}), 409
+
     usuario.nome = data.get('nome', usuario.nome)
-    usuario.email = data.get('email', usuario.email)
+    usuario.email = email
     senha = data.get('senha')
     if senha:
-        usuario.set_password(senha)
+        try:
+            usuario.set_password(senha)
+        except FilaSenhasCheia as e:
+            db.session.rollback()
+            logger.warning(f'Atualização de usuário recusada: {e}')
+            return jsonify({'message': 'Servidor ocupado, tente novamente'}), 503, {'Retry-After': '1'}
 
     try:
+        registrar_mudanca('usuario', id, 'atualizado')
         db.session.commit()
+        cache_principais().invalidar_usuario(id)
+        if email != email_anterior:
+            filtro_emails().remover(email_anterior)
+            filtro_emails().adicionar(email)
         logger.info(f'Usuário atualizado com sucesso: {usuario.nome} (ID: {usuario.id})')
         return jsonify({'message': 'Usuário atualizado com sucesso!'}), 200
+    except IntegrityError:
+        db.session.rollback()
+        logger.warning(f'Atualização de usuário recusada: email já cadastrado (ID {id})')
+        return jsonify({'message': 'Email já cadastrado'}), 409
     except Exception as e:
         db.session.rollback()
         logger.error(f'Erro ao atualizar usuário: {e}')
@@ -133,18 +284,25 @@ def update_usuario(id):
 
 @usuarios_bp.route('/usuarios/<int:id>', methods=['DELETE'])
 def delete_usuario(id):
-    """Rota para deletar um usuário."""
-    usuario = Usuario.query.get(id)
+    """Rota para deletar um usuário.
+
+    O usuário e os clubes dele somem das leituras na hora; as linhas
+    dependentes são removidas em segundo plano (GET /tarefas/<id>).
+    """
+    usuario = visivel(Usuario, id)
 
     if not usuario:
         logger.warning(f'Tentativa de deleção de usuário não encontrado: ID {id}')
         return jsonify({'message': 'Usuário não encontrado'}), 404
 
     try:
-        db.session.delete(usuario)
+        tarefa = agendar_exclusao('usuario', usuario)
         db.session.commit()
-        logger.info(f'Usuário deletado com sucesso: {usuario.nome} (ID: {usuario.id})')
-        return jsonify({'message': 'Usuário deletado com sucesso!'}), 200
+        cache_principais().invalidar_usuario(id)
+        logger.info(f'Exclusão de usuário agendada: {usuario.nome} (ID: {usuario.id}, tarefa {tarefa.id})')
+        executar_exclusao(tarefa.id)
+        return jsonify({'message': 'Exclusão do usuário agendada', 'tarefa': tarefa.id}), 202, \
+            {'Location': f'/tarefas/{tarefa.id}'}
     except Exception as e:
         db.session.rollback()
         logger.error(f'Erro ao deletar usuário: {e}')
@@ -168,9 +326,14 @@ def create_clube(current_user):
         return jsonify({'message': 'Dados incompletos'}), 400
 
     clube = Clube(nome=nome, descricao=descricao, id_usuario_criador=current_user.id) #id_usuario_criador
+    clube.resumo = ResumoClube()  # Resumo zerado, mantido pelas rotas de livros e avaliações
 
     try:
         db.session.add(clube)
+        db.session.flush()
+        ajustar_estatisticas(total_clubes=1, versao_clubes=1)
+        registrar_mudanca('clube', clube.id, 'criado')
+        invalidar_apos_commit('clubes', 'estatisticas')
         db.session.commit()
         return jsonify({'message': 'Clube criado com sucesso!'}), 201
     except Exception as e:
@@ -178,27 +341,46 @@ def create_clube(current_user):
         return jsonify({'message': str(e)}), 500
 
 
+def _incluir_estatisticas_clubes():
+    return request.args.get('incluir') == 'estatisticas'
+
+
 @clubes_bp.route('/clubes', methods=['GET'])
+@cache_resposta(lambda: ['clubes', 'estatisticas'] if _incluir_estatisticas_clubes() else ['clubes'])
 def get_clubes():
-    """Rota para listar todos os clubes."""
-    clubes = Clube.query.all()
-    return jsonify([{'id': c.id, 'nome': c.nome, 'descricao': c.descricao} for c in clubes])
+    """Rota para listar os clubes (aceita ?after=&limit=, ?stream=json|ndjson, ?incluir=estatisticas e ?fields=)."""
+    consulta = Clube.query.filter(Clube.excluido_em.is_(None))
+    if _incluir_estatisticas_clubes():
+        # Os agregados vêm no mesmo SELECT (JOIN com resumos_clubes), sem consultar livros e avaliações.
+        # Eles mudam com escritas que não alteram a versão da lista de clubes, então aqui não há ETag
+        consulta = consulta.outerjoin(ResumoClube, ResumoClube.id_clube == Clube.id)
+        return listar(consulta, Clube.id, CLUBE_COM_ESTATISTICAS)
+
+    agregados = obter_agregados()
+    return responder_condicional(f'clubes-v{agregados.versao_clubes}', agregados.clubes_atualizado_em,
+                                 lambda: listar(consulta, Clube.id, CLUBE))
 
 
 @clubes_bp.route('/clubes/<int:id>', methods=['PUT'])
 @requisicao_token
-def update_clube(id):
+def update_clube(current_user, id):
     """Rota para atualizar um clube existente."""
     data = request.get_json()
-    clube = Clube.query.get(id)
+    clube = visivel(Clube, id)
 
     if not clube:
         return jsonify({'message': 'Clube não encontrado'}), 404
 
+    if clube.id_usuario_criador != current_user.id:
+        return jsonify({'message': 'Acesso negado'}), 403
+
     clube.nome = data.get('nome', clube.nome)
     clube.descricao = data.get('descricao', clube.descricao)
 
     try:
+        ajustar_estatisticas(versao_clubes=1)
+        registrar_mudanca('clube', id, 'atualizado')
+        invalidar_apos_commit('clubes')
         db.session.commit()
         return jsonify({'message': 'Clube atualizado com sucesso!'}), 200
     except Exception as e:
@@ -208,17 +390,26 @@ def update_clube(id):
 
 @clubes_bp.route('/clubes/<int:id>', methods=['DELETE'])
 @requisicao_token
-def delete_clube(id):
-    """Rota para deletar um clube."""
-    clube = Clube.query.get(id)
+def delete_clube(current_user, id):
+    """Rota para deletar um clube.
+
+    O clube some das leituras na hora; livros e avaliações são removidos em
+    segundo plano (acompanhe em GET /tarefas/<id>).
+    """
+    clube = visivel(Clube, id)
 
     if not clube:
         return jsonify({'message': 'Clube não encontrado'}), 404
 
+    if clube.id_usuario_criador != current_user.id:
+        return jsonify({'message': 'Acesso negado'}), 403
+
     try:
-        db.session.delete(clube)
+        tarefa = agendar_exclusao('clube', clube)
         db.session.commit()
-        return jsonify({'message': 'Clube deletado com sucesso!'}), 200
+        executar_exclusao(tarefa.id)
+        return jsonify({'message': 'Exclusão do clube agendada', 'tarefa': tarefa.id}), 202, \
+            {'Location': f'/tarefas/{tarefa.id}'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
@@ -235,31 +426,137 @@ def create_livro(current_user, clube_id):
     if not titulo or not autor:
         return jsonify({'message': 'Dados incompletos'}), 400
 
-    clube = Clube.query.get(clube_id)
+    clube = visivel(Clube, clube_id)
     if not clube or clube.id_usuario_criador != current_user.id:
         return jsonify({'message': 'Clube não encontrado ou acesso negado'}), 404
 
     livro = Livro(titulo=titulo, autor=autor, id_clube=clube_id)
+    livro.resumo = ResumoLivro(id_clube=clube_id)  # Resumo zerado, mantido pelas rotas de avaliação
 
     try:
         db.session.add(livro)
+        db.session.flush()  # Gera o id usado pelo índice de busca
+        indice_busca().indexar(livro.id, titulo, autor)
+        ajustar_estatisticas(total_livros=1)
+        ajustar_resumo_clube(clube_id, livros=1)
+        marcar_alteracao(Clube, clube_id)
+        registrar_mudanca('livro', livro.id, 'criado', current_user.id)
+        invalidar_apos_commit('estatisticas')
         db.session.commit()
         return jsonify({'message': 'Livro adicionado com sucesso!'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
+#importar livros em lote
+@livros_bp.route('/clubes/<int:clube_id>/livros/lote', methods=['POST'])
+@requisicao_token
+def importar_livros_lote(current_user, clube_id):
+    """Rota para adicionar vários livros a um clube (array JSON, NDJSON ou CSV com titulo,autor)."""
+    clube = visivel(Clube, clube_id)
+    if not clube or clube.id_usuario_criador != current_user.id:
+        return jsonify({'message': 'Clube não encontrado ou acesso negado'}), 404
+
+    tamanho_lote = request.args.get('lote', type=int) or current_app.config['IMPORTACAO_TAMANHO_LOTE']
+    if tamanho_lote < 1:
+        return jsonify({'message': 'Tamanho de lote inválido'}), 400
+
+    try:
+        registros = ler_registros(request.stream, request.mimetype)
+    except FormatoInvalido as e:
+        return jsonify({'message': str(e)}), 400
+
+    relatorio = importar_livros(clube_id, registros, tamanho_lote)
+    logger.info(f"Importação no clube {clube_id}: {relatorio['criados']} criados, {relatorio['erros']} com erro")
+    if relatorio['total'] == 0 and 'mensagem' in relatorio:
+        return jsonify({'message': relatorio['mensagem']}), 400
+    return jsonify(relatorio), 200
+
 #listar livros
 @livros_bp.route('/clubes/<int:clube_id>/livros', methods=['GET'])
 @requisicao_token
 def get_livros(current_user, clube_id):
-    """Rota para listar todos os livros de um clube."""
-    clube = Clube.query.get(clube_id)
+    """Rota para listar os livros de um clube (aceita ?after=&limit=, ?stream=json|ndjson, ?incluir=resumo e ?fields=)."""
+    clube = visivel(Clube, clube_id)
     if not clube or clube.id_usuario_criador != current_user.id:
         return jsonify({'message': 'Clube não encontrado ou acesso negado'}), 404
 
-    livros = Livro.query.filter_by(id_clube=clube_id).all()
-    return jsonify([{'id': livro.id, 'titulo': livro.titulo, 'autor': livro.autor} for livro in livros])
+    def gerar():
+        consulta = Livro.query.filter_by(id_clube=clube_id)
+        if request.args.get('incluir') == 'resumo':
+            # O resumo vem no mesmo SELECT (JOIN), sem consultar a tabela de avaliações
+            consulta = consulta.outerjoin(ResumoLivro, ResumoLivro.id_livro == Livro.id)
+            return listar(consulta, Livro.id, LIVRO_COM_RESUMO)
+        return listar(consulta, Livro.id, LIVRO)
+
+    return responder_condicional(f'clube-{clube.id}-v{clube.versao}', clube.atualizado_em, gerar)
+
+#buscar livros por título ou autor
+@livros_bp.route('/livros/busca', methods=['GET'])
+@requisicao_token
+def buscar_livros(current_user):
+    """Rota de busca textual (?q=, ?pagina=, ?limit=, ?clube=), sem diferenciar acentos.
+
+    Como em get_livros, só encontra livros dos clubes criados pelo usuário.
+    """
+    consulta = request.args.get('q', '')
+    pagina = request.args.get('pagina', 1, type=int)
+    limite = min(request.args.get('limit', 20, type=int), 100)
+    id_clube = request.args.get('clube', type=int)
+    if pagina < 1 or limite < 1:
+        return jsonify({'message': 'Parâmetros de paginação inválidos'}), 400
+    if id_clube is not None:
+        clube = visivel(Clube, id_clube)
+        if not clube or clube.id_usuario_criador != current_user.id:
+            return jsonify({'message': 'Clube não encontrado ou acesso negado'}), 404
+    try:
+        selecao = LIVRO_BUSCA.selecao(Livro.id, campos_solicitados())
+    except CamposInvalidos as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        # Um resultado a mais indica que existe próxima página
+        resultados = indice_busca().buscar(consulta, limite + 1, (pagina - 1) * limite, id_clube, current_user.id)
+    except ErroBusca as e:
+        return jsonify({'message': str(e)}), 400
+
+    proxima = pagina + 1 if len(resultados) > limite else None
+    resultados = resultados[:limite]
+    linhas = (db.session.query(*selecao.colunas).join(Clube, Clube.id == Livro.id_clube)
+              .filter(Livro.id.in_([id_livro for id_livro, _ in resultados]), Clube.excluido_em.is_(None)))
+    livros = {linha[0]: selecao.montar(linha) for linha in linhas}
+    itens = [dict(livros[id_livro], pontuacao=round(pontuacao, 4)) for id_livro, pontuacao in resultados if id_livro in livros]
+    return responder({'itens': itens, 'next': proxima})
+
+#ranking dos livros pela média bayesiana das notas
+@livros_bp.route('/livros/ranking', methods=['GET'])
+@requisicao_token
+def get_ranking_livros(current_user):
+    """Rota para listar os livros mais bem avaliados dos clubes do usuário (aceita ?clube=, ?limit= e ?after=<cursor>).
+
+    Lê resumos_livros em ordem do índice de pontuação; o custo não depende
+    da quantidade de avaliações.
+    """
+    id_clube = request.args.get('clube', type=int)
+    limite = min(request.args.get('limit', LIMITE_PADRAO, type=int), LIMITE_MAXIMO)
+    if limite < 1 or ('clube' in request.args and id_clube is None):
+        return jsonify({'message': 'Parâmetros inválidos'}), 400
+    if id_clube is not None:
+        clube = visivel(Clube, id_clube)
+        if not clube or clube.id_usuario_criador != current_user.id:
+            return jsonify({'message': 'Clube não encontrado ou acesso negado'}), 404
+    try:
+        depois = decodificar_cursor(request.args['after']) if 'after' in request.args else None
+    except CursorInvalido as e:
+        return jsonify({'message': str(e)}), 400
+
+    # Uma linha a mais indica que existe próxima página
+    linhas = consultar_ranking(limite + 1, id_clube, depois, id_usuario=current_user.id)
+    proximo = codificar_cursor(linhas[limite - 1].pontuacao, linhas[limite - 1].id) if len(linhas) > limite else None
+    itens = [{'id': id, 'titulo': titulo, 'autor': autor, 'id_clube': clube, 'pontuacao': round(pontuacao, 4),
+              'media': round(soma / total, 2), 'total': total}
+             for id, titulo, autor, clube, pontuacao, total, soma in linhas[:limite]]
+    return responder({'itens': itens, 'next': proximo})
 
 #Atualizar livros
 @livros_bp.route('/livros/<int:livro_id>', methods=['PUT'])
@@ -268,11 +565,11 @@ def update_livro(current_user, livro_id):
     """Rota para atualizar as informações de um livro."""
     data = request.get_json()
     livro = Livro.query.get(livro_id)
+    clube = visivel(Clube, livro.id_clube) if livro else None
 
-    if not livro:
+    if not clube:  # Livro inexistente ou de um clube em exclusão
         return jsonify({'message': 'Livro não encontrado'}), 404
 
-    clube = Clube.query.get(livro.id_clube)
     if clube.id_usuario_criador != current_user.id:
         return jsonify({'message': 'Acesso negado'}), 403
 
@@ -280,6 +577,9 @@ def update_livro(current_user, livro_id):
     livro.autor = data.get('autor', livro.autor)
 
     try:
+        indice_busca().indexar(livro.id, livro.titulo, livro.autor)
+        marcar_alteracao(Clube, livro.id_clube)
+        registrar_mudanca('livro', livro.id, 'atualizado', clube.id_usuario_criador)
         db.session.commit()
         return jsonify({'message': 'Livro atualizado com sucesso!'}), 200
     except Exception as e:
@@ -292,16 +592,27 @@ def update_livro(current_user, livro_id):
 def delete_livro(current_user, livro_id):
     """Rota para deletar um livro."""
     livro = Livro.query.get(livro_id)
+    clube = visivel(Clube, livro.id_clube) if livro else None
 
-    if not livro:
+    if not clube:  # Livro inexistente ou de um clube em exclusão
         return jsonify({'message': 'Livro não encontrado'}), 404
 
-    clube = Clube.query.get(livro.id_clube)
     if clube.id_usuario_criador != current_user.id:
         return jsonify({'message': 'Acesso negado'}), 403
 
     try:
+        indice_busca().remover(livro.id)
+        marcar_alteracao(Clube, livro.id_clube)
+        LivroSimilar.query.filter((LivroSimilar.id_livro == livro.id) | (LivroSimilar.id_similar == livro.id)) \
+            .delete(synchronize_session=False)
+        # As avaliações do livro deixam de contar no clube
+        resumo = livro.resumo
+        ajustar_resumo_clube(livro.id_clube, livros=-1, avaliacoes=-resumo.total if resumo else 0,
+                             soma=-resumo.soma if resumo else 0)
         db.session.delete(livro)
+        ajustar_estatisticas(total_livros=-1)
+        registrar_mudanca('livro', livro_id, 'excluido', clube.id_usuario_criador)
+        invalidar_apos_commit('estatisticas', f'livro:{livro_id}:avaliacoes')
         db.session.commit()
         return jsonify({'message': 'Livro deletado com sucesso!'}), 200
     except Exception as e:
@@ -319,32 +630,115 @@ def create_avaliacao(current_user, livro_id):
     if not nota or not isinstance(nota, int) or not (1 <= nota <= 5):
         return jsonify({'message': 'Nota inválida, deve ser um número entre 1 e 5'}), 400
 
-    livro = Livro.query.get(livro_id)
-    if not livro:
+    if not livro_visivel(livro_id):  # Livro inexistente ou de um clube em exclusão
         return jsonify({'message': 'Livro não encontrado'}), 404
 
+    if current_app.config['AVALIACOES_AGRUPADAS']:
+        # Encerra a transação de leitura (e devolve a conexão ao pool) antes de esperar o lote
+        db.session.commit()
+        try:
+            id_avaliacao = gravacao_agrupada().gravar(comentario, nota, livro_id, current_user.id)
+        except Exception as e:
+            return jsonify({'message': str(e)}), 500
+        return jsonify({'message': 'Avaliação criada com sucesso!', 'id': id_avaliacao}), 201
+
     avaliacao = Avaliacao(comentario=comentario, nota=nota, id_livro=livro_id, id_usuario=current_user.id)
 
     try:
         db.session.add(avaliacao)
+        db.session.flush()
+        ajustar_estatisticas(soma_notas=nota, total_avaliacoes=1)
+        ajustar_resumo_livro(livro_id, nota, 1)
+        marcar_alteracao_livros([livro_id])
+        registrar_mudanca('avaliacao', avaliacao.id, 'criado')
+        invalidar_apos_commit('estatisticas', f'livro:{livro_id}:avaliacoes')
         db.session.commit()
-        return jsonify({'message': 'Avaliação criada com sucesso!'}), 201
+        return jsonify({'message': 'Avaliação criada com sucesso!', 'id': avaliacao.id}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
 @avaliacoes_bp.route('/livros/<int:livro_id>/avaliacoes', methods=['GET'])
+@cache_resposta(lambda livro_id: [f'livro:{livro_id}:avaliacoes'])
 def get_avaliacoes(livro_id):
-    """Rota para listar todas as avaliações de um livro."""
-    livro = Livro.query.get(livro_id)
+    """Rota para listar as avaliações de um livro (aceita ?after=&limit=, ?stream=json|ndjson e ?fields=)."""
+    livro = livro_visivel(livro_id)
     if not livro:
         return jsonify({'message': 'Livro não encontrado'}), 404
 
-    avaliacoes = Avaliacao.query.filter_by(id_livro=livro_id).all()
-    return jsonify([
-        {'id': avaliacao.id, 'comentario': avaliacao.comentario, 'nota': avaliacao.nota, 'id_usuario': avaliacao.id_usuario}
-        for avaliacao in avaliacoes
-    ])
+    return responder_condicional(
+        f'livro-{livro.id}-v{livro.versao}', livro.atualizado_em,
+        lambda: listar(Avaliacao.query.filter_by(id_livro=livro_id), Avaliacao.id, AVALIACAO))
+
+@avaliacoes_bp.route('/livros/<int:livro_id>/resumo', methods=['GET'])
+def get_resumo_livro(livro_id):
+    """Rota para obter o resumo das avaliações de um livro (média e histograma de notas)."""
+    if not livro_visivel(livro_id):
+        return jsonify({'message': 'Livro não encontrado'}), 404
+    resumo = db.session.get(ResumoLivro, livro_id)
+    if resumo is None:
+        resumo = obter_resumo_livro(livro_id)  # Livro criado antes dos resumos
+
+    return responder({'id_livro': livro_id, **serializar_resumo(resumo)})
+
+@livros_bp.route('/livros/<int:livro_id>/similares', methods=['GET'])
+@requisicao_token
+def get_livros_similares(current_user, livro_id):
+    """Rota para listar os livros mais parecidos com um livro dos clubes do usuário (aceita ?limit=).
+
+    Lê a tabela livros_similares, recalculada fora das requisições por
+    `flask recomendacoes calcular`; só lista vizinhos dos clubes do usuário.
+    """
+    if not livro_visivel(livro_id, current_user.id):
+        return jsonify({'message': 'Livro não encontrado ou acesso negado'}), 404
+    limite = request.args.get('limit', 20, type=int)
+    if limite < 1:
+        return jsonify({'message': 'limit deve ser positivo'}), 400
+
+    linhas = (db.session.query(Livro.id, Livro.titulo, Livro.autor, Livro.id_clube, LivroSimilar.similaridade)
+              .join(LivroSimilar, LivroSimilar.id_similar == Livro.id)
+              .join(Clube, Clube.id == Livro.id_clube)
+              .filter(LivroSimilar.id_livro == livro_id, Clube.id_usuario_criador == current_user.id,
+                      Clube.excluido_em.is_(None))
+              .order_by(LivroSimilar.posicao)
+              .limit(limite))
+    itens = [{'id': id, 'titulo': titulo, 'autor': autor, 'id_clube': id_clube,
+              'similaridade': round(similaridade, 4)}
+             for id, titulo, autor, id_clube, similaridade in linhas]
+    return responder({'id_livro': livro_id, 'itens': itens})
+
+@usuarios_bp.route('/usuarios/<int:id>/recomendacoes', methods=['GET'])
+@requisicao_token
+def get_recomendacoes(current_user, id):
+    """Rota para recomendar livros a um usuário (aceita ?limit=).
+
+    Soma a similaridade dos vizinhos dos livros que o usuário avaliou bem,
+    descartando os que ele já avaliou; é uma única consulta agrupada sobre
+    livros_similares. Como nas demais listagens de livros, só recomenda
+    livros dos clubes do usuário.
+    """
+    if current_user.id != id:
+        return jsonify({'message': 'Acesso negado'}), 403
+    limite = request.args.get('limit', 20, type=int)
+    if limite < 1:
+        return jsonify({'message': 'limit deve ser positivo'}), 400
+
+    avaliados = db.session.query(Avaliacao.id_livro).filter(Avaliacao.id_usuario == id)
+    pontuacao = db.func.sum(LivroSimilar.similaridade).label('pontuacao')
+    linhas = (db.session.query(Livro.id, Livro.titulo, Livro.autor, Livro.id_clube, pontuacao)
+              .join(LivroSimilar, LivroSimilar.id_similar == Livro.id)
+              .join(Avaliacao, Avaliacao.id_livro == LivroSimilar.id_livro)
+              .join(Clube, Clube.id == Livro.id_clube)
+              .filter(Avaliacao.id_usuario == id, Avaliacao.nota >= NOTA_MINIMA_RECOMENDACAO,
+                      LivroSimilar.id_similar.notin_(avaliados), Clube.id_usuario_criador == id,
+                      Clube.excluido_em.is_(None))
+              .group_by(Livro.id, Livro.titulo, Livro.autor, Livro.id_clube)
+              .order_by(pontuacao.desc(), Livro.id)
+              .limit(limite))
+    itens = [{'id': id_livro, 'titulo': titulo, 'autor': autor, 'id_clube': id_clube,
+              'pontuacao': round(float(total), 4)}
+             for id_livro, titulo, autor, id_clube, total in linhas]
+    return responder({'id_usuario': id, 'itens': itens})
 
 @avaliacoes_bp.route('/avaliacoes/<int:avaliacao_id>', methods=['PUT'])
 @requisicao_token
@@ -356,10 +750,22 @@ def update_avaliacao(current_user, avaliacao_id):
     if not avaliacao or avaliacao.id_usuario != current_user.id:
         return jsonify({'message': 'Avaliação não encontrada ou acesso negado'}), 404
 
+    nota = data.get('nota', avaliacao.nota)
+    if not isinstance(nota, int) or not (1 <= nota <= 5):
+        return jsonify({'message': 'Nota inválida, deve ser um número entre 1 e 5'}), 400
+
+    nota_anterior = avaliacao.nota
     avaliacao.comentario = data.get('comentario', avaliacao.comentario)
-    avaliacao.nota = data.get('nota', avaliacao.nota)
+    avaliacao.nota = nota
 
     try:
+        ajustar_estatisticas(soma_notas=nota - nota_anterior)
+        if nota != nota_anterior:
+            ajustar_resumo_livro(avaliacao.id_livro, nota_anterior, -1)
+            ajustar_resumo_livro(avaliacao.id_livro, nota, 1)
+        marcar_alteracao_livros([avaliacao.id_livro])
+        registrar_mudanca('avaliacao', avaliacao_id, 'atualizado')
+        invalidar_apos_commit('estatisticas', f'livro:{avaliacao.id_livro}:avaliacoes')
         db.session.commit()
         return jsonify({'message': 'Avaliação atualizada com sucesso!'}), 200
     except Exception as e:
@@ -377,6 +783,11 @@ def delete_avaliacao(current_user, avaliacao_id):
 
     try:
         db.session.delete(avaliacao)
+        ajustar_estatisticas(soma_notas=-avaliacao.nota, total_avaliacoes=-1)
+        ajustar_resumo_livro(avaliacao.id_livro, avaliacao.nota, -1)
+        marcar_alteracao_livros([avaliacao.id_livro])
+        registrar_mudanca('avaliacao', avaliacao_id, 'excluido')
+        invalidar_apos_commit('estatisticas', f'livro:{avaliacao.id_livro}:avaliacoes')
         db.session.commit()
         return jsonify({'message': 'Avaliação deletada com sucesso!'}), 200
     except Exception as e:
@@ -385,19 +796,22 @@ def delete_avaliacao(current_user, avaliacao_id):
 
 
 @estatisticas_bp.route('/estatisticas', methods=['GET'])
+@cache_resposta(lambda: ['estatisticas'])
 def obter_estatisticas():
     """Rota para obter estatísticas do sistema."""
 
-    # Total de livros e de clubes
-    total_livros = db.session.query(func.count(Livro.id)).scalar()
-    total_clubes = db.session.query(func.count(Clube.id)).scalar()
+    # Leitura O(1) da tabela de agregados mantida pelas rotas de escrita
+    agregados = obter_agregados()
+    total_livros = agregados.total_livros
+    total_clubes = agregados.total_clubes
 
     # Média de livros por clube (evitando divisão por zero)
     media_livros_por_clube = total_livros / total_clubes if total_clubes > 0 else 0
     media_livros_por_clube = round(media_livros_por_clube, 1)  # Limita a uma casa decimal
 
     # Média de avaliações dos livros
-    media_avaliacoes = db.session.query(func.avg(Avaliacao.nota)).scalar() or 0
+    total_avaliacoes = agregados.total_avaliacoes
+    media_avaliacoes = agregados.soma_notas / total_avaliacoes if total_avaliacoes > 0 else 0
     media_avaliacoes = round(media_avaliacoes, 1)  # Limita a uma casa decimal
 
     estatisticas = {
@@ -405,4 +819,249 @@ def obter_estatisticas():
         'media_avaliacoes': media_avaliacoes,
     }
 
-    return jsonify(estatisticas), 200
\ No newline at end of file
+    return responder(estatisticas)
+
+
+# Exportação do catálogo para análises offline (somente administradores)
+@admin_bp.route('/admin/exportar/<entidade>', methods=['GET'])
+@requisicao_token
+def exportar_entidade(current_user, entidade):
+    """Rota para exportar clubes, livros ou avaliações em CSV, NDJSON ou Parquet (?formato=&juntar=1)."""
+    if current_user.id not in current_app.config['ADMIN_IDS']:
+        return jsonify({'message': 'Acesso negado'}), 403
+
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACAO:
+        return jsonify({'message': 'Formato inválido, use csv, ndjson ou parquet'}), 400
+
+    try:
+        exportacao = Exportacao(entidade, request.args.get('juntar') == '1')
+    except ErroExportacao as e:
+        return jsonify({'message': str(e)}), 400
+
+    def registrar_vazao():
+        vazao = exportacao.vazao()
+        logger.info(f"Exportação de {entidade} ({formato}): {vazao['linhas']} linhas em {vazao['segundos']}s "
+                    f"({vazao['linhas_por_segundo']} linhas/s)")
+
+    nome_arquivo = f'{entidade}.{formato}'
+    cabecalhos = {'Content-Disposition': f'attachment; filename={nome_arquivo}'}
+
+    if formato == 'parquet':
+        # O rodapé do Parquet só existe no final: grava em arquivo temporário e envia em pedaços
+        arquivo = tempfile.NamedTemporaryFile(suffix='.parquet', delete=False)
+        arquivo.close()
+        try:
+            exportacao.parquet(arquivo.name)
+        except ErroExportacao as e:
+            os.remove(arquivo.name)
+            return jsonify({'message': str(e)}), 400
+        registrar_vazao()
+
+        def enviar_arquivo():
+            try:
+                with open(arquivo.name, 'rb') as origem:
+                    while pedaco := origem.read(64 * 1024):
+                        yield pedaco
+            finally:
+                os.remove(arquivo.name)
+
+        return Response(enviar_arquivo(), mimetype='application/vnd.apache.parquet', headers=cabecalhos)
+
+    def gerar():
+        yield from getattr(exportacao, formato)()
+        registrar_vazao()
+
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(gerar()), mimetype=mimetype, headers=cabecalhos)
+
+
+# Métricas do processo no formato texto do Prometheus
+@metricas_bp.route('/metrics', methods=['GET'])
+def obter_metricas():
+    """Rota para coleta de métricas (latência, SQL e pool por endpoint, caches, log, mudanças e admissão)."""
+    cache = current_app.extensions['cache_respostas'].estatisticas()
+    principais = current_app.extensions['cache_principais'].estatisticas()
+    log = estatisticas_log()
+    extras = [
+        ('bookbridge_cache_respostas_acertos_total', 'counter', 'Acertos do cache de respostas', cache['acertos']),
+        ('bookbridge_cache_respostas_falhas_total', 'counter', 'Falhas do cache de respostas', cache['falhas']),
+        ('bookbridge_cache_principais_acertos_total', 'counter', 'Acertos do cache de tokens',
+         principais['acertos']),
+        ('bookbridge_log_descartados_total', 'counter', 'Registros de log descartados com a fila cheia',
+         log.get('descartados_fila_cheia', 0)),
+        ('bookbridge_log_fila', 'gauge', 'Registros de log aguardando escrita', log.get('na_fila', 0)),
+    ]
+    emails = filtro_emails().estatisticas()
+    extras += [
+        ('bookbridge_filtro_emails_negativos_total', 'counter',
+         'Cadastros com email novo liberados pelo filtro de Bloom, sem consulta ao banco', emails['negativos']),
+        ('bookbridge_filtro_emails_duplicados_total', 'counter', 'Emails repetidos recusados com 409 antes do hash',
+         emails['duplicados']),
+        ('bookbridge_filtro_emails_falsos_positivos_total', 'counter',
+         'Emails novos que o filtro não descartou (consulta ao banco sem necessidade)', emails['falsos_positivos']),
+        ('bookbridge_filtro_emails_taxa_falsos_positivos', 'gauge', 'Fração observada de falsos positivos do filtro',
+         emails['taxa_falsos_positivos']),
+        ('bookbridge_filtro_emails_elementos', 'gauge', 'Emails no filtro de Bloom', emails['elementos']),
+    ]
+    gravacao = gravacao_agrupada().estatisticas()
+    extras += [
+        ('bookbridge_avaliacoes_lote_tamanho', 'histogram', 'Avaliações gravadas por lote (gravação agrupada)',
+         gravacao['tamanhos']),
+        ('bookbridge_avaliacoes_lote_segundos', 'histogram', 'Duração da transação de cada lote, até o commit',
+         gravacao['duracoes']),
+        ('bookbridge_avaliacoes_lotes_falhos_total', 'counter', 'Lotes regravados uma avaliação por vez após erro',
+         gravacao['lotes_falhos']),
+        ('bookbridge_avaliacoes_fila', 'gauge', 'Avaliações aguardando o próximo lote', gravacao['na_fila']),
+    ]
+    mudancas = log_mudancas().estatisticas()
+    extras += [
+        ('bookbridge_mudancas_aguardando', 'gauge', 'Leituras de /mudancas (long-poll ou SSE) esperando commits',
+         mudancas['aguardando']),
+        ('bookbridge_mudancas_compactadas_total', 'counter',
+         'Entradas do log de mudanças substituídas por outra mais nova da mesma entidade', mudancas['compactadas']),
+        ('bookbridge_mudancas_expurgadas_total', 'counter', 'Exclusões descartadas do log de mudanças pela retenção',
+         mudancas['expurgadas']),
+    ]
+    admissao = current_app.extensions['admissao'].estatisticas()
+    for campo, tipo, ajuda in (('admitidas', 'counter', 'Requisições admitidas pelo controle de admissão'),
+                               ('esperas', 'counter', 'Requisições que esperaram vaga na fila'),
+                               ('rejeitadas_taxa', 'counter', 'Requisições rejeitadas pelo limite de taxa (429)'),
+                               ('rejeitadas_ocupado', 'counter', 'Requisições rejeitadas com a fila cheia (503)'),
+                               ('em_andamento', 'gauge', 'Requisições em andamento no grupo'),
+                               ('na_fila', 'gauge', 'Requisições aguardando vaga no grupo')):
+        sufixo = '_total' if tipo == 'counter' else ''
+        extras.append((f'bookbridge_admissao_{campo}{sufixo}', tipo, ajuda,
+                       [({'grupo': grupo}, valores[campo]) for grupo, valores in sorted(admissao.items())]))
+    # Nem todo pool informa as conexões em uso (ex.: os pools do SQLite)
+    if hasattr(db.engine.pool, 'checkedout'):
+        extras.append(('bookbridge_pool_conexoes_em_uso', 'gauge', 'Conexões do pool em uso',
+                       db.engine.pool.checkedout()))
+    texto = current_app.extensions['metricas'].texto(extras)
+    return Response(texto, mimetype='text/plain; version=0.0.4')
+
+
+# Várias chamadas da API em uma única ida e volta
+@lote_bp.route('/lote', methods=['POST'])
+@requisicao_token
+def executar_requisicoes_lote(current_user):
+    """Rota para executar uma lista de sub-requisições e devolver todas as respostas juntas.
+
+    Corpo: {"requisicoes": [{"id": ..., "metodo": "GET", "caminho": "/clubes/1/livros",
+    "corpo": {...}, "cabecalhos": {...}}], "paralelo": false}
+    """
+    try:
+        requisicoes, paralelo = ler_lote(request.get_json(silent=True), current_app.config['LOTE_MAXIMO'])
+    except LoteInvalido as e:
+        return jsonify({'message': str(e)}), 400
+
+    return responder({'respostas': executar_lote(requisicoes, current_user, paralelo)})
+
+
+# Andamento das exclusões em segundo plano
+@tarefas_bp.route('/tarefas/<int:tarefa_id>', methods=['GET'])
+def get_tarefa(tarefa_id):
+    """Rota para consultar o estado de uma tarefa de exclusão."""
+    tarefa = db.session.get(TarefaExclusao, tarefa_id)
+    if not tarefa:
+        return jsonify({'message': 'Tarefa não encontrada'}), 404
+
+    return responder({
+        'id': tarefa.id, 'entidade': tarefa.entidade, 'id_alvo': tarefa.id_alvo, 'estado': tarefa.estado,
+        'avaliacoes_removidas': tarefa.avaliacoes_removidas, 'livros_removidos': tarefa.livros_removidos,
+        'clubes_removidos': tarefa.clubes_removidos, 'erro': tarefa.erro,
+        'criado_em': tarefa.criado_em.isoformat(),
+        'concluido_em': tarefa.concluido_em.isoformat() if tarefa.concluido_em else None,
+    })
+
+
+# Sincronização incremental: entidades alteradas desde um cursor (ver app/mudancas.py)
+MUDANCAS_REPRESENTACOES = {
+    'usuario': USUARIO,
+    'clube': CLUBE,
+    'livro': LIVRO_BUSCA,
+    'avaliacao': Representacao({**AVALIACAO.campos, 'id_livro': Avaliacao.id_livro}),
+}
+PING_SSE = 15  # Segundos sem eventos antes de um comentário para manter a conexão aberta
+
+
+def _consultar_mudancas(desde, limite, id_usuario):
+    resultado = consultar_mudancas(desde, limite, id_usuario, MUDANCAS_REPRESENTACOES)
+    db.session.commit()  # Encerra a leitura: a conexão volta ao pool durante a espera
+    return resultado
+
+
+def _aguardar_mudancas(desde, limite, id_usuario, espera):
+    # Long-poll: responde assim que houver mudanças ou quando a espera acabar
+    prazo = time.monotonic() + espera
+    while True:
+        resultado = _consultar_mudancas(desde, limite, id_usuario)
+        restante = prazo - time.monotonic()
+        if resultado['mudancas'] or resultado['mais'] or restante <= 0:
+            return resultado
+        desde = resultado['cursor']
+        log_mudancas().aguardar(desde, min(restante, current_app.config['MUDANCAS_INTERVALO_CONSULTA']))
+
+
+def _eventos_mudancas(resultado, limite, id_usuario):
+    # Server-Sent Events: um evento por entidade, com o cursor como id (reconexão via Last-Event-ID)
+    fim = time.monotonic() + current_app.config['MUDANCAS_SSE_DURACAO']
+    ultimo_envio = time.monotonic()
+    while True:
+        for mudanca in resultado['mudancas']:
+            yield b'id: %d\nevent: mudanca\ndata: %s\n\n' % (mudanca['cursor'], para_json(mudanca))
+            ultimo_envio = time.monotonic()
+        if time.monotonic() >= fim:
+            return
+        if not resultado['mais']:
+            if time.monotonic() - ultimo_envio >= PING_SSE:
+                yield b': ping\n\n'
+                ultimo_envio = time.monotonic()
+            log_mudancas().aguardar(resultado['cursor'], current_app.config['MUDANCAS_INTERVALO_CONSULTA'])
+        try:
+            resultado = _consultar_mudancas(resultado['cursor'], limite, id_usuario)
+        except CursorExpirado:
+            yield b'event: expirado\ndata: {}\n\n'
+            return
+
+
+def _quer_sse():
+    return request.args.get('stream') == 'sse' or \
+        request.accept_mimetypes.best_match(['application/json', 'text/event-stream']) == 'text/event-stream'
+
+
+@mudancas_bp.route('/mudancas', methods=['GET'])
+@requisicao_token
+def get_mudancas(current_user):
+    """Rota para sincronizar: entidades criadas, alteradas ou excluídas depois de ?desde=<cursor>.
+
+    Sem ?desde, responde só o cursor atual (carregue os dados pelas
+    listagens e sincronize a partir dele). Aceita ?limit=, ?espera=<segundos>
+    (long-poll) e ?stream=sse ou Accept: text/event-stream (Server-Sent
+    Events, retomando do cabeçalho Last-Event-ID). 410 indica um cursor
+    antigo demais: recarregue tudo e recomece sem ?desde.
+    """
+    limite = request.args.get('limit', LIMITE_PADRAO, type=int)
+    espera = request.args.get('espera', 0, type=float)
+    desde = request.headers.get('Last-Event-ID', request.args.get('desde'))
+    try:
+        desde = int(desde) if desde is not None else None
+    except ValueError:
+        desde = -1
+    if limite < 1 or espera < 0 or (desde is not None and desde < 0):
+        return jsonify({'message': 'Parâmetros inválidos'}), 400
+    limite = min(limite, LIMITE_MAXIMO)
+    if desde is None:
+        desde = cursor_atual()
+        if not _quer_sse():
+            return responder({'mudancas': [], 'cursor': desde, 'mais': False})
+
+    try:
+        if _quer_sse():
+            resultado = _consultar_mudancas(desde, limite, current_user.id)
+            return Response(stream_with_context(_eventos_mudancas(resultado, limite, current_user.id)),
+                            mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+        espera = min(espera, current_app.config['MUDANCAS_ESPERA_MAXIMA'])
+        return responder(_aguardar_mudancas(desde, limite, current_user.id, espera))
+    except CursorExpirado as e:
+        return jsonify({'message': str(e)}), 410
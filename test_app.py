@@ -1,8 +1,60 @@
 # test_app.py
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from sqlalchemy import insert
 from app.app import create_app
+from app.auditoria import auditar, requisicoes_get, capturar_consultas
+from app.cache_respostas import CacheRespostas, BackendRedis
 from app.database import db
-from app.models import Usuario, Clube, Livro, Avaliacao
+from app import serializacao, senhas
+from app.registro import RegistroAssincrono, FormatadorJSON, FiltroAmostragem
+from app.recomendacoes import calcular_similares, MatrizPython, MatrizSciPy
+from app.ranking import reconstruir_ranking
+from app.admissao import Limitador
+from app.gravacao_agrupada import Pendente
+from app.filtro_emails import FiltroBloom
+from app.mudancas import compactar_mudancas
+from app.exclusao import agendar_exclusao, executar_tarefa, retomar_pendentes
+from app.models import Usuario, Clube, Livro, Avaliacao, Estatistica, Mudanca, ResumoLivro
+
+try:
+    import scipy  # Dependência opcional: motor esparso das recomendações
+except ImportError:
+    scipy = None
+
+
+class RedisFalso:
+    """Substituto local do Redis com os comandos usados pelo BackendRedis."""
+
+    def __init__(self):
+        self.dados = {}
+
+    def get(self, chave):
+        return self.dados.get(chave)
+
+    def mget(self, chaves):
+        return [self.dados.get(chave) for chave in chaves]
+
+    def set(self, chave, valor, ex=None, nx=False):
+        if nx and chave in self.dados:
+            return None
+        self.dados[chave] = valor
+        return True
+
+    def incr(self, chave):
+        self.dados[chave] = int(self.dados.get(chave, 0)) + 1
+        return self.dados[chave]
+
+    def delete(self, chave):
+        self.dados.pop(chave, None)
 
 
 class BookBridgeTestCase(unittest.TestCase):
@@ -40,6 +92,12 @@ class BookBridgeTestCase(unittest.TestCase):
         db.drop_all()
         self.app_context.pop()  # Remove o contexto da aplicação
 
+    def cabecalhos_outro_usuario(self, email='outro@example.com'):
+        """Cadastra um segundo usuário e retorna os cabeçalhos autenticados dele."""
+        self.client.post('/usuarios', json={'nome': 'Outro', 'email': email, 'senha': 'senha_teste'})
+        token = self.client.post('/login', json={'email': email, 'senha': 'senha_teste'}).get_json()['token']
+        return {'Authorization': f'Bearer {token}'}
+
     def test_create_usuario(self):
         """Testa a criação de um novo usuário."""
         data = {
@@ -75,12 +133,17 @@ class BookBridgeTestCase(unittest.TestCase):
 
     def test_delete_usuario(self):
         """Testa a exclusão de um usuário"""
+        self.app.config['EXCLUSAO_THREADS'] = 0
         self.test_create_usuario()
         usuario = Usuario.query.first()
+        usuario_email = usuario.email
         response = self.client.delete(f'/usuarios/{usuario.id}')
         data = response.get_json()
-        self.assertEqual(response.status_code, 200)
-        self.assertIn('Usuário deletado com sucesso!', data['message'])
+        self.assertEqual(response.status_code, 202)
+        self.assertIn('Exclusão do usuário agendada', data['message'])
+        tarefa = self.client.get(response.headers['Location']).get_json()
+        self.assertEqual((tarefa['entidade'], tarefa['estado']), ('usuario', 'concluida'))
+        self.assertEqual(Usuario.query.filter_by(email=usuario_email).count(), 0)
 
     def test_create_clube(self):
         """Testa a criação de um clube"""
@@ -105,6 +168,38 @@ class BookBridgeTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertGreaterEqual(len(data), 1)
 
+    def test_list_clubes_paginado(self):
+        """Testa a paginação por cursor da listagem de clubes"""
+        for i in range(3):
+            self.client.post('/clubes', json={"nome": f"Clube {i}"}, headers=self.headers)
+
+        response = self.client.get('/clubes?limit=2')
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data['itens']), 2)
+        self.assertIsNotNone(data['next'])
+
+        response = self.client.get(f"/clubes?after={data['next']}&limit=2")
+        data = response.get_json()
+        self.assertEqual(len(data['itens']), 1)
+        self.assertIsNone(data['next'])
+
+        response = self.client.get('/clubes?limit=abc')
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_clubes_stream_ndjson(self):
+        """Testa a listagem de clubes em streaming NDJSON"""
+        self.test_create_clube()
+        response = self.client.get('/clubes?stream=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        linhas = response.get_data(as_text=True).splitlines()
+        self.assertEqual(len(linhas), 1)
+        self.assertIn('Clube Teste', linhas[0])
+
+        response = self.client.get('/clubes?stream=json')
+        self.assertEqual(len(response.get_json()), 1)
+
     def test_add_livro(self):
         """Testa a adição de um livro a um clube"""
         self.test_create_clube()  # Cria um clube para adicionar o livro
@@ -127,6 +222,909 @@ class BookBridgeTestCase(unittest.TestCase):
         self.assertIn('media_avaliacoes', data)
         self.assertIn('media_livros_por_clube', data)
 
+    def test_estatisticas_contadores(self):
+        """Testa a atualização incremental dos agregados e o comando de recálculo"""
+        self.test_add_livro()
+        self.client.post('/livros/1/avaliacoes', json={"nota": 4}, headers=self.headers)
+        self.client.post('/livros/1/avaliacoes', json={"nota": 1}, headers=self.headers)
+        self.client.put('/avaliacoes/2', json={"nota": 2}, headers=self.headers)
+
+        data = self.client.get('/estatisticas').get_json()
+        self.assertEqual(data['media_livros_por_clube'], 1.0)
+        self.assertEqual(data['media_avaliacoes'], 3.0)
+
+        # Força uma divergência e verifica que o recálculo a corrige
+        estatistica = db.session.get(Estatistica, 1)
+        estatistica.total_livros = 10
+        db.session.commit()
+        result = self.app.test_cli_runner().invoke(args=['estatisticas', 'recalcular'])
+        self.assertIn('total_livros: divergência de -9 corrigida', result.output)
+        self.assertEqual(db.session.get(Estatistica, 1).total_livros, 1)
+
+
+    def test_resumo_livro(self):
+        """Testa o resumo de avaliações do livro (média e histograma)"""
+        self.test_add_livro()
+        self.client.post('/livros/1/avaliacoes', json={"nota": 5}, headers=self.headers)
+        self.client.post('/livros/1/avaliacoes', json={"nota": 3}, headers=self.headers)
+        self.client.put('/avaliacoes/2', json={"nota": 4}, headers=self.headers)
+        self.client.post('/livros/1/avaliacoes', json={"nota": 1}, headers=self.headers)
+        self.client.delete('/avaliacoes/3', headers=self.headers)
+
+        response = self.client.get('/livros/1/resumo')
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['media'], 4.5)
+        self.assertEqual(data['histograma'], {'1': 0, '2': 0, '3': 0, '4': 1, '5': 1})
+
+        response = self.client.get('/clubes/1/livros?incluir=resumo', headers=self.headers)
+        self.assertEqual(response.get_json()[0]['resumo']['total'], 2)
+
+        response = self.client.get('/livros/99/resumo')
+        self.assertEqual(response.status_code, 404)
+
+
+    def test_cache_principal(self):
+        """Testa o cache de tokens verificados e sua invalidação"""
+        cache = self.app.extensions['cache_principais']
+        self.test_create_clube()
+        self.client.post('/clubes', json={"nome": "Outro"}, headers=self.headers)
+        stats = cache.estatisticas()
+        self.assertEqual(stats['tamanho'], 1)
+        self.assertEqual(stats['acertos'], 1)
+
+        self.client.put('/usuarios/1', json={"nome": "Novo Nome"})
+        self.assertEqual(cache.estatisticas()['tamanho'], 0)
+
+        # Token de um usuário removido deixa de ser aceito
+        self.test_create_usuario()
+        token = self.client.post('/login', json={"email": "teste2@example.com", "senha": "senha_teste2"}).get_json()['token']
+        headers = {"Authorization": f"Bearer {token}"}
+        self.client.get('/clubes/1/livros', headers=headers)
+        self.app.config['EXCLUSAO_THREADS'] = 0
+        self.client.delete('/usuarios/2')
+        response = self.client.get('/clubes/1/livros', headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+
+    def test_rehash_no_login(self):
+        """Testa a regravação do hash quando a política de senha muda"""
+        self.app.config['SENHA_HASH_METODO'] = 'pbkdf2:sha256:1000'
+        response = self.client.post('/login', json={"email": "teste@example.com", "senha": "senha_teste"})
+        self.assertEqual(response.status_code, 200)
+        usuario = db.session.get(Usuario, 1)
+        self.assertTrue(usuario.senha_hash.startswith('pbkdf2:sha256:1000$'))
+        self.assertFalse(usuario.precisa_rehash())
+
+
+    def test_importar_livros_lote(self):
+        """Testa a importação de livros em lote nos formatos JSON, NDJSON e CSV"""
+        self.test_create_clube()
+        response = self.client.post('/clubes/1/livros/lote?lote=2', json=[
+            {"titulo": "Livro A", "autor": "Autor A"},
+            {"titulo": "Livro B"},
+            {"titulo": "Livro C", "autor": "Autor C"},
+            {"titulo": "Livro D", "autor": "Autor D"},
+        ], headers=self.headers)
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['criados'], 3)
+        self.assertEqual(data['resultados'][1], {'linha': 2, 'status': 'erro', 'mensagem': 'Dados incompletos'})
+        self.assertEqual([r.get('id') for r in data['resultados']], [1, None, 2, 3])
+
+        ndjson = '{"titulo": "Livro E", "autor": "Autor E"}\n{"titulo": "Livro F", "autor": "Autor F"}\n'
+        response = self.client.post('/clubes/1/livros/lote', data=ndjson, headers=self.headers,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.get_json()['criados'], 2)
+
+        csv = 'titulo,autor\nLivro G,Autor G\n'
+        response = self.client.post('/clubes/1/livros/lote', data=csv, headers=self.headers, content_type='text/csv')
+        self.assertEqual(response.get_json()['criados'], 1)
+
+        self.assertEqual(Livro.query.count(), 6)
+        self.assertEqual(db.session.get(Estatistica, 1).total_livros, 6)
+        # Resumos criados junto com os livros, como em create_livro
+        self.assertEqual(ResumoLivro.query.filter_by(id_clube=1, total=0).count(), 6)
+
+
+    def test_exportar_avaliacoes(self):
+        """Testa a exportação de avaliações pela rota administrativa e pelo comando"""
+        self.test_add_livro()
+        self.client.post('/livros/1/avaliacoes', json={"nota": 5, "comentario": "Ótimo"}, headers=self.headers)
+
+        response = self.client.get('/admin/exportar/avaliacoes', headers=self.headers)
+        self.assertEqual(response.status_code, 403)
+
+        self.app.config['ADMIN_IDS'] = {1}
+        response = self.client.get('/admin/exportar/avaliacoes?formato=csv&juntar=1', headers=self.headers)
+        linhas = response.get_data(as_text=True).splitlines()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(linhas[0].startswith('id,nota,comentario,id_livro,id_usuario,livro_titulo'))
+        self.assertIn('Livro Teste', linhas[1])
+
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, 'livros.ndjson')
+            result = self.app.test_cli_runner().invoke(args=['exportar', 'livros', '--formato', 'ndjson',
+                                                             '--saida', saida])
+            self.assertIn('1 linhas exportadas', result.output)
+            with open(saida, encoding='utf-8') as arquivo:
+                self.assertEqual(json.loads(arquivo.readline())['titulo'], 'Livro Teste')
+
+
+    def test_buscar_livros(self):
+        """Testa a busca textual sem acentos e a sincronização do índice"""
+        self.test_create_clube()
+        self.client.post('/clubes/1/livros/lote', json=[
+            {"titulo": "Memórias Póstumas de Brás Cubas", "autor": "Machado de Assis"},
+            {"titulo": "Dom Casmurro", "autor": "Machado de Assis"},
+            {"titulo": "Vidas Secas", "autor": "Graciliano Ramos"},
+        ], headers=self.headers)
+
+        data = self.client.get('/livros/busca?q=memorias postumas', headers=self.headers).get_json()
+        self.assertEqual([livro['titulo'] for livro in data['itens']], ["Memórias Póstumas de Brás Cubas"])
+
+        data = self.client.get('/livros/busca?q=machado&limit=1', headers=self.headers).get_json()
+        self.assertEqual(len(data['itens']), 1)
+        self.assertEqual(data['next'], 2)
+
+        self.client.put('/livros/3', json={"titulo": "São Bernardo"}, headers=self.headers)
+        data = self.client.get('/livros/busca?q=sao bern', headers=self.headers).get_json()
+        self.assertEqual(data['itens'][0]['id'], 3)
+
+        self.client.delete('/livros/2', headers=self.headers)
+        data = self.client.get('/livros/busca?q=casmurro', headers=self.headers).get_json()
+        self.assertEqual(data['itens'], [])
+
+        response = self.client.get('/livros/busca?q=', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+    def popular_dados(self, clubes=5, livros_por_clube=20, avaliacoes_por_livro=5):
+        """Insere um conjunto de dados sintético para testes de consultas."""
+        db.session.execute(insert(Clube), [{'nome': f'Clube {i}', 'id_usuario_criador': 1} for i in range(clubes)])
+        db.session.execute(insert(Livro), [{'titulo': f'Livro {i}', 'autor': 'Autor', 'id_clube': i % clubes + 1}
+                                           for i in range(clubes * livros_por_clube)])
+        db.session.execute(insert(Avaliacao), [{'nota': i % 5 + 1, 'id_livro': i % (clubes * livros_por_clube) + 1,
+                                                'id_usuario': 1}
+                                               for i in range(clubes * livros_por_clube * avaliacoes_por_livro)])
+        db.session.commit()
+
+    def test_auditoria_sem_varredura_completa(self):
+        """Testa que nenhuma rota faz varredura completa de tabela em consultas filtradas"""
+        self.popular_dados()
+        self.app.config['ADMIN_IDS'] = {1}
+        tarefa = agendar_exclusao('clube', db.session.get(Clube, 5))
+        db.session.commit()
+        ids = {'usuarios': 1, 'clubes': 1, 'livros': 1, 'avaliacoes': 1, 'tarefas_exclusao': tarefa.id}
+        requisicoes, ignoradas = requisicoes_get(self.app, ids, {'headers': self.headers}, {'entidade': 'clubes'})
+        self.assertEqual(ignoradas, [])
+        self.assertIn(('GET', '/admin/exportar/clubes', {'headers': self.headers}), requisicoes)
+        requisicoes += [
+            ('POST', '/clubes', {'json': {'nome': 'Novo'}, 'headers': self.headers}),
+            ('PUT', '/clubes/1', {'json': {'nome': 'Renomeado'}, 'headers': self.headers}),
+            ('POST', '/clubes/1/livros', {'json': {'titulo': 'Novo', 'autor': 'Autor'}, 'headers': self.headers}),
+            ('PUT', '/livros/1', {'json': {'titulo': 'Renomeado'}, 'headers': self.headers}),
+            ('POST', '/livros/1/avaliacoes', {'json': {'nota': 5}, 'headers': self.headers}),
+            ('PUT', '/avaliacoes/1', {'json': {'nota': 3}, 'headers': self.headers}),
+            ('DELETE', '/avaliacoes/2', {'headers': self.headers}),
+        ]
+        problemas = auditar(self.client, requisicoes)
+        self.assertEqual(problemas, [])
+
+        result = self.app.test_cli_runner().invoke(args=['auditar-consultas'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertNotIn('não auditadas', result.output)
+
+        # Rotas sem valor para algum parâmetro são informadas, não descartadas em silêncio
+        _, ignoradas = requisicoes_get(self.app, {'usuarios': 1, 'clubes': 1, 'livros': 1, 'avaliacoes': 1})
+        self.assertEqual(sorted(ignoradas), ['/admin/exportar/<entidade>', '/tarefas/<int:tarefa_id>'])
+
+        # Resposta de erro reprova: sem token a rota nem chega às consultas
+        self.assertEqual(auditar(self.client, [('GET', '/clubes/1/livros', {})]),
+                         [{'rota': 'GET /clubes/1/livros', 'status': 401}])
+
+
+    def test_etag_get_condicional(self):
+        """Testa ETag/304 nas listagens e a invalidação pelas rotas de escrita"""
+        self.test_add_livro()
+
+        response = self.client.get('/clubes/1/livros', headers=self.headers)
+        etag = response.headers['ETag']
+        self.assertIsNotNone(response.headers.get('Last-Modified'))
+        response = self.client.get('/clubes/1/livros', headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        # Página diferente tem outro ETag
+        response = self.client.get('/clubes/1/livros?limit=1', headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+        self.client.post('/clubes/1/livros', json={"titulo": "Outro", "autor": "Autor"}, headers=self.headers)
+        response = self.client.get('/clubes/1/livros', headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()), 2)
+
+        etag = self.client.get('/livros/1/avaliacoes').headers['ETag']
+        self.assertEqual(self.client.get('/livros/1/avaliacoes', headers={'If-None-Match': etag}).status_code, 304)
+        self.client.post('/livros/1/avaliacoes', json={"nota": 4}, headers=self.headers)
+        self.assertEqual(self.client.get('/livros/1/avaliacoes', headers={'If-None-Match': etag}).status_code, 200)
+
+        # O resumo dos livros na listagem do clube acompanha as escritas de avaliações, inclusive as agrupadas
+        url = '/clubes/1/livros?incluir=resumo'
+        escritas = [(True, lambda: self.client.post('/livros/1/avaliacoes', json={"nota": 5}, headers=self.headers), 2),
+                    (False, lambda: self.client.post('/livros/1/avaliacoes', json={"nota": 5}, headers=self.headers), 3),
+                    (False, lambda: self.client.put('/avaliacoes/1', json={"nota": 2}, headers=self.headers), 3),
+                    (False, lambda: self.client.delete('/avaliacoes/1', headers=self.headers), 2)]
+        for agrupadas, escrever, total in escritas:
+            self.app.config.update(AVALIACOES_AGRUPADAS=agrupadas, AVALIACOES_LOTE_MS=0)
+            etag = self.client.get(url, headers=self.headers).headers['ETag']
+            self.assertIn(escrever().status_code, (200, 201))
+            response = self.client.get(url, headers={**self.headers, 'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()[0]['resumo']['total'], total)
+
+        etag = self.client.get('/clubes').headers['ETag']
+        self.assertEqual(self.client.get('/clubes', headers={'If-None-Match': etag}).status_code, 304)
+        self.client.put('/clubes/1', json={"nome": "Renomeado"}, headers=self.headers)
+        self.assertEqual(self.client.get('/clubes', headers={'If-None-Match': etag}).status_code, 200)
+
+
+    def test_cache_respostas_invalidacao(self):
+        """Testa o cache das rotas públicas e a invalidação pelas rotas de escrita"""
+        self.test_add_livro()
+        cache = self.app.extensions['cache_respostas']
+
+        self.assertEqual(self.client.get('/livros/1/avaliacoes').get_json(), [])
+        self.assertEqual(self.client.get('/livros/1/avaliacoes').get_json(), [])
+        self.assertEqual(cache.estatisticas()['acertos'], 1)
+
+        self.client.post('/livros/1/avaliacoes', json={"nota": 5}, headers=self.headers)
+        self.assertEqual(len(self.client.get('/livros/1/avaliacoes').get_json()), 1)
+        self.assertEqual(self.client.get('/estatisticas').get_json()['media_avaliacoes'], 5.0)
+
+    def test_cache_respostas_redis(self):
+        """Testa o backend Redis (com um substituto local) e o recálculo único por chave"""
+        cache = CacheRespostas(BackendRedis(RedisFalso()), ttl=30)
+        self.app.extensions['cache_respostas'] = cache
+        self.test_create_clube()
+
+        self.assertEqual(len(self.client.get('/clubes').get_json()), 1)
+        self.client.post('/clubes', json={"nome": "Outro"}, headers=self.headers)
+        self.assertEqual(len(self.client.get('/clubes').get_json()), 2)
+        self.assertEqual(len(self.client.get('/clubes').get_json()), 2)
+        self.assertEqual(cache.estatisticas()['acertos'], 1)
+
+        # Várias threads pedindo a mesma chave: apenas uma calcula
+        chamadas = []
+
+        def calcular():
+            chamadas.append(1)
+            time.sleep(0.05)
+            return {'valor': 1}
+
+        threads = [threading.Thread(target=cache.obter_ou_calcular, args=('chave', calcular)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(chamadas), 1)
+
+
+    def test_log_assincrono(self):
+        """Testa o log em fila: linhas JSON, descarte com fila cheia e amostragem"""
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = os.path.join(pasta, 'teste.log')
+            registro = RegistroAssincrono(arquivo, FormatadorJSON(), tamanho_fila=2, tamanho_lote=10)
+            log = logging.getLogger('bookbridge.teste')
+            log.propagate = False
+            log.addHandler(registro.manipulador_fila)
+            amostragem = FiltroAmostragem(0.5)
+            log.addFilter(amostragem)
+            try:
+                # Sem a thread de escrita a fila enche e os excedentes são descartados
+                for i in range(6):
+                    log.info('mensagem %d', i)
+                log.warning('aviso')
+                registro.iniciar()
+                registro.parar()
+            finally:
+                log.removeHandler(registro.manipulador_fila)
+                log.removeFilter(amostragem)
+
+            with open(arquivo, encoding='utf-8') as f:
+                linhas = [json.loads(linha) for linha in f]
+            self.assertEqual([l['mensagem'] for l in linhas], ['mensagem 0', 'mensagem 2'])
+            self.assertEqual(linhas[0]['nivel'], 'INFO')
+            self.assertEqual(amostragem.descartados, 3)
+            estatisticas = registro.estatisticas()
+            self.assertEqual(estatisticas['descartados_fila_cheia'], 2)
+            self.assertEqual(estatisticas['escritos'], 2)
+
+
+    def test_metricas(self):
+        """Testa /metrics e o log de requisições lentas com as consultas emitidas"""
+        self.test_add_livro()
+        self.app.config['METRICAS_LENTAS_MS'] = 0.001
+        with self.assertLogs(level='WARNING') as logs:
+            self.client.get('/clubes/1/livros', headers=self.headers)
+        lenta = [linha for linha in logs.output if 'Requisição lenta' in linha][0]
+        self.assertIn('GET /clubes/1/livros', lenta)
+        self.assertIn('SELECT', lenta)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        texto = response.get_data(as_text=True)
+        self.assertIn('# TYPE bookbridge_requisicao_segundos histogram', texto)
+        self.assertIn('bookbridge_requisicoes_total{endpoint="Livros.get_livros",metodo="GET",status="200"} 1', texto)
+        self.assertIn('bookbridge_sql_consultas_count{endpoint="Livros.get_livros"} 1', texto)
+        self.assertIn('bookbridge_requisicoes_lentas_total{endpoint="Livros.get_livros"} 1', texto)
+        self.assertIn('bookbridge_pool_checkout_segundos_count', texto)
+
+
+    def test_replicas_leitura_apos_escrita(self):
+        """Testa leituras GET na réplica e leitura após escrita no primário (dois arquivos SQLite)"""
+        with tempfile.TemporaryDirectory() as pasta:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(pasta, 'primario.db')}",
+                              'DATABASE_REPLICAS': [f"sqlite:///{os.path.join(pasta, 'replica.db')}"]})
+            with app.app_context():
+                db.create_all()
+                db.metadata.create_all(app.extensions['replicas'][0])
+                with db.engine.connect() as conexao:
+                    self.assertEqual(conexao.exec_driver_sql('PRAGMA journal_mode').scalar(), 'wal')
+
+                escritor = app.test_client()
+                response = escritor.post('/usuarios', json={"nome": "Réplica", "email": "r@example.com",
+                                                            "senha": "senha"})
+                self.assertEqual(response.status_code, 201)
+                self.assertIsNotNone(escritor.get_cookie('bb_primario'))
+
+                # Quem escreveu lê do primário; outro cliente lê da réplica (que não recebeu a escrita)
+                self.assertEqual(len(escritor.get('/usuarios').get_json()), 1)
+                self.assertEqual(app.test_client().get('/usuarios').get_json(), [])
+                db.session.remove()
+                for engine in [*db.engines.values(), *app.extensions['replicas']]:
+                    engine.dispose()
+
+
+    def test_serializacao_campos_e_formatos(self):
+        """Testa ?fields= nas listagens e a negociação de formato pelo Accept"""
+        self.test_add_livro()
+        response = self.client.get('/clubes/1/livros?fields=titulo&limit=10', headers=self.headers)
+        self.assertEqual(response.get_json(), {'itens': [{'titulo': 'Livro Teste'}], 'next': None})
+
+        response = self.client.get('/clubes/1/livros?fields=id,resumo&incluir=resumo', headers=self.headers)
+        self.assertEqual(response.get_json()[0]['resumo']['total'], 0)
+        self.assertEqual(self.client.get('/usuarios?fields=senha_hash').status_code, 400)
+
+        response = self.client.get('/livros/1/resumo', headers={'Accept': 'application/msgpack'})
+        self.assertIn('Accept', response.headers['Vary'])
+        if serializacao.msgpack is None:
+            # Sem o pacote opcional, a resposta cai para JSON
+            self.assertEqual(response.mimetype, 'application/json')
+        else:
+            self.assertEqual(response.mimetype, 'application/msgpack')
+            self.assertEqual(serializacao.msgpack.unpackb(response.data)['id_livro'], 1)
+
+    def test_similares_e_recomendacoes(self):
+        """Testa o cálculo dos livros similares (completo e incremental) e as recomendações"""
+        self.client.post('/clubes', json={'nome': 'Clube Teste'}, headers=self.headers)
+        for titulo in ('A', 'B', 'C', 'D'):
+            self.client.post('/clubes/1/livros', json={'titulo': titulo, 'autor': 'Autor'}, headers=self.headers)
+        self.client.post('/usuarios', json={'nome': 'Outro', 'email': 'outro@example.com', 'senha': 'senha_teste'})
+        token = self.client.post('/login', json={'email': 'outro@example.com', 'senha': 'senha_teste'}).get_json()['token']
+        outro = {'Authorization': f'Bearer {token}'}
+
+        for livro, nota in ((1, 5), (2, 5)):
+            self.client.post(f'/livros/{livro}/avaliacoes', json={'nota': nota}, headers=self.headers)
+        for livro, nota in ((1, 5), (2, 4), (3, 5)):
+            self.client.post(f'/livros/{livro}/avaliacoes', json={'nota': nota}, headers=outro)
+
+        resumo = calcular_similares(k=2, motor='python')
+        self.assertEqual(resumo['livros_recalculados'], 3)
+        similares = self.client.get('/livros/1/similares', headers=self.headers).get_json()['itens']
+        self.assertEqual([item['id'] for item in similares], [2, 3])
+        self.assertGreater(similares[0]['similaridade'], similares[1]['similaridade'])
+
+        # O usuário 1 ainda não avaliou o livro 3, vizinho dos dois livros que ele gostou
+        response = self.client.get('/usuarios/1/recomendacoes', headers=self.headers)
+        self.assertEqual([item['id'] for item in response.get_json()['itens']], [3])
+        self.assertEqual(self.client.get('/usuarios/1/recomendacoes', headers=outro).status_code, 403)
+
+        # Incremental: só o livro alterado e os seus vizinhos (o marcador tem precisão de segundos)
+        db.session.query(Estatistica).update({'similares_calculado_em': datetime.utcnow() - timedelta(hours=1)})
+        db.session.query(Livro).update({'atualizado_em': datetime.utcnow() - timedelta(hours=2)})
+        db.session.commit()
+        self.client.post('/livros/4/avaliacoes', json={'nota': 5}, headers=self.headers)
+        resumo = calcular_similares(k=2, motor='python')
+        self.assertEqual(resumo['livros_recalculados'], 3)
+        self.assertEqual([item['id'] for item in self.client.get('/livros/4/similares', headers=self.headers).get_json()['itens']], [2, 1])
+
+        self.client.delete('/livros/2', headers=self.headers)
+        self.assertNotIn(2, [item['id'] for item in self.client.get('/livros/1/similares', headers=self.headers).get_json()['itens']])
+        self.assertEqual(self.client.get('/livros/99/similares', headers=self.headers).status_code, 404)
+
+    def test_ranking_livros(self):
+        """Testa o ranking bayesiano: amortecimento de poucas avaliações, paginação, clube e reconstrução"""
+        self.client.post('/clubes', json={'nome': 'Clube 1'}, headers=self.headers)
+        self.client.post('/clubes', json={'nome': 'Clube 2'}, headers=self.headers)
+        for clube, titulo in ((1, 'Uma nota 5'), (1, 'Várias notas 4'), (2, 'Sem avaliações'), (2, 'Nota 2')):
+            self.client.post(f'/clubes/{clube}/livros', json={'titulo': titulo, 'autor': 'Autor'}, headers=self.headers)
+        for livro, notas in ((1, [5]), (2, [4, 4, 4, 5, 4, 4]), (4, [2])):
+            for nota in notas:
+                self.client.post(f'/livros/{livro}/avaliacoes', json={'nota': nota}, headers=self.headers)
+
+        ranking = self.client.get('/livros/ranking', headers=self.headers).get_json()
+        # Média 5 com uma avaliação fica abaixo de média ~4,2 com seis; livro sem avaliações não entra
+        self.assertEqual([item['id'] for item in ranking['itens']], [2, 1, 4])
+        self.assertAlmostEqual(ranking['itens'][1]['pontuacao'], (30 + 5) / 11, places=4)
+        self.assertIsNone(ranking['next'])
+
+        pagina = self.client.get('/livros/ranking?limit=2', headers=self.headers).get_json()
+        self.assertEqual([item['id'] for item in pagina['itens']], [2, 1])
+        pagina = self.client.get('/livros/ranking', query_string={'limit': 2, 'after': pagina['next']}, headers=self.headers).get_json()
+        self.assertEqual([item['id'] for item in pagina['itens']], [4])
+        self.assertEqual([item['id'] for item in self.client.get('/livros/ranking?clube=2', headers=self.headers).get_json()['itens']], [4])
+        self.assertEqual(self.client.get('/livros/ranking?after=x', headers=self.headers).status_code, 400)
+
+        # A pontuação acompanha as escritas e a reconstrução com outra priori reordena
+        self.client.delete('/avaliacoes/1', headers=self.headers)
+        self.assertEqual([item['id'] for item in self.client.get('/livros/ranking', headers=self.headers).get_json()['itens']], [2, 4])
+        self.app.config['RANKING_PESO_PRIORI'] = 0
+        self.assertEqual(reconstruir_ranking(), 4)
+        self.assertAlmostEqual(self.client.get('/livros/ranking', headers=self.headers).get_json()['itens'][0]['pontuacao'], 25 / 6, places=4)
+
+    def test_lote(self):
+        """Testa POST /lote: sub-requisições autenticadas uma vez, em ordem e em paralelo"""
+        self.client.post('/clubes', json={'nome': 'Clube Teste'}, headers=self.headers)
+        response = self.client.post('/lote', headers=self.headers, json={'requisicoes': [
+            {'id': 'novo', 'metodo': 'POST', 'caminho': '/clubes/1/livros', 'corpo': {'titulo': 'L', 'autor': 'A'}},
+            {'id': 'livros', 'caminho': '/clubes/1/livros?limit=10'},
+            {'id': 'avaliacoes', 'caminho': '/livros/1/avaliacoes'},
+            {'id': 'inexistente', 'caminho': '/nada'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        respostas = {item['id']: item for item in response.get_json()['respostas']}
+        self.assertEqual(respostas['novo']['status'], 201)
+        self.assertEqual(respostas['livros']['corpo']['itens'][0]['titulo'], 'L')
+        self.assertIn('ETag', respostas['livros']['cabecalhos'])
+        self.assertEqual(respostas['avaliacoes']['corpo'], [])
+        self.assertEqual(respostas['inexistente']['status'], 404)
+
+        response = self.client.post('/lote', headers=self.headers, json={'paralelo': True, 'requisicoes': [
+            {'caminho': '/clubes'}, {'caminho': '/clubes/1/livros'}, {'caminho': '/livros/1/resumo'}]})
+        self.assertEqual([item['status'] for item in response.get_json()['respostas']], [200, 200, 200])
+        self.assertEqual([item['id'] for item in response.get_json()['respostas']], [0, 1, 2])
+
+        self.assertEqual(self.client.post('/lote', json={'requisicoes': [{'caminho': '/clubes'}]}).status_code, 401)
+        response = self.client.post('/lote', headers=self.headers, json={'requisicoes': [{'caminho': '/lote'}]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_admissao(self):
+        """Testa o limite de taxa (429) e o de concorrência com fila cheia (503), com Retry-After"""
+        app = create_app({'ADMISSAO_LIMITES': {'auth': {'taxa': 0.01, 'rajada': 2},
+                                               'estatisticas': {'concorrencia': 1, 'fila': 0}}})
+        cliente = app.test_client()
+        credenciais = {'email': 'teste@example.com', 'senha': 'senha_teste'}
+        with app.app_context():
+            db.create_all()
+        cliente.post('/usuarios', json={'nome': 'Usuario Teste', **credenciais})
+        self.assertEqual([cliente.post('/login', json=credenciais).status_code for _ in range(3)], [200, 200, 429])
+        self.assertGreater(int(cliente.post('/login', json=credenciais).headers['Retry-After']), 90)
+
+        # Uma requisição ocupando a única vaga: a seguinte é rejeitada na hora
+        grupo = app.extensions['admissao'].grupos['estatisticas']
+        self.assertEqual(grupo.limitador.entrar(), (True, False))
+        response = cliente.get('/estatisticas')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        grupo.limitador.sair()
+        self.assertEqual(cliente.get('/estatisticas').status_code, 200)
+        self.assertEqual(grupo.limitador.ativos, 0)
+
+        metricas = cliente.get('/metrics').get_data(as_text=True)
+        self.assertIn('bookbridge_admissao_rejeitadas_taxa_total{grupo="auth"} 2', metricas)
+        self.assertIn('bookbridge_admissao_rejeitadas_ocupado_total{grupo="estatisticas"} 1', metricas)
+
+    def test_limitador_fila(self):
+        """Testa a espera na fila do limitador de concorrência"""
+        limitador = Limitador(1, fila=1, espera=2)
+        self.assertEqual(limitador.entrar(), (True, False))
+        resultado = []
+        espera = threading.Thread(target=lambda: resultado.append(limitador.entrar()))
+        espera.start()
+        while limitador.aguardando == 0:
+            time.sleep(0.01)
+        self.assertEqual(limitador.entrar(), (False, False))  # Fila cheia
+        limitador.sair()
+        espera.join()
+        self.assertEqual(resultado, [(True, True)])
+
+    def test_exclusao_clube_em_lotes(self):
+        """Testa a exclusão de um clube em segundo plano: oculto na hora, removido em lotes"""
+        self.app.config.update(EXCLUSAO_THREADS=0, EXCLUSAO_TAMANHO_LOTE=2)
+        self.client.post('/clubes', json={'nome': 'Clube 1'}, headers=self.headers)
+        self.client.post('/clubes', json={'nome': 'Clube 2'}, headers=self.headers)
+        for clube in (1, 1, 1, 2):
+            self.client.post(f'/clubes/{clube}/livros', json={'titulo': 'Livro', 'autor': 'Autor'}, headers=self.headers)
+        for livro, nota in ((1, 5), (1, 4), (2, 3), (3, 2), (4, 5)):
+            self.client.post(f'/livros/{livro}/avaliacoes', json={'nota': nota}, headers=self.headers)
+
+        response = self.client.delete('/clubes/1', headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        tarefa = self.client.get(f"/tarefas/{response.get_json()['tarefa']}").get_json()
+        self.assertEqual(tarefa['estado'], 'concluida')
+        self.assertEqual((tarefa['avaliacoes_removidas'], tarefa['livros_removidos'], tarefa['clubes_removidos']),
+                         (4, 3, 1))
+        self.assertEqual([clube['id'] for clube in self.client.get('/clubes').get_json()], [2])
+        self.assertEqual(self.client.get('/clubes/1/livros', headers=self.headers).status_code, 404)
+        self.assertEqual(Livro.query.count(), 1)
+
+        agregados = db.session.get(Estatistica, 1)
+        db.session.refresh(agregados)
+        self.assertEqual((agregados.total_clubes, agregados.total_livros, agregados.total_avaliacoes), (1, 1, 1))
+        self.assertEqual(self.client.get('/estatisticas').get_json()['media_avaliacoes'], 5)
+        self.assertEqual(self.client.get('/tarefas/99').status_code, 404)
+
+    def test_gravacao_agrupada_avaliacoes(self):
+        """Testa a gravação agrupada: um commit por lote, leitura após escrita e regravação após erro"""
+        self.app.config.update(AVALIACOES_AGRUPADAS=True, AVALIACOES_LOTE_MS=0)
+        self.client.post('/clubes', json={'nome': 'Clube Teste'}, headers=self.headers)
+        self.client.post('/clubes/1/livros', json={'titulo': 'Livro', 'autor': 'Autor'}, headers=self.headers)
+        response = self.client.post('/livros/1/avaliacoes', json={'nota': 4}, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['id'], 1)
+        self.assertEqual([item['nota'] for item in self.client.get('/livros/1/avaliacoes').get_json()], [4])
+
+        # Três avaliações chegando dentro do prazo saem num único lote; a inválida é isolada depois
+        self.app.config.update(AVALIACOES_LOTE_MAXIMO=3, AVALIACOES_LOTE_MS=5000)
+        gravacao = self.app.extensions['gravacao_avaliacoes']
+        pendentes = [Pendente({'comentario': None, 'nota': nota, 'id_livro': 1, 'id_usuario': 1}) for nota in (5, 7, 3)]
+        for pendente in pendentes:
+            gravacao._fila.put(pendente)
+        for pendente in pendentes:
+            self.assertTrue(pendente.concluida.wait(5))
+        self.assertEqual([pendente.id for pendente in pendentes], [2, None, 3])
+        self.assertIsNotNone(pendentes[1].erro)
+
+        resumo = self.client.get('/livros/1/resumo').get_json()
+        self.assertEqual((resumo['total'], resumo['media']), (3, 4.0))
+        metricas = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('bookbridge_avaliacoes_lote_tamanho_count 2', metricas)
+        self.assertIn('bookbridge_avaliacoes_lotes_falhos_total 1', metricas)
+
+    def test_clubes_com_estatisticas(self):
+        """Testa GET /clubes?incluir=estatisticas: agregados por clube numa única consulta, mantidos pelas escritas"""
+        self.popular_dados(clubes=5, livros_por_clube=4, avaliacoes_por_livro=2)
+        # Carga direta no banco: os resumos dos clubes são reconstruídos pelo recálculo
+        self.assertEqual(self.app.test_cli_runner().invoke(args=['estatisticas', 'recalcular']).exit_code, 0)
+
+        with capturar_consultas() as consultas:
+            response = self.client.get('/clubes?incluir=estatisticas&limit=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(consultas), 1)
+        itens = response.get_json()['itens']
+        self.assertEqual(len(itens), 3)
+        self.assertEqual(itens[0]['estatisticas'], {'total_livros': 4, 'total_avaliacoes': 8, 'media_avaliacoes': 1.0})
+        self.assertNotIn('estatisticas', self.client.get('/clubes?limit=1').get_json()['itens'][0])
+
+        # Livros e avaliações criados e removidos pelas rotas atualizam o resumo do clube
+        self.client.post('/clubes', json={'nome': 'Novo'}, headers=self.headers)
+        self.client.post('/clubes/6/livros', json={'titulo': 'Livro', 'autor': 'Autor'}, headers=self.headers)
+        self.client.post('/livros/21/avaliacoes', json={'nota': 5}, headers=self.headers)
+        self.client.post('/livros/21/avaliacoes', json={'nota': 2}, headers=self.headers)
+        self.client.put('/avaliacoes/42', json={'nota': 4}, headers=self.headers)
+        self.client.delete('/livros/1', headers=self.headers)
+        clubes = {item['id']: item['estatisticas'] for item in self.client.get('/clubes?incluir=estatisticas').get_json()}
+        self.assertEqual(clubes[6], {'total_livros': 1, 'total_avaliacoes': 2, 'media_avaliacoes': 4.5})
+        self.assertEqual(clubes[1], {'total_livros': 3, 'total_avaliacoes': 6, 'media_avaliacoes': 1.0})
+        self.assertNotIn('resumos de clubes', self.app.test_cli_runner().invoke(args=['estatisticas', 'recalcular']).output)
+
+    def test_email_repetido(self):
+        """Testa o 409 para email repetido antes do hash, pelo filtro de Bloom e pelo índice único"""
+        self.app.config['EXCLUSAO_THREADS'] = 0
+        dados = {'nome': 'Outro', 'email': 'teste@example.com', 'senha': 'outra_senha'}
+        response = self.client.post('/usuarios', json=dados)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.post('/usuarios', json={**dados, 'email': 'novo@example.com'}).status_code, 201)
+        self.assertEqual(self.client.put('/usuarios/2', json={'email': 'teste@example.com'}).status_code, 409)
+
+        # Cadastrado por outro processo (fora do filtro): o índice único também responde 409
+        db.session.execute(insert(Usuario), [{'nome': 'Externo', 'email': 'externo@example.com', 'senha_hash': '-'}])
+        db.session.commit()
+        self.assertEqual(self.client.post('/usuarios', json={**dados, 'email': 'externo@example.com'}).status_code, 409)
+        self.assertEqual(self.client.post('/usuarios', json={**dados, 'email': 'externo@example.com'}).status_code, 409)
+
+        # Depois da exclusão o email pode ser cadastrado de novo
+        self.client.delete('/usuarios/2')
+        self.assertEqual(self.client.post('/usuarios', json={**dados, 'email': 'novo@example.com'}).status_code, 201)
+
+        estatisticas = self.app.extensions['filtro_emails'].estatisticas()
+        self.assertEqual(estatisticas['duplicados'], 3)
+        metricas = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('bookbridge_filtro_emails_duplicados_total 3', metricas)
+
+        filtro = FiltroBloom(1000, 0.01)
+        for i in range(1000):
+            filtro.adicionar(f'usuario{i}@example.com')
+        self.assertTrue(all(f'usuario{i}@example.com' in filtro for i in range(1000)))
+        falsos = sum(f'ausente{i}@example.com' in filtro for i in range(10000))
+        self.assertLess(falsos, 300)
+        filtro.remover('usuario1@example.com')
+        self.assertNotIn('usuario1@example.com', filtro)
+
+
+    def test_mudancas(self):
+        """Testa GET /mudancas: entidades alteradas desde o cursor, long-poll, SSE, compactação e cursor expirado."""
+        self.app.config.update(EXCLUSAO_THREADS=0, MUDANCAS_INTERVALO_CONSULTA=0.05, MUDANCAS_SSE_DURACAO=0)
+        inicio = self.client.get('/mudancas', headers=self.headers).get_json()
+        self.assertEqual(inicio, {'mudancas': [], 'cursor': 1, 'mais': False})  # O cadastro do setUp
+
+        self.client.post('/clubes', json={'nome': 'Clube'}, headers=self.headers)
+        self.client.post('/clubes/1/livros', json={'titulo': 'Livro', 'autor': 'Autor'}, headers=self.headers)
+        self.client.put('/livros/1', json={'titulo': 'Novo título'}, headers=self.headers)
+        self.client.post('/livros/1/avaliacoes', json={'nota': 4}, headers=self.headers)
+
+        # Duas entradas do livro na página viram uma, com o estado atual
+        dados = self.client.get('/mudancas', query_string={'desde': 1}, headers=self.headers).get_json()
+        self.assertEqual([(m['entidade'], m['id'], m['operacao']) for m in dados['mudancas']],
+                         [('clube', 1, 'criado'), ('livro', 1, 'atualizado'), ('avaliacao', 1, 'criado')])
+        self.assertEqual(dados['mudancas'][1]['dados']['titulo'], 'Novo título')
+        self.assertEqual(dados['cursor'], 5)
+        pagina = self.client.get('/mudancas', query_string={'desde': 1, 'limit': 1}, headers=self.headers).get_json()
+        self.assertEqual((len(pagina['mudancas']), pagina['cursor'], pagina['mais']), (1, 2, True))
+
+        # Os livros só aparecem para o criador do clube
+        self.client.post('/usuarios', json={'nome': 'Outro', 'email': 'outro@example.com', 'senha': 'senha'})
+        token = self.client.post('/login', json={'email': 'outro@example.com', 'senha': 'senha'}).get_json()['token']
+        outro = self.client.get('/mudancas', query_string={'desde': 1},
+                                headers={'Authorization': f'Bearer {token}'}).get_json()
+        self.assertEqual([m['entidade'] for m in outro['mudancas']], ['clube', 'avaliacao', 'usuario'])
+
+        # Long-poll sem novidades espera o prazo e devolve o mesmo cursor; SSE envia um evento por entidade
+        antes = time.monotonic()
+        vazio = self.client.get('/mudancas', query_string={'desde': 6, 'espera': 0.2}, headers=self.headers)
+        self.assertGreaterEqual(time.monotonic() - antes, 0.2)
+        self.assertEqual(vazio.get_json(), {'mudancas': [], 'cursor': 6, 'mais': False})
+        eventos = self.client.get('/mudancas', query_string={'stream': 'sse'},
+                                  headers={**self.headers, 'Last-Event-ID': '4'})
+        self.assertEqual(eventos.mimetype, 'text/event-stream')
+        self.assertEqual(eventos.get_data(as_text=True).count('event: mudanca'), 2)
+
+        # A compactação deixa uma entrada por entidade
+        self.assertEqual(compactar_mudancas(), {'compactadas': 1, 'expurgadas': 0})
+        self.assertEqual(db.session.query(Mudanca).count(), 5)
+
+        # Exclusões antigas descartadas: cursores anteriores a elas recebem 410
+        self.client.delete('/clubes/1', headers=self.headers)
+        ultimo = self.client.get('/mudancas', query_string={'desde': 6}, headers=self.headers).get_json()
+        self.assertEqual([(m['entidade'], m['operacao'], m['dados']) for m in ultimo['mudancas']],
+                         [('clube', 'excluido', None), ('avaliacao', 'excluido', None), ('livro', 'excluido', None)])
+        self.app.config['MUDANCAS_RETENCAO_EXCLUSOES'] = -1
+        self.assertEqual(compactar_mudancas(), {'compactadas': 3, 'expurgadas': 3})
+        self.assertEqual(self.client.get('/mudancas', query_string={'desde': 6}, headers=self.headers).status_code, 410)
+        self.assertEqual(self.client.get('/mudancas', query_string={'desde': ultimo['cursor']},
+                                         headers=self.headers).get_json()['mudancas'], [])
+
+
+    def test_clube_de_outro_usuario(self):
+        """Testa que só o criador pode alterar ou excluir o clube."""
+        self.app.config['EXCLUSAO_THREADS'] = 0
+        self.client.post('/clubes', json={'nome': 'Clube'}, headers=self.headers)
+        outro = self.cabecalhos_outro_usuario()
+
+        self.assertEqual(self.client.put('/clubes/1', json={'nome': 'Invadido'}, headers=outro).status_code, 403)
+        self.assertEqual(self.client.delete('/clubes/1', headers=outro).status_code, 403)
+        self.assertEqual(self.client.get('/clubes').get_json()[0]['nome'], 'Clube')
+        self.assertEqual(self.client.put('/clubes/1', json={'nome': 'Novo'}, headers=self.headers).status_code, 200)
+
+
+    def test_lote_passa_pela_admissao(self):
+        """Testa que as sub-requisições de /lote respeitam os limites de taxa e de concorrência"""
+        app = create_app({'ADMISSAO_LIMITES': {'auth': {'taxa': 0.01, 'rajada': 2},
+                                               'estatisticas': {'concorrencia': 1, 'fila': 0}}})
+        cliente = app.test_client()
+        credenciais = {'email': 'teste@example.com', 'senha': 'senha_teste'}
+        with app.app_context():
+            db.create_all()
+        cliente.post('/usuarios', json={'nome': 'Usuario Teste', **credenciais})
+        token = cliente.post('/login', json=credenciais).get_json()['token']
+        self.assertEqual([cliente.post('/login', json=credenciais).status_code for _ in range(2)], [200, 429])
+
+        # Balde esgotado: nenhum login do lote chega a verificar a senha
+        logins = [{'metodo': 'POST', 'caminho': '/login', 'corpo': {**credenciais, 'senha': f'tentativa{i}'}}
+                  for i in range(10)]
+        response = cliente.post('/lote', headers={'Authorization': f'Bearer {token}'}, json={'requisicoes': logins})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({item['status'] for item in response.get_json()['respostas']}, {429})
+
+        # A vaga de concorrência é liberada ao fim de cada sub-requisição
+        response = cliente.post('/lote', headers={'Authorization': f'Bearer {token}'},
+                                json={'requisicoes': [{'caminho': '/estatisticas'}, {'caminho': '/estatisticas'}]})
+        self.assertEqual([item['status'] for item in response.get_json()['respostas']], [200, 200])
+        self.assertEqual(app.extensions['admissao'].grupos['estatisticas'].limitador.ativos, 0)
+        metricas = cliente.get('/metrics').get_data(as_text=True)
+        self.assertIn('bookbridge_admissao_rejeitadas_taxa_total{grupo="auth"} 11', metricas)
+
+    def test_livros_de_clube_em_exclusao(self):
+        """Testa que os livros de um clube com exclusão agendada somem das leituras e não aceitam avaliações"""
+        self.client.post('/clubes', json={'nome': 'Clube'}, headers=self.headers)
+        self.client.post('/clubes/1/livros', json={'titulo': 'Livro Oculto', 'autor': 'Autor'}, headers=self.headers)
+        self.client.post('/livros/1/avaliacoes', json={'nota': 5}, headers=self.headers)
+        self.assertEqual(len(self.client.get('/livros/ranking', headers=self.headers).get_json()['itens']), 1)
+
+        # Só agenda: a tarefa não roda, o clube fica oculto com os livros ainda no banco
+        agendar_exclusao('clube', db.session.get(Clube, 1))
+        db.session.commit()
+        self.assertEqual(self.client.post('/livros/1/avaliacoes', json={'nota': 3}, headers=self.headers).status_code, 404)
+        self.assertEqual(Avaliacao.query.count(), 1)
+        for rota in ('/livros/1/avaliacoes', '/livros/1/resumo', '/livros/1/similares'):
+            self.assertEqual(self.client.get(rota, headers=self.headers).status_code, 404, rota)
+        self.assertEqual(self.client.get('/livros/ranking', headers=self.headers).get_json()['itens'], [])
+        self.assertEqual(self.client.get('/livros/busca?q=oculto', headers=self.headers).get_json()['itens'], [])
+
+        self.app.config['ADMIN_IDS'] = {1}
+        for entidade in ('clubes', 'livros', 'avaliacoes'):
+            response = self.client.get(f'/admin/exportar/{entidade}?formato=ndjson', headers=self.headers)
+            self.assertEqual(response.get_data(as_text=True).strip(), '', entidade)
+
+    def test_retomar_exclusoes_reivindica_tarefa(self):
+        """Testa que retomar não pega tarefas em execução por outro executor, só as abandonadas"""
+        self.client.post('/clubes', json={'nome': 'Clube'}, headers=self.headers)
+        self.client.post('/clubes/1/livros', json={'titulo': 'Livro', 'autor': 'Autor'}, headers=self.headers)
+        tarefa = agendar_exclusao('clube', db.session.get(Clube, 1))
+        db.session.commit()
+
+        # Outro executor reivindicou a tarefa há pouco
+        tarefa.estado, tarefa.atualizado_em = 'executando', datetime.utcnow()
+        db.session.commit()
+        self.assertEqual(retomar_pendentes(), [])
+        self.assertEqual(executar_tarefa(tarefa.id).livros_removidos, 0)
+        self.assertEqual(Livro.query.count(), 1)
+        self.assertIn('Nenhuma tarefa pendente', self.app.test_cli_runner().invoke(args=['exclusoes', 'retomar']).output)
+
+        # Sem lote confirmado além do prazo: a tarefa foi abandonada e é retomada uma única vez
+        tarefa.atualizado_em = datetime.utcnow() - timedelta(seconds=self.app.config['EXCLUSAO_TAREFA_EXPIRA'] + 1)
+        db.session.commit()
+        self.assertEqual([(t.estado, t.livros_removidos) for t in retomar_pendentes()], [('concluida', 1)])
+        self.assertEqual(retomar_pendentes(), [])
+        agregados = db.session.get(Estatistica, 1)
+        db.session.refresh(agregados)
+        self.assertEqual((agregados.total_clubes, agregados.total_livros), (0, 0))
+
+    def test_livros_restritos_ao_criador_do_clube(self):
+        """Testa que busca, ranking e similares só mostram livros dos clubes do usuário, como GET /clubes/<id>/livros"""
+        self.client.post('/clubes', json={'nome': 'Clube'}, headers=self.headers)
+        for titulo in ('Dom Casmurro', 'Quincas Borba'):
+            self.client.post('/clubes/1/livros', json={'titulo': titulo, 'autor': 'Machado'}, headers=self.headers)
+            self.client.post(f'/livros/{Livro.query.count()}/avaliacoes', json={'nota': 5}, headers=self.headers)
+        calcular_similares(k=2, motor='python')
+        self.assertEqual(len(self.client.get('/livros/busca?q=machado', headers=self.headers).get_json()['itens']), 2)
+        self.assertEqual(len(self.client.get('/livros/ranking', headers=self.headers).get_json()['itens']), 2)
+        self.assertEqual(self.client.get('/livros/1/similares', headers=self.headers).status_code, 200)
+
+        outro = self.cabecalhos_outro_usuario()
+        self.assertEqual(self.client.get('/livros/busca?q=machado', headers=outro).get_json()['itens'], [])
+        self.assertEqual(self.client.get('/livros/ranking', headers=outro).get_json()['itens'], [])
+        for rota in ('/livros/busca?q=machado&clube=1', '/livros/ranking?clube=1', '/livros/1/similares'):
+            self.assertEqual(self.client.get(rota, headers=outro).status_code, 404, rota)
+        for rota in ('/livros/ranking', '/livros/1/similares'):
+            self.assertEqual(self.client.get(rota).status_code, 401, rota)
+
+    def test_senhas_sobrecarga_responde_503(self):
+        """Testa o 503 imediato com a fila de hash cheia, no tempo esgotado e com o pool de processos quebrado"""
+        self.app.config.update(SENHA_HASH_PROCESSOS=1, SENHA_HASH_FILA=0, SENHA_HASH_TIMEOUT=5)
+        login = {'email': 'teste@example.com', 'senha': 'senha_teste'}
+        _, vagas = senhas._obter_executor()
+        vagas.acquire()
+        try:
+            inicio = time.perf_counter()
+            self.assertEqual(self.client.post('/login', json=login).status_code, 503)
+            self.assertLess(time.perf_counter() - inicio, 1)  # Sem esperar por vaga
+        finally:
+            vagas.release()
+
+        self.app.config['SENHA_HASH_TIMEOUT'] = 0.05
+        with self.assertRaises(senhas.FilaSenhasCheia):
+            senhas._executar(time.sleep, 1)
+        # O hash que estourou o tempo ainda ocupa o processo: a vaga só volta quando ele termina
+        with self.assertRaisesRegex(senhas.FilaSenhasCheia, 'cheia'):
+            senhas._executar(time.sleep, 0)
+        self.assertTrue(vagas.acquire(timeout=5))
+        vagas.release()
+        self.app.config['SENHA_HASH_TIMEOUT'] = 5
+        with self.assertRaises(senhas.FilaSenhasCheia):
+            senhas._executar(os._exit, 1)  # Derruba o processo do pool
+        # O pool quebrado é substituído no pedido seguinte
+        self.assertEqual(self.client.post('/login', json=login).status_code, 200)
+
+    @unittest.skipUnless(scipy, 'SciPy não instalado')
+    def test_similares_scipy_igual_python(self):
+        """Testa que o motor SciPy calcula os mesmos vizinhos e similaridades que o motor em Python puro"""
+        gerador = random.Random(7)
+        db.session.execute(insert(Usuario), [{'nome': f'Leitor {i}', 'email': f'leitor{i}@example.com', 'senha_hash': '-'}
+                                             for i in range(12)])
+        db.session.execute(insert(Clube), [{'nome': 'Clube', 'id_usuario_criador': 1}])
+        db.session.execute(insert(Livro), [{'titulo': f'Livro {i}', 'autor': 'Autor', 'id_clube': 1} for i in range(20)])
+        db.session.execute(insert(Avaliacao), [{'nota': gerador.randint(1, 5), 'id_livro': id_livro, 'id_usuario': id_usuario}
+                                               for id_livro in range(1, 21) for id_usuario in range(1, 14)
+                                               if gerador.random() < 0.4])
+        db.session.commit()
+
+        python, esparsa = MatrizPython(), MatrizSciPy()
+        self.assertEqual(esparsa.avaliacoes, python.avaliacoes)
+        self.assertEqual(esparsa.livros(), python.livros())
+        esperado = dict(python.vizinhos(python.livros(), 5, 0))
+        # Um byte de memória: um livro por bloco, exercitando a divisão em blocos
+        for id_livro, vizinhos in esparsa.vizinhos(esparsa.livros(), 5, 1):
+            self.assertEqual([id for id, _ in vizinhos], [id for id, _ in esperado[id_livro]], id_livro)
+            for (_, similaridade), (_, similaridade_python) in zip(vizinhos, esperado[id_livro]):
+                self.assertAlmostEqual(similaridade, similaridade_python, places=5)
+
+        self.assertEqual(calcular_similares(k=5, motor='scipy')['motor'], 'scipy')
+
+    def test_recalcular_com_exclusao_pendente(self):
+        """Testa que o recálculo dos agregados com uma exclusão pendente não devolve o clube oculto à contagem"""
+        for nome in ('Clube 1', 'Clube 2'):
+            self.client.post('/clubes', json={'nome': nome}, headers=self.headers)
+        self.client.post('/clubes/1/livros', json={'titulo': 'Livro', 'autor': 'Autor'}, headers=self.headers)
+        self.client.post('/livros/1/avaliacoes', json={'nota': 4}, headers=self.headers)
+        tarefa = agendar_exclusao('clube', db.session.get(Clube, 1))
+        db.session.commit()
+
+        cli = self.app.test_cli_runner()
+        self.assertIn('nenhuma divergência', cli.invoke(args=['estatisticas', 'recalcular']).output)
+        self.assertEqual(executar_tarefa(tarefa.id).estado, 'concluida')
+        self.assertIn('nenhuma divergência', cli.invoke(args=['estatisticas', 'recalcular']).output)
+        agregados = db.session.get(Estatistica, 1)
+        db.session.refresh(agregados)
+        self.assertEqual((agregados.total_clubes, agregados.total_livros, agregados.total_avaliacoes), (1, 0, 0))
+
+    def test_exclusao_invalida_cache_dos_livros(self):
+        """Testa que, logo após o DELETE do clube, as leituras em cache dos livros dele deixam de ser servidas"""
+        self.client.post('/clubes', json={'nome': 'Clube'}, headers=self.headers)
+        self.client.post('/clubes/1/livros', json={'titulo': 'Livro', 'autor': 'Autor'}, headers=self.headers)
+        self.client.post('/livros/1/avaliacoes', json={'nota': 4}, headers=self.headers)
+        etag = self.client.get('/livros/1/avaliacoes').headers['ETag']
+        self.assertEqual(self.client.get('/livros/1/avaliacoes').status_code, 200)  # Agora vem do cache
+        versao = db.session.get(Livro, 1).versao
+
+        # A tarefa ainda não rodou: o livro continua no banco, só o clube está oculto
+        with mock.patch('routes.routes.executar_exclusao'):
+            self.assertEqual(self.client.delete('/clubes/1', headers=self.headers).status_code, 202)
+        self.assertEqual(self.client.get('/livros/1/avaliacoes').status_code, 404)
+        self.assertEqual(self.client.get('/livros/1/avaliacoes', headers={'If-None-Match': etag}).status_code, 404)
+        livro = db.session.get(Livro, 1)
+        db.session.refresh(livro)
+        self.assertEqual(livro.versao, versao + 1)
+
+    def test_stream_recusa_msgpack(self):
+        """Testa que o streaming responde 406 quando o Accept não aceita JSON/NDJSON"""
+        self.test_create_clube()
+        response = self.client.get('/clubes?stream=json', headers={'Accept': 'application/msgpack'})
+        self.assertEqual(response.status_code, 406)
+        response = self.client.get('/clubes?stream=ndjson', headers={'Accept': 'application/msgpack'})
+        self.assertEqual(response.status_code, 406)
+
+        # Com JSON entre as alternativas do Accept, o streaming segue normalmente
+        response = self.client.get('/clubes?stream=json',
+                                   headers={'Accept': 'application/msgpack, application/json;q=0.5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()), 1)
+        response = self.client.get('/clubes?stream=ndjson', headers={'Accept': '*/*'})
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+
+    def test_metricas_streaming(self):
+        """Testa que as métricas de respostas em streaming incluem as consultas feitas enquanto o corpo é enviado"""
+        self.test_create_clube()
+        response = self.client.get('/clubes?stream=ndjson')
+        self.assertIn('Clube Teste', response.get_data(as_text=True))
+        response.close()
+
+        texto = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('bookbridge_sql_consultas_count{endpoint="clubes.get_clubes"} 1', texto)
+        # A consulta dos clubes só roda no gerador, depois do after_request
+        self.assertIn('bookbridge_sql_consultas_sum{endpoint="clubes.get_clubes"} 2.0', texto)
+
 
 if __name__ == '__main__':
     unittest.main()